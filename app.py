@@ -1,7 +1,25 @@
-from flask import Flask
+from flask import Flask, Response, abort, g, request, url_for
+import hmac
 import os
+import threading
+import time
 from dotenv import load_dotenv
-from authlib.integrations.flask_client import OAuth
+from models.analysis_cache import AnalysisCache
+from models.image_index import PerceptualIndex
+from models.genai_pool import GenaiClientPool
+from models.model_tiers import ModelTiers
+from models.image_store import ImageStore
+from models.preprocess_pool import PreprocessPool
+from models.rate_limiter import AdaptiveRateLimiter, SingleFlight
+from models.meal_log import MealLog
+from models.food_index import FoodIndex
+from models.session_store import ServerSessionInterface
+from models.metrics import Metrics
+from models.job_queue import JobQueue
+from models.oauth_client import GoogleOAuth
+from models.page_cache import PageCache
+from models.static_assets import StaticAssets
+from models.upload_validator import UploadValidator
 
 # Load environment variables
 load_dotenv()
@@ -15,20 +33,160 @@ def create_app():
     app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
     app.config['UPLOAD_FOLDER'] = 'uploads'
     
+    # Uploads are checked from their headers before anything else runs:
+    # JPEG/PNG magic bytes, declared pixels, and the pixels decoding would
+    # actually produce (JPEGs decode at reduced size, PNGs in full).
+    # Werkzeug already buffers uploads over 500KB in a temporary file
+    app.config['UPLOAD_MAX_PIXELS'] = int(os.getenv('UPLOAD_MAX_PIXELS', 100_000_000))
+    app.config['UPLOAD_MAX_DECODED_PIXELS'] = int(os.getenv('UPLOAD_MAX_DECODED_PIXELS', 16_000_000))
+    
+    # Analysis result cache (set ANALYSIS_CACHE_PATH to share it across workers)
+    app.config['ANALYSIS_CACHE_TTL'] = int(os.getenv('ANALYSIS_CACHE_TTL', 24 * 3600))
+    app.config['ANALYSIS_CACHE_MAX_ENTRIES'] = int(os.getenv('ANALYSIS_CACHE_MAX_ENTRIES', 512))
+    app.config['ANALYSIS_CACHE_DISK_MAX_ENTRIES'] = int(os.getenv('ANALYSIS_CACHE_DISK_MAX_ENTRIES', 10000))
+    app.config['ANALYSIS_CACHE_PATH'] = os.getenv('ANALYSIS_CACHE_PATH')
+    
+    # Shared Gemini client with a keep-alive connection pool
+    app.config['GOOGLE_API_KEY'] = os.getenv('GOOGLE_API_KEY')
+    app.config['GEMINI_BASE_URL'] = os.getenv('GEMINI_BASE_URL')
+    app.config['GEMINI_POOL_SIZE'] = int(os.getenv('GEMINI_POOL_SIZE', 16))
+    app.config['GEMINI_TIMEOUT'] = float(os.getenv('GEMINI_TIMEOUT', 60))
+    app.config['GEMINI_CONNECT_TIMEOUT'] = float(os.getenv('GEMINI_CONNECT_TIMEOUT', 10))
+    
+    # Analysis tiers, cheapest first (max_size:compact|full[:model]); an
+    # answer below the confidence threshold or failing validation is asked
+    # again at the next tier. Empty makes one full-size call.
+    app.config['MODEL_TIERS'] = os.getenv('MODEL_TIERS', '512:compact,1024:full')
+    app.config['MODEL_TIER_MIN_CONFIDENCE'] = float(os.getenv('MODEL_TIER_MIN_CONFIDENCE', 0.6))
+    
+    # How /analyze returns the processed image: 'url', 'inline' (base64) or 'none'
+    app.config['ANALYZE_IMAGE_MODE'] = os.getenv('ANALYZE_IMAGE_MODE', 'url')
+    app.config['IMAGE_STORE_MAX_ENTRIES'] = int(os.getenv('IMAGE_STORE_MAX_ENTRIES', 256))
+    app.config['IMAGE_STORE_TTL'] = int(os.getenv('IMAGE_STORE_TTL', 3600))
+    app.config['IMAGE_STORE_PATH'] = os.getenv('IMAGE_STORE_PATH')
+    
+    # Image preprocessing worker processes (0 keeps it on the request thread)
+    app.config['PREPROCESS_WORKERS'] = int(os.getenv('PREPROCESS_WORKERS', 0))
+    app.config['PREPROCESS_MAX_PENDING'] = int(os.getenv('PREPROCESS_MAX_PENDING', 4 * app.config['PREPROCESS_WORKERS']))
+    
+    # Multi-image /analyze_batch limits
+    app.config['BATCH_MAX_IMAGES'] = int(os.getenv('BATCH_MAX_IMAGES', 6))
+    app.config['BATCH_MAX_PARALLEL'] = int(os.getenv('BATCH_MAX_PARALLEL', 4))
+    app.config['BATCH_PACK_IMAGES'] = os.getenv('BATCH_PACK_IMAGES', 'true').lower() == 'true'
+    
+    # Shared Gemini rate limiter, off unless set to the project's quota in
+    # model calls per second (an analysis makes one call per tier it tries)
+    app.config['GEMINI_RATE_LIMIT'] = float(os.getenv('GEMINI_RATE_LIMIT', 0))
+    app.config['GEMINI_RATE_LIMIT_MAX'] = float(os.getenv('GEMINI_RATE_LIMIT_MAX', 10))
+    app.config['GEMINI_RATE_BURST'] = int(os.getenv('GEMINI_RATE_BURST', 5))
+    app.config['GEMINI_RATE_MAX_WAIT'] = float(os.getenv('GEMINI_RATE_MAX_WAIT', 30))
+    app.config['GEMINI_RATE_RETRIES'] = int(os.getenv('GEMINI_RATE_RETRIES', 2))
+    
+    # Near-duplicate image lookup (a negative distance disables it)
+    app.config['NEAR_DUPLICATE_MAX_DISTANCE'] = int(os.getenv('NEAR_DUPLICATE_MAX_DISTANCE', 4))
+    app.config['NEAR_DUPLICATE_HASH'] = os.getenv('NEAR_DUPLICATE_HASH', 'dhash')
+    app.config['NEAR_DUPLICATE_INDEX_PATH'] = os.getenv('NEAR_DUPLICATE_INDEX_PATH')
+    # Entries expire with ANALYSIS_CACHE_TTL; by default the index holds as
+    # many as the analysis cache's largest tier
+    app.config['NEAR_DUPLICATE_MAX_ENTRIES'] = int(os.getenv(
+        'NEAR_DUPLICATE_MAX_ENTRIES',
+        app.config['ANALYSIS_CACHE_DISK_MAX_ENTRIES' if app.config['ANALYSIS_CACHE_PATH'] else 'ANALYSIS_CACHE_MAX_ENTRIES'],
+    ))
+    
+    # Per-user meal history (an empty path disables it)
+    app.config['MEAL_LOG_PATH'] = os.getenv('MEAL_LOG_PATH', os.path.join(app.instance_path, 'meal_log.sqlite3'))
+    app.config['MEAL_LOG_POOL_SIZE'] = int(os.getenv('MEAL_LOG_POOL_SIZE', 4))
+    # Seconds within which an identical analysis counts as a retry, not a new meal
+    app.config['MEAL_LOG_DEDUPE_WINDOW'] = int(os.getenv('MEAL_LOG_DEDUPE_WINDOW', 600))
+    
+    # Per-food nutrition learned from past analyses, for estimates without a
+    # model call (an empty path disables it)
+    app.config['FOOD_INDEX_PATH'] = os.getenv('FOOD_INDEX_PATH', os.path.join(app.instance_path, 'food_index.bin'))
+    app.config['FOOD_STATS_PATH'] = os.getenv('FOOD_STATS_PATH', os.path.join(app.instance_path, 'food_stats.sqlite3'))
+    app.config['FOOD_INDEX_MIN_MEALS'] = int(os.getenv('FOOD_INDEX_MIN_MEALS', 2))
+    app.config['FOOD_INDEX_REBUILD_EVERY'] = int(os.getenv('FOOD_INDEX_REBUILD_EVERY', 50))
+    
+    # Session storage: 'cookie' (signed cookie), or 'memory'/'sqlite' to keep
+    # the data server-side behind an opaque id ('sqlite' is shared by workers)
+    app.config['SESSION_BACKEND'] = os.getenv('SESSION_BACKEND', 'cookie')
+    app.config['SESSION_PATH'] = os.getenv('SESSION_PATH', os.path.join(app.instance_path, 'sessions.sqlite3'))
+    app.config['SESSION_TTL'] = int(os.getenv('SESSION_TTL', 7 * 24 * 3600))
+    app.config['SESSION_MAX_ENTRIES'] = int(os.getenv('SESSION_MAX_ENTRIES', 10000))
+    
+    # Background analysis jobs: /analyze with mode=async (or ANALYZE_MODE=async)
+    # returns a job id at once and the result is collected from /jobs/<id>.
+    # Jobs live in the process that queued them, and a poll can land on any
+    # gunicorn worker, so the queue only runs with a single worker
+    app.config['ANALYZE_MODE'] = os.getenv('ANALYZE_MODE', 'sync')
+    app.config['JOB_QUEUE_WORKERS'] = int(os.getenv('JOB_QUEUE_WORKERS', 4))
+    if int(os.getenv('GUNICORN_WORKERS', 1)) > 1:
+        if app.config['ANALYZE_MODE'] == 'async':
+            raise ValueError("ANALYZE_MODE=async needs GUNICORN_WORKERS=1: jobs are kept per process")
+        app.config['JOB_QUEUE_WORKERS'] = 0
+    app.config['JOB_QUEUE_MAX_PENDING'] = int(os.getenv('JOB_QUEUE_MAX_PENDING', 16 * app.config['JOB_QUEUE_WORKERS']))
+    app.config['JOB_DEADLINE'] = float(os.getenv('JOB_DEADLINE', 120))
+    app.config['JOB_MAX_RETRIES'] = int(os.getenv('JOB_MAX_RETRIES', 3))
+    app.config['JOB_RETRY_BASE_DELAY'] = float(os.getenv('JOB_RETRY_BASE_DELAY', 2))
+    app.config['JOB_RESULT_TTL'] = float(os.getenv('JOB_RESULT_TTL', 600))
+    app.config['JOB_MAX_WAIT'] = float(os.getenv('JOB_MAX_WAIT', 30))
+    
+    # Prometheus metrics, served at /metrics only to holders of METRICS_TOKEN
+    # and a sampled fraction of requests traced stage by stage in the log
+    app.config['METRICS_ENABLED'] = os.getenv('METRICS_ENABLED', 'true').lower() == 'true'
+    app.config['METRICS_TOKEN'] = os.getenv('METRICS_TOKEN')
+    app.config['TRACE_SAMPLE_RATE'] = float(os.getenv('TRACE_SAMPLE_RATE', 0))
+    
+    # Google sign-in; the discovery document is cached on disk (an empty
+    # path disables it) so new instances don't fetch it again
+    app.config['GOOGLE_CLIENT_ID'] = os.getenv('GOOGLE_CLIENT_ID')
+    app.config['GOOGLE_CLIENT_SECRET'] = os.getenv('GOOGLE_CLIENT_SECRET')
+    app.config['OAUTH_METADATA_CACHE_PATH'] = os.getenv('OAUTH_METADATA_CACHE_PATH', os.path.join(app.instance_path, 'oauth_metadata.json'))
+    app.config['OAUTH_METADATA_TTL'] = int(os.getenv('OAUTH_METADATA_TTL', 24 * 3600))
+    
+    # Heavy libraries (genai SDK, PIL, authlib) load on first use; WARM_UP
+    # loads them right after start-up: 'background' (a thread), 'eager'
+    # (before create_app returns, e.g. with gunicorn --preload) or 'off'
+    app.config['WARM_UP'] = os.getenv('WARM_UP', 'background')
+    
+    # Static files are served content-hashed and precompressed from /assets
+    # with immutable caching ('plain' serves /static as is); pages that are
+    # the same for every visitor are rendered once per process
+    app.config['STATIC_ASSETS'] = os.getenv('STATIC_ASSETS', 'hashed')
+    app.config['STATIC_BUILD_PATH'] = os.getenv('STATIC_BUILD_PATH', os.path.join(app.instance_path, 'static_build'))
+    app.config['STATIC_MAX_AGE'] = int(os.getenv('STATIC_MAX_AGE', 365 * 24 * 3600))
+    app.config['PAGE_CACHE'] = os.getenv('PAGE_CACHE', 'true').lower() == 'true'
+    app.config['PAGE_CACHE_MAX_AGE'] = int(os.getenv('PAGE_CACHE_MAX_AGE', 3600))
+    
     # Create upload folder if it doesn't exist
     os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
     
-    # Configure OAuth
-    oauth = OAuth(app)
-    oauth.register(
-        name='google',
-        client_id=os.getenv('GOOGLE_CLIENT_ID'),
-        client_secret=os.getenv('GOOGLE_CLIENT_SECRET'),
-        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-        client_kwargs={'scope': 'openid email profile'},
-    )
+    session_interface = ServerSessionInterface.from_config(app.config)
+    if session_interface is not None:
+        app.session_interface = session_interface
+    
+    # Configure OAuth (authlib is imported on the first sign-in)
     # Store oauth in app extensions so controllers can access it
-    app.extensions['oauth'] = oauth
+    app.extensions['oauth'] = GoogleOAuth.from_config(app)
+    
+    # Shared analysis cache used by every request in this process
+    app.extensions['analysis_cache'] = AnalysisCache.from_config(app.config)
+    app.extensions['image_index'] = PerceptualIndex.from_config(app.config)
+    app.extensions['genai_pool'] = GenaiClientPool.from_config(app.config)
+    app.extensions['model_tiers'] = ModelTiers.from_config(app.config)
+    app.extensions['rate_limiter'] = AdaptiveRateLimiter.from_config(app.config)
+    app.extensions['single_flight'] = SingleFlight()
+    app.extensions['image_store'] = ImageStore.from_config(app.config)
+    app.extensions['preprocess_pool'] = PreprocessPool.from_config(app.config)
+    app.extensions['meal_log'] = MealLog.from_config(app.config)
+    app.extensions['food_index'] = FoodIndex.from_config(app.config)
+    app.extensions['job_queue'] = JobQueue.from_config(app.config)
+    app.extensions['upload_validator'] = UploadValidator.from_config(app.config)
+    app.extensions['page_cache'] = PageCache.from_config(app.config)
+    app.extensions['static_assets'] = StaticAssets.from_config(app)
+    register_static_assets(app, app.extensions['static_assets'])
+    app.extensions['metrics'] = Metrics.from_config(app.config)
+    if app.extensions['metrics'] is not None:
+        register_metrics(app, app.extensions['metrics'])
     
     # Register blueprints
     from controllers.auth_controller import auth_bp
@@ -49,8 +207,125 @@ def create_app():
     def too_large(error):
         return "File too large", 413
     
+    if app.config['WARM_UP'] == 'eager':
+        warm_up(app)
+    elif app.config['WARM_UP'] == 'background':
+        threading.Thread(target=warm_up, args=(app,), daemon=True, name='warm-up').start()
+    
     return app
 
+def warm_up(app):
+    """Import the libraries the first analysis and sign-in need."""
+    try:
+        from PIL import Image, ImageOps  # noqa: F401
+        app.extensions['genai_pool'].warm_up()
+        app.extensions['oauth'].warm_up()
+    except Exception as e:
+        # The same imports are retried (and fail loudly) on first use
+        app.logger.warning(f"Warm-up failed: {e}")
+
+def register_static_assets(app, assets):
+    """Serve the hashed assets at /assets and add asset_url() to templates."""
+    
+    @app.template_global()
+    def asset_url(filename):
+        hashed = assets.hashed_path(filename) if assets is not None else None
+        if hashed is None:
+            return url_for('static', filename=filename)
+        return url_for('hashed_asset', filename=hashed)
+    
+    if assets is None:
+        return
+    
+    @app.route('/assets/<path:filename>')
+    def hashed_asset(filename):
+        asset = assets.get(filename)
+        if asset is None:
+            abort(404)
+        encoding, data = asset.negotiate(request.accept_encodings)
+        etag = f"{asset.digest}-{encoding}" if encoding else asset.digest
+        # The hash in the name pins the bytes, so the asset can never change
+        headers = [
+            ('ETag', f'"{etag}"'),
+            ('Vary', 'Accept-Encoding'),
+            ('Cache-Control', f"public, max-age={assets.max_age}, immutable"),
+        ]
+        if 'HTTP_IF_NONE_MATCH' in request.environ and etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+        if encoding:
+            headers.append(('Content-Encoding', encoding))
+        return Response(data, mimetype=asset.mimetype, headers=headers)
+
+def register_metrics(app, metrics):
+    """Instrument every request and serve the registry at /metrics when METRICS_TOKEN is set."""
+    if app.extensions['rate_limiter'] is not None:
+        metrics.add_stats('calorie_counter_rate_limiter', 'Shared Gemini rate limiter state.',
+                          app.extensions['rate_limiter'].stats)
+    if app.extensions['model_tiers'] is not None:
+        metrics.add_stats('calorie_counter_model_tiers', 'Gemini calls, escalations and tokens per analysis tier.',
+                          app.extensions['model_tiers'].stats)
+    metrics.add_stats('calorie_counter_single_flight', 'Coalesced identical analyses.',
+                      app.extensions['single_flight'].stats)
+    if app.extensions['image_index'] is not None:
+        metrics.add_stats('calorie_counter_image_index', 'Near-duplicate index size and evictions.',
+                          app.extensions['image_index'].stats)
+    if app.extensions['analysis_cache'] is not None:
+        metrics.add_stats('calorie_counter_analysis_cache', 'Analysis cache counters per tier.',
+                          app.extensions['analysis_cache'].stats)
+    
+    metrics.add_stats('calorie_counter_uploads', 'Uploads accepted and rejected by header validation.',
+                      app.extensions['upload_validator'].stats)
+    
+    if app.extensions['food_index'] is not None:
+        metrics.add_stats('calorie_counter_food_index', 'Local food index size, lookups and learning.',
+                          app.extensions['food_index'].stats)
+    
+    if app.extensions['page_cache'] is not None:
+        metrics.add_stats('calorie_counter_page_cache', 'Pages served from the rendered page cache.',
+                          app.extensions['page_cache'].stats)
+    
+    if app.extensions['job_queue'] is not None:
+        metrics.add_stats('calorie_counter_job_queue', 'Background analysis jobs by status and outcome.',
+                          app.extensions['job_queue'].stats)
+    
+    @app.before_request
+    def start_request_metrics():
+        g.metrics_started = time.perf_counter()
+        g.metrics_trace = metrics.start_trace()
+        metrics.requests_in_flight.inc()
+    
+    @app.after_request
+    def record_request_metrics(response):
+        if 'metrics_started' not in g:
+            return response
+        # Streamed responses are timed to their first byte
+        elapsed = time.perf_counter() - g.metrics_started
+        endpoint = request.endpoint or 'unmatched'
+        metrics.requests.inc(endpoint=endpoint, status=response.status_code)
+        metrics.request_seconds.observe(elapsed, endpoint=endpoint)
+        if g.metrics_trace is not None:
+            app.logger.info(f"trace {request.method} {request.path} {response.status_code} "
+                            f"{g.metrics_trace.summary()}")
+        return response
+    
+    @app.teardown_request
+    def end_request_metrics(error=None):
+        if 'metrics_started' in g:
+            metrics.requests_in_flight.dec()
+            metrics.end_trace()
+    
+    # Metrics reveal traffic and error rates, so they're never served unauthenticated
+    token = app.config['METRICS_TOKEN']
+    if not token:
+        app.logger.info("METRICS_TOKEN is not set; /metrics is not served")
+        return
+    
+    @app.route('/metrics')
+    def metrics_endpoint():
+        if not hmac.compare_digest(request.headers.get('Authorization', ''), f"Bearer {token}"):
+            abort(401)
+        return Response(metrics.render(), mimetype='text/plain; version=0.0.4')
+
 if __name__ == '__main__':
     app = create_app()
     # Get the port from the environment variable, defaulting to 8080
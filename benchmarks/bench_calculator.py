@@ -0,0 +1,77 @@
+"""
+Daily-target throughput: scalar CalorieCalculator loop vs the NumPy batch API.
+
+Computes targets for --profiles random profiles both ways, checks that
+every result matches exactly, and times a --weeks projection.
+
+The target is a 30x speedup (see the README for why it isn't 100x);
+below --min-speedup the benchmark exits non-zero, as it does on any
+mismatch.
+
+Usage: python -m benchmarks.bench_calculator [--profiles 1000000] [--min-speedup 30]
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+
+from models.calculator import CalorieCalculator
+
+
+def random_profiles(count, seed=1234):
+    rng = np.random.default_rng(seed)
+    return (
+        rng.integers(0, 2, count),          # gender
+        rng.integers(18, 80, count),        # age
+        rng.uniform(40, 150, count),        # weight
+        rng.uniform(140, 210, count),       # height
+        rng.integers(0, 4, count),          # activity
+        rng.integers(0, 3, count),          # goal
+    )
+
+
+def best_of(repeats, fn):
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--profiles', type=int, default=1000000)
+    parser.add_argument('--weeks', type=int, default=52)
+    parser.add_argument('--projection-profiles', type=int, default=100000)
+    parser.add_argument('--min-speedup', type=float, default=30.0)
+    args = parser.parse_args()
+
+    profiles = random_profiles(args.profiles)
+    rows = list(zip(*(column.tolist() for column in profiles)))
+
+    scalar_s, expected = best_of(1, lambda: [
+        CalorieCalculator.calculate_target_calories(*row) for row in rows
+    ])
+    batch_s, targets = best_of(5, lambda: CalorieCalculator.calculate_target_calories_batch(*profiles))
+    mismatches = int(np.count_nonzero(targets != np.array(expected)))
+
+    print(f"{args.profiles} profiles")
+    print(f"  scalar loop  {scalar_s * 1e3:8.1f}ms  {args.profiles / scalar_s / 1e6:7.2f}M/s")
+    print(f"  batch        {batch_s * 1e3:8.1f}ms  {args.profiles / batch_s / 1e6:7.2f}M/s  "
+          f"({scalar_s / batch_s:.0f}x, {mismatches} mismatches)")
+
+    subset = [column[:args.projection_profiles] for column in profiles]
+    projection_s, (weights, projected) = best_of(
+        3, lambda: CalorieCalculator.project_target_calories(*subset, args.weeks)
+    )
+    print(f"  {args.weeks}-week projection of {args.projection_profiles} profiles  "
+          f"{projection_s * 1e3:8.1f}ms  ({projected.size / projection_s / 1e6:.2f}M targets/s)")
+
+    if mismatches or scalar_s / batch_s < args.min_speedup:
+        sys.exit(f"FAIL: batch must match exactly and be at least {args.min_speedup:g}x faster")
+
+
+if __name__ == '__main__':
+    main()
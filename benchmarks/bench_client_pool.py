@@ -0,0 +1,57 @@
+"""
+Per-request overhead of a fresh genai.Client versus the shared pooled client.
+
+Sends sequential analyses to the local fake Gemini server (zero simulated
+latency) so the difference is pure client construction and connection
+setup. Over real TLS the saving per call is larger than on loopback.
+
+Usage: python -m benchmarks.bench_client_pool --requests 300
+"""
+import argparse
+import os
+import time
+
+from PIL import Image
+
+from benchmarks.fake_gemini import FakeGeminiServer
+
+
+def measure(label, make_service, server, image, requests):
+    connections_before = server.connection_count
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        make_service().get_nutrition_analysis(image, 'Maintain Weight', 'No Restriction')
+        timings.append(time.perf_counter() - start)
+    timings.sort()
+    mean_ms = sum(timings) / len(timings) * 1000
+    print(f"{label:<14} mean {mean_ms:6.2f}ms  p50 {timings[len(timings) // 2] * 1000:6.2f}ms  "
+          f"connections opened {server.connection_count - connections_before}")
+    return mean_ms
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=300)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(latency=0.0).start()
+    os.environ['GEMINI_BASE_URL'] = server.base_url
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark-key')
+
+    from models.ai_service import AIService
+    from models.genai_pool import GenaiClientPool
+
+    image = Image.new('RGB', (64, 64), (90, 160, 40))
+    pool = GenaiClientPool(base_url=server.base_url)
+    try:
+        fresh = measure('per-request', AIService, server, image, args.requests)
+        pooled = measure('pooled', lambda: AIService(client=pool.client), server, image, args.requests)
+        print(f"saved per request: {fresh - pooled:.2f}ms")
+    finally:
+        pool.close()
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
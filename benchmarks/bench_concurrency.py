@@ -0,0 +1,170 @@
+"""
+Compare gunicorn's gthread and gevent workers at equal concurrency.
+
+For each concurrency level the app is started under gunicorn with
+gunicorn.conf.py twice: as one gthread worker with that many threads, and
+as one gevent worker with that many connections. The same number of client
+threads then drive /analyze with small photos that each miss the analysis
+cache, so the model call dominates. Gemini is the local fake server, so
+the run is offline and repeatable.
+
+Reported per worker class and level: throughput, p50/p99 latency measured
+from the moment a request is sent, responses by status and the worker's
+RSS after the run.
+
+Usage: python -m benchmarks.bench_concurrency --concurrency 8 32 128 --latency 0.5
+"""
+import argparse
+import io
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+import time
+
+from benchmarks.fake_gemini import FakeGeminiServer
+from benchmarks.load_test import PROFILE, Client, multipart, percentile, vary_jpeg
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+WORKER_CLASSES = ('gthread', 'gevent')
+
+
+def small_photos(count, seed):
+    """Photos under MAX_IMAGE_SIZE, so preparing them costs little CPU."""
+    from PIL import Image
+
+    rng = random.Random(seed)
+    photos = []
+    for _ in range(count):
+        image = Image.effect_noise((480, 360), 50).convert('RGB')
+        image = Image.blend(image, Image.new('RGB', image.size, tuple(rng.randrange(256) for _ in range(3))), 0.5)
+        buffered = io.BytesIO()
+        image.save(buffered, format='JPEG', quality=85)
+        photos.append(buffered.getvalue())
+    return photos
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def worker_rss_mb(master_pid):
+    """Resident set size of the gunicorn master's workers, in MiB (Linux only)."""
+    try:
+        with open(f"/proc/{master_pid}/task/{master_pid}/children") as children:
+            pids = children.read().split()
+        total = 0
+        for pid in pids:
+            with open(f"/proc/{pid}/status") as status:
+                for line in status:
+                    if line.startswith('VmRSS:'):
+                        total += int(line.split()[1])
+        return total / 1024
+    except OSError:
+        return None
+
+
+def start_gunicorn(worker_class, concurrency, gemini_url):
+    port = free_port()
+    env = {
+        **os.environ,
+        'PORT': str(port),
+        'GUNICORN_WORKERS': '1',
+        'GUNICORN_WORKER_CLASS': worker_class,
+        'GUNICORN_THREADS': str(concurrency),
+        'GUNICORN_WORKER_CONNECTIONS': str(concurrency),
+        'GEMINI_BASE_URL': gemini_url,
+        'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'fake-key'),
+        'GEMINI_RATE_LIMIT': '0',
+        'MEAL_LOG_PATH': '',
+        'NEAR_DUPLICATE_MAX_DISTANCE': '-1',
+        'TRACE_SAMPLE_RATE': '0',
+    }
+    process = subprocess.Popen(
+        [sys.executable, '-m', 'gunicorn', '--config', 'gunicorn.conf.py', 'app:create_app()'],
+        cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise SystemExit(f"gunicorn ({worker_class}) exited with status {process.returncode}")
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.2):
+                return process, port
+        except OSError:
+            time.sleep(0.1)
+    process.terminate()
+    raise SystemExit(f"gunicorn ({worker_class}) did not start listening within 30s")
+
+
+def run(worker_class, concurrency, requests, photos, gemini_url, seed):
+    process, port = start_gunicorn(worker_class, concurrency, gemini_url)
+    try:
+        clients = [Client(port) for _ in range(concurrency)]
+        next_index = iter(range(requests))
+        lock = threading.Lock()
+        latencies = []
+        statuses = {}
+
+        def drive(client, rng):
+            while True:
+                with lock:
+                    if next(next_index, None) is None:
+                        return
+                body, content_type = multipart(PROFILE, [('image', 'meal.jpg', vary_jpeg(rng.choice(photos), rng))])
+                start = time.perf_counter()
+                status, _ = client.request('POST', '/analyze', body, content_type)
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses[status] = statuses.get(status, 0) + 1
+
+        started = time.perf_counter()
+        threads = [threading.Thread(target=drive, args=(client, random.Random(seed + i)))
+                   for i, client in enumerate(clients)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        wall = time.perf_counter() - started
+        rss = worker_rss_mb(process.pid)
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies.sort()
+    print(f"{worker_class:<8} concurrency {concurrency:>4}  "
+          f"throughput {requests / wall:7.1f} req/s  "
+          f"p50 {percentile(latencies, 50) * 1000:7.0f}ms  "
+          f"p99 {percentile(latencies, 99) * 1000:7.0f}ms  "
+          f"rss {'%6.1fMiB' % rss if rss is not None else '     n/a'}  "
+          f"{dict(sorted(statuses.items()))}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[8, 32, 128])
+    parser.add_argument('--requests', type=int, default=400, help="requests per run")
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--worker-class', nargs='+', choices=WORKER_CLASSES, default=list(WORKER_CLASSES))
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    gemini = FakeGeminiServer(latency=args.latency, seed=args.seed).start()
+    photos = small_photos(8, args.seed)
+    try:
+        for concurrency in args.concurrency:
+            for worker_class in args.worker_class:
+                run(worker_class, concurrency, max(args.requests, 2 * concurrency), photos,
+                    gemini.base_url, args.seed)
+    finally:
+        gemini.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Lookup latency of the local food index as it grows.
+
+For each size a synthetic index of that many foods is written, then
+opened (mmap, so the cost should not grow with size) and queried with
+exact names, names with a typo, names with an extra leading word (found
+through their trailing words), and unknown names. Also reported: a whole
+typed meal through estimate(), and record() learning from analyses,
+which is the cost added to each /analyze.
+
+Usage: python -m benchmarks.bench_food_index [--sizes 1000 100000] [--lookups 5000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from models.food_index import FoodIndex, write_index
+
+WORDS = ['grilled', 'fried', 'baked', 'steamed', 'roast', 'spicy', 'sweet', 'brown', 'green',
+         'chicken', 'rice', 'egg', 'toast', 'salad', 'noodle', 'bean', 'potato', 'tofu',
+         'salmon', 'beef', 'curry', 'soup', 'cheese', 'apple', 'bread', 'yogurt', 'pork']
+
+
+def food_names(count, seed=1):
+    rng = random.Random(seed)
+    names = set()
+    while len(names) < count:
+        names.add(' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4))))
+    return sorted(names)
+
+
+def typo(name, rng):
+    position = rng.randrange(len(name))
+    return name[:position] + rng.choice('aeiou') + name[position + 1:]
+
+
+def per_call_us(fn, args):
+    start = time.perf_counter()
+    for arg in args:
+        fn(arg)
+    return (time.perf_counter() - start) / len(args) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--lookups', type=int, default=5000)
+    args = parser.parse_args()
+
+    rng = random.Random(2)
+    print(f"{'foods':>7} {'file':>8} {'open':>8} {'exact':>8} {'typo':>8} {'partial':>8} "
+          f"{'miss':>8} {'estimate':>9} {'record':>8}")
+    with tempfile.TemporaryDirectory() as directory:
+        for size in args.sizes:
+            path = os.path.join(directory, f"foods-{size}.bin")
+            names = food_names(size)
+            write_index(path, [(name, rng.uniform(50, 600), rng.uniform(0, 40), rng.uniform(0, 30),
+                                rng.uniform(0, 80), rng.randint(2, 500)) for name in names])
+            index = FoodIndex(path, os.path.join(directory, f"stats-{size}.sqlite3"),
+                              rebuild_every=float('inf'), reload_interval=float('inf'))
+            start = time.perf_counter()
+            index._checked = float('-inf')
+            len(index)
+            open_ms = (time.perf_counter() - start) * 1e3
+
+            sample = [rng.choice(names) for _ in range(args.lookups)]
+            exact = per_call_us(index.lookup, sample)
+            typos = per_call_us(index.lookup, [typo(name, rng) for name in sample])
+            partial = per_call_us(index.lookup, [f"homemade {name}" for name in sample])
+            miss = per_call_us(index.lookup, [f"zz{name}" for name in sample])
+            meals = [[f"2 {rng.choice(names)}", rng.choice(names), f"half a {rng.choice(names)}"]
+                     for _ in range(args.lookups // 10)]
+            estimate = per_call_us(index.estimate, meals)
+            results = [{'food_items': meal, 'total_calories': 650,
+                        'macros': {'protein': 30, 'fat': 30, 'carbs': 40}} for meal in meals]
+            record = per_call_us(lambda result: index.record([result]), results)
+            index.close()
+            print(f"{size:7d} {os.path.getsize(path) / 1024:6.0f}KB {open_ms:6.2f}ms "
+                  f"{exact:6.1f}us {typos:6.1f}us {partial:6.1f}us {miss:6.1f}us "
+                  f"{estimate:7.1f}us {record:6.1f}us")
+
+
+if __name__ == '__main__':
+    main()
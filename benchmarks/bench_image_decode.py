@@ -0,0 +1,121 @@
+"""
+Decode time and peak RSS of the upload preprocessing path.
+
+Compares the previous path (full Image.open + thumbnail + JPEG encode) with
+prepare_image (passthrough for small uploads, draft-mode reduced decode for
+large JPEGs) over generated JPEG/PNG uploads of increasing size. Each
+(case, path) runs in a fresh interpreter so peak RSS is per request.
+
+Usage: python -m benchmarks.bench_image_decode --iterations 10
+"""
+import argparse
+import io
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+
+SIZES = [(800, 600), (1024, 768), (2048, 1536), (4032, 3024), (6000, 4000)]
+FORMATS = ['JPEG', 'PNG']
+
+
+def legacy_process(data):
+    from PIL import Image
+    image = Image.open(io.BytesIO(data))
+    image.thumbnail((1024, 1024))
+    buffered = io.BytesIO()
+    image.convert('RGB').save(buffered, format='JPEG')
+    return buffered.getvalue()
+
+
+def prepared_process(data):
+    from models.image_processing import prepare_image
+    return prepare_image(data).data
+
+
+def make_corpus(directory):
+    from benchmarks.bench_response_size import synthetic_photo
+    from PIL import Image
+
+    corpus = []
+    for width, height in SIZES:
+        jpeg = synthetic_photo(width, height)
+        for fmt in FORMATS:
+            path = os.path.join(directory, f"{width}x{height}.{fmt.lower()}")
+            if fmt == 'JPEG':
+                data = jpeg
+            else:
+                buffered = io.BytesIO()
+                Image.open(io.BytesIO(jpeg)).save(buffered, format='PNG')
+                data = buffered.getvalue()
+            with open(path, 'wb') as f:
+                f.write(data)
+            corpus.append((f"{width}x{height} {fmt}", path, len(data)))
+    return corpus
+
+
+def peak_rss_mb():
+    """Peak RSS of this process; VmHWM resets on exec, unlike ru_maxrss."""
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def worker(path, method, iterations):
+    """Run one case in this process and print its timings as JSON."""
+    process = legacy_process if method == 'legacy' else prepared_process
+    with open(path, 'rb') as f:
+        data = f.read()
+    # Warm up imports so only per-request work is timed
+    process(data)
+    timings = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        process(data)
+        timings.append(time.perf_counter() - start)
+    print(json.dumps({
+        'ms': sorted(timings)[len(timings) // 2] * 1000,
+        'peak_mb': peak_rss_mb(),
+    }))
+
+
+def run_case(path, method, iterations):
+    output = subprocess.check_output([
+        sys.executable, '-m', 'benchmarks.bench_image_decode',
+        '--worker', path, '--method', method, '--iterations', str(iterations),
+    ])
+    return json.loads(output)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--iterations', type=int, default=10)
+    parser.add_argument('--worker')
+    parser.add_argument('--method', default='prepared')
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args.worker, args.method, args.iterations)
+        return
+
+    with tempfile.TemporaryDirectory() as directory:
+        corpus = make_corpus(directory)
+        print(f"{'upload':<16}{'size':>9}  {'legacy ms':>10}{'peak MB':>9}  "
+              f"{'prepared ms':>12}{'peak MB':>9}")
+        for label, path, size in corpus:
+            legacy = run_case(path, 'legacy', args.iterations)
+            prepared = run_case(path, 'prepared', args.iterations)
+            print(f"{label:<16}{size / 1024:>7.0f}KB  {legacy['ms']:>10.1f}{legacy['peak_mb']:>9.1f}  "
+                  f"{prepared['ms']:>12.1f}{prepared['peak_mb']:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
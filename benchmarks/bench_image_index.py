@@ -0,0 +1,61 @@
+"""
+Near-duplicate index lookup latency at 10^5 and 10^6 stored hashes.
+
+Usage: python -m benchmarks.bench_image_index [--sizes 100000 1000000]
+"""
+import argparse
+import random
+import time
+
+from models.image_index import PerceptualIndex
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def run(size, max_distance, queries, rng):
+    index = PerceptualIndex(max_distance=max_distance, max_entries=size)
+    hashes = [rng.getrandbits(64) for _ in range(size)]
+    start = time.perf_counter()
+    for i, image_hash in enumerate(hashes):
+        index.add(image_hash, 'Weight Loss:Vegan', i)
+    build_s = time.perf_counter() - start
+
+    # Half the queries are near duplicates, half are unseen images
+    probes = []
+    for _ in range(queries // 2):
+        probes.append(flip_bits(rng.choice(hashes), rng.randint(0, max_distance), rng))
+        probes.append(rng.getrandbits(64))
+
+    timings = []
+    found = 0
+    for probe in probes:
+        start = time.perf_counter()
+        match = index.lookup(probe, 'Weight Loss:Vegan')
+        timings.append(time.perf_counter() - start)
+        found += match is not None
+
+    timings.sort()
+    p50 = timings[len(timings) // 2] * 1e6
+    p99 = timings[int(len(timings) * 0.99)] * 1e6
+    print(f"{size:>9} entries  build {build_s:6.2f}s  "
+          f"lookup p50 {p50:7.1f}us  p99 {p99:7.1f}us  hits {found}/{len(probes)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100000, 1000000])
+    parser.add_argument('--max-distance', type=int, default=4)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    rng = random.Random(1234)
+    for size in args.sizes:
+        run(size, args.max_distance, args.queries, rng)
+
+
+if __name__ == '__main__':
+    main()
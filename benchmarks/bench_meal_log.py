@@ -0,0 +1,118 @@
+"""
+Meal log summary latency as the history grows to 10^6 meals.
+
+Synthetic meals (three a day per user) are bulk-loaded in steps. After
+each step the benchmark times the queries behind /summary/daily (one
+week), /summary/weekly (twelve weeks) and /meals (one day) for random
+users, next to the same weekly figures computed by scanning the user's
+meals. The rollup reads stay flat as history grows; the scan grows with
+each user's history.
+
+Usage: python -m benchmarks.bench_meal_log [--sizes 10000 100000 1000000]
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from models.meal_log import MealLog
+
+MEALS_PER_DAY = 3
+
+
+def synthetic_meals(count, users, start_index, rng):
+    """Yield (user_id, logged_at, result) tuples, spreading meals over users and days."""
+    origin = datetime(2024, 1, 1, 8)
+    for i in range(start_index, start_index + count):
+        user = i % users
+        slot = i // users
+        logged_at = origin + timedelta(days=slot // MEALS_PER_DAY, hours=5 * (slot % MEALS_PER_DAY))
+        protein = rng.randint(10, 40)
+        fat = rng.randint(10, 40)
+        yield f"user{user}@example.com", logged_at, {
+            'food_items': ['rice', 'chicken'],
+            'total_calories': rng.randint(200, 900),
+            'macros': {'protein': protein, 'fat': fat, 'carbs': 100 - protein - fat},
+            'health_score': rng.randint(1, 10),
+        }
+
+
+def percentiles(timings):
+    timings.sort()
+    return timings[len(timings) // 2] * 1e6, timings[int(len(timings) * 0.99)] * 1e6
+
+
+def time_queries(meal_log, users, last_day, queries, rng):
+    results = {}
+    cases = {
+        'daily (7d)': lambda user, day: meal_log.daily_totals(user, day - timedelta(days=6), day),
+        'weekly (12w)': lambda user, day: meal_log.weekly_totals(user, day - timedelta(weeks=11), day),
+        'meals (1d)': lambda user, day: meal_log.meals_for_day(user, day),
+    }
+    with meal_log._connection() as conn:
+        def weekly_scan(user, day):
+            first = day - timedelta(weeks=11)
+            return conn.execute(
+                "SELECT strftime('%W', day), COUNT(*), SUM(calories), SUM(protein_g) "
+                "FROM meals WHERE user_id = ? AND day BETWEEN ? AND ? GROUP BY 1",
+                (user, first.isoformat(), day.isoformat()),
+            ).fetchall()
+
+        def lifetime_scan(user, day):
+            return conn.execute(
+                "SELECT COUNT(*), SUM(calories) FROM meals WHERE user_id = ?", (user,)
+            ).fetchone()
+
+        cases['weekly scan'] = weekly_scan
+        cases['lifetime scan'] = lifetime_scan
+
+        for name, query in cases.items():
+            timings = []
+            for _ in range(queries):
+                user = f"user{rng.randrange(users)}@example.com"
+                day = last_day - timedelta(days=rng.randrange(7))
+                start = time.perf_counter()
+                query(user, day)
+                timings.append(time.perf_counter() - start)
+            results[name] = percentiles(timings)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--users', type=int, default=1000)
+    parser.add_argument('--queries', type=int, default=500)
+    args = parser.parse_args()
+
+    rng = random.Random(1234)
+    with tempfile.TemporaryDirectory() as directory:
+        meal_log = MealLog(os.path.join(directory, 'meal_log.sqlite3'))
+        loaded = 0
+        for size in sorted(args.sizes):
+            start = time.perf_counter()
+            loaded += meal_log.import_meals(synthetic_meals(size - loaded, args.users, loaded, rng))
+            load_s = time.perf_counter() - start
+
+            last_slot = (loaded - 1) // args.users
+            last_day = (datetime(2024, 1, 1) + timedelta(days=last_slot // MEALS_PER_DAY)).date()
+            print(f"{loaded:>9} meals  ({loaded // args.users} per user)  load {load_s:6.2f}s")
+            for name, (p50, p99) in time_queries(meal_log, args.users, last_day, args.queries, rng).items():
+                print(f"    {name:<14} p50 {p50:8.1f}us  p99 {p99:8.1f}us")
+
+        # Logging a meal the way /analyze does, on top of the full history
+        timings = []
+        for i in range(args.queries):
+            meal = next(synthetic_meals(1, args.users, loaded + i, rng))
+            start = time.perf_counter()
+            meal_log.log_meal(meal[0], meal[2], meal[1])
+            timings.append(time.perf_counter() - start)
+        p50, p99 = percentiles(timings)
+        print(f"log_meal on {loaded} meals  p50 {p50:8.1f}us  p99 {p99:8.1f}us")
+        meal_log.close()
+
+
+if __name__ == '__main__':
+    main()
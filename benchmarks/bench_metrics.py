@@ -0,0 +1,117 @@
+"""
+Cost of the hot-path instrumentation, next to the form dump it replaces.
+
+Times, per call: a histogram observation through Metrics.stage(), a
+counter increment, the old unconditional logger.info() form dump (to a
+discarding handler) against the level-guarded debug dump, and rendering
+/metrics with every pipeline stage populated. Finally /analyze is driven
+through the test client against the fake Gemini server with metrics
+enabled and disabled.
+
+Usage: python -m benchmarks.bench_metrics [--calls 200000] [--requests 200]
+"""
+import argparse
+import io
+import logging
+import os
+import time
+
+from models.metrics import Metrics
+
+FORM = {
+    'gender': 'Male', 'age': '30', 'weight': '80', 'height': '180',
+    'activity_level': 'Sedentary (Office Job)', 'goal': 'Weight Loss', 'diet_type': 'Keto',
+}
+STAGES = ['decode', 'thumbnail', 'encode', 'model_call', 'json_parse', 'calculator', 'serialize']
+
+
+def per_call(fn, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        fn()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def micro(calls):
+    metrics = Metrics()
+
+    def stage():
+        with metrics.stage('calculator'):
+            pass
+
+    logger = logging.getLogger('bench_metrics')
+    logger.propagate = False
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.INFO)
+
+    def old_dump():
+        logger.info(f"Received form data: {dict(FORM)}")
+        logger.info(f"Parsed values - gender: {FORM['gender']}, activity: {FORM['activity_level']}, "
+                    f"goal: {FORM['goal']}, diet: {FORM['diet_type']}")
+
+    def guarded_dump():
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(f"Received form data: {dict(FORM)}")
+            logger.debug(f"Parsed values - gender: {FORM['gender']}, activity: {FORM['activity_level']}, "
+                         f"goal: {FORM['goal']}, diet: {FORM['diet_type']}")
+
+    print(f"stage() observation     {per_call(stage, calls):7.2f}us")
+    print(f"counter inc             {per_call(lambda: metrics.requests.inc(endpoint='main.analyze', status=200), calls):7.2f}us")
+    print(f"form dump, logger.info  {per_call(old_dump, calls):7.2f}us")
+    print(f"form dump, guarded      {per_call(guarded_dump, calls):7.2f}us")
+
+    for name in STAGES:
+        metrics.observe_stage(name, 0.01)
+    print(f"render /metrics         {per_call(metrics.render, 1000):7.2f}us")
+
+
+def analyze(requests, enabled):
+    from PIL import Image
+    from app import create_app
+
+    os.environ['METRICS_ENABLED'] = 'true' if enabled else 'false'
+    app = create_app()
+    client = app.test_client()
+    client.get('/auth/guest')
+    buffered = io.BytesIO()
+    Image.new('RGB', (300, 200), 'red').save(buffered, 'JPEG')
+    image = buffered.getvalue()
+
+    timings = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        response = client.post('/analyze', data={**FORM, 'image': (io.BytesIO(image), 'meal.jpg')},
+                    content_type='multipart/form-data')
+        timings.append(time.perf_counter() - start)
+        assert response.status_code == 200, response.get_data(as_text=True)
+    timings.sort()
+    print(f"/analyze metrics {'on ' if enabled else 'off'}    p50 {timings[len(timings) // 2] * 1e3:6.2f}ms  "
+          f"p99 {timings[int(len(timings) * 0.99)] * 1e3:6.2f}ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--requests', type=int, default=200)
+    args = parser.parse_args()
+
+    micro(args.calls)
+
+    from benchmarks.fake_gemini import FakeGeminiServer
+    server = FakeGeminiServer(latency=0).start()
+    os.environ['GEMINI_BASE_URL'] = server.base_url
+    os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+    # Every request must reach the model, not the caches
+    os.environ['ANALYSIS_CACHE_MAX_ENTRIES'] = '0'
+    os.environ['NEAR_DUPLICATE_MAX_DISTANCE'] = '-1'
+    os.environ['MEAL_LOG_PATH'] = ''
+    os.environ['GEMINI_RATE_LIMIT'] = '0'
+    try:
+        for enabled in (False, True, False, True):
+            analyze(args.requests, enabled)
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,47 @@
+"""
+Image preprocessing throughput on request threads versus worker processes.
+
+Eight threads (the gunicorn gthread default) each prepare large phone-sized
+JPEG uploads, either directly (contending for the GIL) or through
+PreprocessPool.
+
+Usage: python -m benchmarks.bench_preprocess_pool --uploads 64 --workers 4
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from benchmarks.bench_response_size import synthetic_photo
+from models.image_processing import prepare_image
+from models.preprocess_pool import PreprocessPool
+
+
+def run(label, prepare, data, uploads, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(lambda _: prepare(data), range(uploads)))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<18} {uploads / elapsed:6.1f} uploads/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--uploads', type=int, default=64)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 2)
+    args = parser.parse_args()
+
+    data = synthetic_photo(4032, 3024)
+    run('request threads', prepare_image, data, args.uploads, args.threads)
+
+    pool = PreprocessPool(max_workers=args.workers, max_pending=args.threads)
+    try:
+        pool.prepare(data)  # start the workers
+        run(f'{args.workers} processes', pool.prepare, data, args.uploads, args.threads)
+    finally:
+        pool.shutdown()
+
+
+if __name__ == '__main__':
+    main()
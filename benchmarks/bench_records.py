@@ -0,0 +1,107 @@
+"""
+Memory held by 10^6 analyses in each in-memory representation.
+
+Each record starts as the JSON text the model returns (with per-record
+numbers and text, so nothing is shared between records) and is kept as:
+the decoded dict, a NutritionResult, a MealRecord, a list of packed
+MealRecord bytes, or one contiguous packed buffer with an offset array.
+Memory is measured with tracemalloc; pack/unpack speed is timed too.
+
+Usage: python -m benchmarks.bench_records [--records 1000000]
+"""
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+from array import array
+
+from benchmarks.fake_gemini import SAMPLE_ANALYSIS
+from models.user_profile import MealRecord, NutritionResult
+
+
+def analysis_json(i):
+    analysis = dict(SAMPLE_ANALYSIS)
+    analysis['total_calories'] = 300 + i % 700
+    analysis['macros'] = {'protein': f'{20 + i % 20}%', 'fat': f'{15 + i % 15}%',
+                          'carbs': f'{65 - i % 20 - i % 15}%'}
+    analysis['health_score'] = i % 10 + 1
+    analysis['burn_off'] = {'walking': i % 90, 'running': i % 45, 'swimming': i % 60}
+    analysis['analysis'] = f"Meal {i}: " + SAMPLE_ANALYSIS['analysis']
+    analysis['suggestion'] = f"Tip {i}: " + SAMPLE_ANALYSIS['suggestion']
+    return json.dumps(analysis)
+
+
+class PackedBuffer:
+    """Records packed back to back in one bytearray, located by an offset array."""
+
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = array('Q')
+
+    def append(self, record):
+        self.offsets.append(len(self.data))
+        self.data += record.pack()
+
+
+def measure(name, count, build):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    held = build(count)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{name:<22} {current / 2**20:8.1f} MiB  {current / count:7.0f} B/record  "
+          f"(built in {elapsed:5.1f}s)")
+    return held
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--records', type=int, default=1000000)
+    args = parser.parse_args()
+    count = args.records
+
+    def dicts(n):
+        return [json.loads(analysis_json(i)) for i in range(n)]
+
+    def results(n):
+        return [NutritionResult.from_dict(json.loads(analysis_json(i))) for i in range(n)]
+
+    def records(n):
+        return [MealRecord.from_dict(json.loads(analysis_json(i))) for i in range(n)]
+
+    def packed(n):
+        return [MealRecord.from_dict(json.loads(analysis_json(i))).pack() for i in range(n)]
+
+    def buffer(n):
+        packed_buffer = PackedBuffer()
+        for i in range(n):
+            packed_buffer.append(MealRecord.from_dict(json.loads(analysis_json(i))))
+        return packed_buffer
+
+    print(f"{count} analyses")
+    for name, build in (('dict', dicts), ('NutritionResult', results), ('MealRecord', records),
+                        ('packed bytes list', packed)):
+        measure(name, count, build)
+    packed_buffer = measure('packed buffer', count, buffer)
+
+    # Decoding speed straight out of the shared buffer
+    start = time.perf_counter()
+    for offset in packed_buffer.offsets:
+        MealRecord.unpack_from(packed_buffer.data, offset)
+    unpack_s = time.perf_counter() - start
+
+    sample = [MealRecord.from_dict(json.loads(analysis_json(i))) for i in range(min(count, 100000))]
+    start = time.perf_counter()
+    for record in sample:
+        record.pack()
+    pack_s = time.perf_counter() - start
+    print(f"pack {pack_s / len(sample) * 1e6:.2f}us/record  "
+          f"unpack_from {unpack_s / count * 1e6:.2f}us/record")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Parsing model output: plain json.loads vs the compiled schema validator.
+
+A seeded fuzz corpus is built from well-formed analyses with the defects
+models actually produce: code fences, prose around the JSON, trailing
+commas, numbers and booleans as strings, percent strings, a lone string
+where a list belongs, missing fields and truncated output. Each response
+goes through the old path (json.loads, then NutritionResult.from_dict
+filling in defaults) and through response_schema.parse_analysis.
+
+Reported per path: throughput, responses that fail outright (each one a
+user retry and a fresh model call), and for the old path responses that
+parse but hand the UI wrong or defaulted fields.
+
+Usage: python -m benchmarks.bench_response_parsing [--responses 20000]
+"""
+import argparse
+import json
+import random
+import time
+
+from benchmarks.fake_gemini import SAMPLE_ANALYSIS
+from models import response_schema
+from models.user_profile import NutritionResult
+
+
+def base_analysis(rng):
+    analysis = json.loads(json.dumps(SAMPLE_ANALYSIS))
+    analysis['total_calories'] = rng.randint(150, 1400)
+    protein = rng.randint(10, 50)
+    fat = rng.randint(10, 40)
+    analysis['macros'] = {'protein': protein, 'fat': fat, 'carbs': 100 - protein - fat}
+    analysis['health_score'] = rng.randint(1, 10)
+    analysis['is_diet_compliant'] = rng.random() < 0.5
+    return analysis
+
+
+# Defects applied to the decoded value; True when it stays recoverable
+def percent_strings(analysis, rng):
+    analysis['macros'] = {k: f"{v}%" for k, v in analysis['macros'].items()}
+    return True
+
+
+def numeric_strings(analysis, rng):
+    analysis['total_calories'] = rng.choice(['{}', '{} kcal', '{}.0']).format(analysis['total_calories'])
+    analysis['health_score'] = str(analysis['health_score'])
+    return True
+
+
+def boolean_string(analysis, rng):
+    analysis['is_diet_compliant'] = rng.choice(['true', 'false', 'yes', 'no'])
+    return True
+
+
+def lone_food_item(analysis, rng):
+    analysis['food_items'] = analysis['food_items'][0]
+    return True
+
+
+def missing_field(analysis, rng):
+    del analysis[rng.choice(['total_calories', 'macros', 'burn_off', 'health_score'])]
+    return False
+
+
+VALUE_DEFECTS = [percent_strings, numeric_strings, boolean_string, lone_food_item, missing_field]
+
+
+# Defects applied to the JSON text
+def code_fence(text, rng):
+    return f"```json\n{text}\n```", True
+
+
+def surrounding_prose(text, rng):
+    return f"Here is the analysis of your meal:\n{text}\nLet me know if you need more.", True
+
+
+def trailing_commas(text, rng):
+    return text.replace(']', ',]', 1).replace('}', ',}').replace(',,', ','), True
+
+
+def truncated(text, rng):
+    # Cut inside the JSON itself, not just the prose after it
+    return text[:rng.randint(len(text) // 3, text.rfind('}') - 1)], False
+
+
+TEXT_DEFECTS = [code_fence, surrounding_prose, trailing_commas, truncated]
+
+
+def build_corpus(count, seed):
+    """Return (text, recoverable) pairs; about a third are clean."""
+    rng = random.Random(seed)
+    corpus = []
+    for _ in range(count):
+        analysis = base_analysis(rng)
+        recoverable = True
+        if rng.random() < 0.66:
+            defects = rng.sample(VALUE_DEFECTS, rng.choice([0, 1, 1, 2]))
+            # Drop a field only after the others have been mangled
+            for defect in sorted(defects, key=VALUE_DEFECTS.index):
+                recoverable &= defect(analysis, rng)
+            text = json.dumps(analysis, indent=rng.choice([None, 2]))
+            for defect in rng.sample(TEXT_DEFECTS, rng.choice([0, 1, 1, 2])):
+                text, ok = defect(text, rng)
+                recoverable &= ok
+        else:
+            text = json.dumps(analysis)
+        corpus.append((text, recoverable))
+    return corpus
+
+
+def old_parse(text):
+    return NutritionResult.from_dict(json.loads(text))
+
+
+def new_parse(text):
+    return NutritionResult.from_dict(response_schema.parse_analysis(text))
+
+
+def wrong_fields(result):
+    """True when a parsed result would show the user defaulted or mistyped fields."""
+    return not (
+        isinstance(result.total_calories, int) and result.total_calories > 0
+        and isinstance(result.health_score, int) and result.health_score > 0
+        and isinstance(result.is_diet_compliant, bool)
+        and isinstance(result.food_items, list)
+        and all(isinstance(v, (int, float)) for v in result.macros.values()) and result.macros
+        and result.burn_off
+    )
+
+
+def run(name, parse, corpus):
+    failures = 0
+    garbage = 0
+    start = time.perf_counter()
+    results = []
+    for text, _ in corpus:
+        try:
+            results.append(parse(text))
+        except Exception:
+            failures += 1
+            results.append(None)
+    elapsed = time.perf_counter() - start
+    garbage = sum(1 for result in results if result is not None and wrong_fields(result))
+    count = len(corpus)
+    print(f"{name:<10} {count / elapsed / 1000:7.1f}k/s  "
+          f"re-requests {failures:>6} ({failures / count:6.1%})  "
+          f"accepted with wrong fields {garbage:>6} ({garbage / count:6.1%})")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--responses', type=int, default=20000)
+    parser.add_argument('--seed', type=int, default=1234)
+    args = parser.parse_args()
+
+    corpus = build_corpus(args.responses, args.seed)
+    clean = [(json.dumps(base_analysis(random.Random(i))), True) for i in range(args.responses)]
+    unrecoverable = sum(1 for _, recoverable in corpus if not recoverable)
+    print(f"{len(corpus)} fuzzed responses, {unrecoverable} ({unrecoverable / len(corpus):.1%}) unrecoverable")
+
+    print("clean output")
+    run('json.loads', old_parse, clean)
+    run('validator', new_parse, clean)
+    print("fuzz corpus")
+    run('json.loads', old_parse, corpus)
+    new_results = run('validator', new_parse, corpus)
+
+    # The validator must reject exactly the unrecoverable responses
+    wrong = sum(1 for (_, recoverable), result in zip(corpus, new_results)
+                if recoverable != (result is not None))
+    print(f"validator verdicts disagreeing with the corpus labels: {wrong}")
+
+
+if __name__ == '__main__':
+    main()
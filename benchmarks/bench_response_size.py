@@ -0,0 +1,83 @@
+"""
+/analyze response size and server CPU per request for each image mode.
+
+The analysis cache is warmed first, so the numbers isolate the image
+round-trip: 'inline' re-encodes and base64-embeds the image, 'url' stores
+it once and returns a /images/<digest> link, 'none' skips it entirely.
+
+Usage: python -m benchmarks.bench_response_size --requests 30
+"""
+import argparse
+import io
+import os
+import random
+import time
+
+from PIL import Image
+
+from benchmarks.fake_gemini import FakeGeminiServer
+
+PROFILE_FORM = {
+    'gender': 'Female',
+    'age': '34',
+    'weight': '62',
+    'height': '165',
+    'activity_level': 'Lightly Active (1-3 days/wk)',
+    'goal': 'Maintain Weight',
+    'diet_type': 'No Restriction',
+}
+
+
+def synthetic_photo(width, height, seed=0):
+    """A noisy JPEG that compresses roughly like a real meal photo."""
+    rng = random.Random(seed)
+    small = Image.new('RGB', (width // 8, height // 8))
+    small.putdata([
+        (rng.randint(60, 255), rng.randint(40, 200), rng.randint(0, 150))
+        for _ in range((width // 8) * (height // 8))
+    ])
+    buffered = io.BytesIO()
+    small.resize((width, height), Image.BICUBIC).save(buffered, format='JPEG', quality=85)
+    return buffered.getvalue()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=30)
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(latency=0.0).start()
+    os.environ['GEMINI_BASE_URL'] = server.base_url
+    os.environ.setdefault('GOOGLE_API_KEY', 'benchmark-key')
+
+    from app import create_app
+    app = create_app()
+    client = app.test_client()
+    client.get('/auth/guest')
+
+    try:
+        for width, height in [(640, 480), (1024, 768), (1024, 1024)]:
+            photo = synthetic_photo(width, height)
+            print(f"{width}x{height} upload, {len(photo) / 1024:.0f} KiB")
+            for mode in ('inline', 'url', 'none'):
+                def post():
+                    return client.post('/analyze', data={
+                        **PROFILE_FORM,
+                        'image_mode': mode,
+                        'image': (io.BytesIO(photo), 'meal.jpg'),
+                    }, content_type='multipart/form-data')
+
+                post()  # warm the analysis cache
+                sizes = []
+                cpu_start = time.process_time()
+                for _ in range(args.requests):
+                    sizes.append(len(post().data))
+                cpu_ms = (time.process_time() - cpu_start) / args.requests * 1000
+                print(f"  {mode:<7} response {sum(sizes) / len(sizes) / 1024:8.1f} KiB  "
+                      f"cpu {cpu_ms:6.1f}ms/request")
+    finally:
+        server.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+"""
+Per-request session cost: signed cookie vs server-side session stores.
+
+A guest logs in and saves a profile, then the benchmark replays a
+read-only request (the session is loaded but not changed) and a writing
+request (the profile is saved again) for each SESSION_BACKEND. It reports
+the Cookie header the browser sends on every request, the Set-Cookie
+bytes per write, and the time spent loading and saving the session.
+
+Usage: python -m benchmarks.bench_session [--requests 5000]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from flask import request
+
+from app import create_app
+from benchmarks.bench_response_size import PROFILE_FORM
+
+
+def session_roundtrip(app, cookie_header, modify):
+    """
+    Open and save the session the way Flask does around a request.
+
+    Returns the response and the seconds spent in the session interface.
+    """
+    interface = app.session_interface
+    with app.test_request_context('/', headers={'Cookie': cookie_header}):
+        response = app.response_class()
+        start = time.perf_counter()
+        sess = interface.open_session(app, request)
+        sess.get('user')
+        if modify:
+            sess['user_profile'] = dict(sess['user_profile'])
+        interface.save_session(app, sess, response)
+        elapsed = time.perf_counter() - start
+    return response, elapsed
+
+
+def run(backend, requests):
+    os.environ['SESSION_BACKEND'] = backend
+    app = create_app()
+    client = app.test_client()
+    client.get('/auth/guest')
+    client.post('/update_profile', data=PROFILE_FORM)
+
+    cookie_name = app.config['SESSION_COOKIE_NAME']
+    cookie = client.get_cookie(cookie_name)
+    cookie_header = f"{cookie_name}={cookie.value}"
+
+    timings = {}
+    set_cookie_bytes = 0
+    for modify in (False, True):
+        total = 0.0
+        for _ in range(requests):
+            response, elapsed = session_roundtrip(app, cookie_header, modify)
+            total += elapsed
+        timings[modify] = total / requests * 1e6
+        if modify:
+            set_cookie_bytes = sum(len(v) for v in response.headers.getlist('Set-Cookie'))
+
+    print(f"{backend:<7} Cookie header {len(cookie_header):>4} B  "
+          f"Set-Cookie per write {set_cookie_bytes:>4} B  "
+          f"read {timings[False]:6.1f}us  write {timings[True]:6.1f}us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=5000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        os.environ['SESSION_PATH'] = os.path.join(directory, 'sessions.sqlite3')
+        os.environ['MEAL_LOG_PATH'] = ''
+        for backend in ('cookie', 'memory', 'sqlite'):
+            run(backend, args.requests)
+
+
+if __name__ == '__main__':
+    main()
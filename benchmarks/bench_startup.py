@@ -0,0 +1,140 @@
+"""
+Cold-start cost: what importing the app loads, and how long a fresh
+process takes to answer its first requests.
+
+First the slowest imports of `from app import create_app; create_app()`
+are listed from `python -X importtime`. Then, for each WARM_UP mode, fresh
+interpreters are started and timed (from spawning the process) until
+create_app() returns, until the first /login response, and until the
+first /analyze response against the fake Gemini server, which includes
+loading the genai SDK and PIL. Medians over --runs are reported.
+
+The script exits non-zero if the median time to the first /login
+response in any mode exceeds --budget-ms, so it can guard deployments
+where every scale-up pays the cold start.
+
+Usage: python -m benchmarks.bench_startup [--runs 5] [--budget-ms 500] [--top 15]
+"""
+import argparse
+import io
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+IMPORT_LINE = re.compile(r'import time:\s+(?P<self>\d+) \|\s+(?P<cumulative>\d+) \| (?P<name>.+)$')
+
+IMPORT_APP = "from app import create_app; create_app()"
+
+# Runs in the fresh interpreter; prints the wall-clock time of each milestone
+CHILD = """
+import io, json, sys, time
+from app import create_app
+app = create_app()
+created = time.time()
+client = app.test_client()
+assert client.get('/login').status_code == 200
+first_response = time.time()
+client.get('/auth/guest')
+with open(sys.argv[1], 'rb') as f:
+    image = f.read()
+response = client.post('/analyze', data={
+    'gender': 'Male', 'age': '30', 'weight': '80', 'height': '180',
+    'activity_level': 'Sedentary (Office Job)', 'goal': 'Weight Loss', 'diet_type': 'Keto',
+    'image': (io.BytesIO(image), 'meal.jpg')}, content_type='multipart/form-data')
+assert response.status_code == 200, response.get_data(as_text=True)
+first_analysis = time.time()
+print(json.dumps({'created': created, 'first_response': first_response,
+                  'first_analysis': first_analysis}))
+"""
+
+
+def child_env(**overrides):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = ROOT + os.pathsep + env.get('PYTHONPATH', '')
+    env.update(overrides)
+    return env
+
+
+def import_times(top):
+    """The slowest imports (cumulative) under create_app, from -X importtime."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', IMPORT_APP],
+                            cwd=ROOT, env=child_env(WARM_UP='off'),
+                            capture_output=True, text=True, check=True)
+    modules = []
+    for line in result.stderr.splitlines():
+        match = IMPORT_LINE.match(line)
+        if match:
+            # Nested imports are indented; only top-level ones add up to the total
+            modules.append((int(match['cumulative']), int(match['self']),
+                            match['name'].strip(), match['name'][0] != ' '))
+    total = sum(cumulative for cumulative, _, _, top_level in modules if top_level)
+    print(f"imports under create_app: {len(modules)} modules, {total / 1e3:.0f}ms")
+    for cumulative, self_us, name, _ in sorted(modules, reverse=True)[:top]:
+        print(f"  {cumulative / 1e3:7.1f}ms  (self {self_us / 1e3:5.1f}ms)  {name}")
+    for heavy in ('google.genai', 'PIL.Image', 'authlib'):
+        loaded = any(name == heavy for _, _, name, _ in modules)
+        print(f"  {heavy:<14} {'loaded at start-up' if loaded else 'deferred'}")
+
+
+def cold_start(image_path, warm_up):
+    started = time.time()
+    result = subprocess.run([sys.executable, '-c', CHILD, image_path], cwd=ROOT,
+                            env=child_env(WARM_UP=warm_up), capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr)
+    milestones = json.loads(result.stdout.strip().splitlines()[-1])
+    return {name: (at - started) * 1e3 for name, at in milestones.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--budget-ms', type=float, default=500)
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--warm-up', default='off,background',
+                        help="comma-separated WARM_UP modes to time")
+    args = parser.parse_args()
+
+    import_times(args.top)
+
+    from PIL import Image
+    from benchmarks.fake_gemini import FakeGeminiServer
+    server = FakeGeminiServer(latency=0).start()
+    os.environ['GEMINI_BASE_URL'] = server.base_url
+    os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+    os.environ['MEAL_LOG_PATH'] = ''
+    os.environ['GEMINI_RATE_LIMIT'] = '0'
+    buffered = io.BytesIO()
+    Image.new('RGB', (800, 600), 'red').save(buffered, 'JPEG')
+
+    over_budget = False
+    with tempfile.NamedTemporaryFile(suffix='.jpg') as image_file:
+        image_file.write(buffered.getvalue())
+        image_file.flush()
+        try:
+            print(f"\ncold start, median of {args.runs} (ms from process spawn)")
+            print(f"  {'WARM_UP':<11} {'create_app':>10} {'1st /login':>10} {'1st /analyze':>12}")
+            for warm_up in args.warm_up.split(','):
+                runs = [cold_start(image_file.name, warm_up) for _ in range(args.runs)]
+                median = {name: statistics.median(run[name] for run in runs) for name in runs[0]}
+                print(f"  {warm_up:<11} {median['created']:10.0f} {median['first_response']:10.0f} "
+                      f"{median['first_analysis']:12.0f}")
+                over_budget |= median['first_response'] > args.budget_ms
+        finally:
+            server.stop()
+
+    if over_budget:
+        print(f"FAIL: first response slower than the {args.budget_ms:g}ms budget")
+        sys.exit(1)
+    print(f"OK: first response within the {args.budget_ms:g}ms budget")
+
+
+if __name__ == '__main__':
+    main()
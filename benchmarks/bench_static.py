@@ -0,0 +1,150 @@
+"""
+Bytes transferred and request CPU per page view, with and without the
+hashed static assets and the page cache.
+
+A minimal browser is simulated on top of the Flask test client: it sends
+Accept-Encoding: gzip, br, keeps a cache honouring max-age, no-cache,
+immutable and validators (ETag / Last-Modified), and fetches the CSS and
+JS a page links to. Each page is viewed once with an empty cache and once
+more straight after, as a returning visitor would. Bytes are response
+bodies plus headers. CPU is the process time spent inside the app per
+returning view once the page itself has expired (assets are requested
+only if their caching allows), averaged over --views.
+
+Usage: python -m benchmarks.bench_static [--views 500]
+"""
+import argparse
+import gzip
+import os
+import re
+import tempfile
+import time
+
+PAGES = ['/login', '/privacy', '/terms', '/']
+
+ASSET_LINK = re.compile(r'(?:href|src)="(/(?:static|assets)/[^"]+)"')
+
+
+class Browser:
+    """Just enough of a browser cache to count what goes over the wire."""
+
+    def __init__(self, client):
+        self.client = client
+        self.cache = {}
+        self.requests = 0
+        self.bytes = 0
+
+    def _fresh(self, entry):
+        cache_control = entry['cache_control']
+        return (cache_control.max_age and not cache_control.no_cache
+                and time.monotonic() - entry['fetched'] < cache_control.max_age)
+
+    def get(self, url):
+        entry = self.cache.get(url)
+        if entry is not None and self._fresh(entry):
+            return entry['response']
+        headers = {'Accept-Encoding': 'gzip, br'}
+        if entry is not None:
+            if entry['etag']:
+                headers['If-None-Match'] = entry['etag']
+            if entry['last_modified']:
+                headers['If-Modified-Since'] = entry['last_modified']
+        response = self.client.get(url, headers=headers)
+        self.requests += 1
+        self.bytes += len(response.data) + sum(len(k) + len(v) + 4 for k, v in response.headers.items())
+        if response.status_code == 304:
+            entry['fetched'] = time.monotonic()
+            return entry['response']
+        self.cache[url] = {
+            'response': response,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'cache_control': response.cache_control,
+            'fetched': time.monotonic(),
+        }
+        return response
+
+    def view(self, url):
+        """Load a page and the assets it links to."""
+        page = self.get(url)
+        html = page.data
+        if page.headers.get('Content-Encoding') == 'gzip':
+            html = gzip.decompress(html)
+        for asset in ASSET_LINK.findall(html.decode()):
+            self.get(asset)
+
+
+class ServerTime:
+    """WSGI middleware adding up the process time spent inside the app."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+        self.seconds = 0.0
+
+    def __call__(self, environ, start_response):
+        start = time.process_time()
+        body = list(self.wsgi_app(environ, start_response))
+        self.seconds += time.process_time() - start
+        return body
+
+
+def make_app(optimized, build_path):
+    from app import create_app
+
+    os.environ['STATIC_ASSETS'] = 'hashed' if optimized else 'plain'
+    os.environ['PAGE_CACHE'] = 'true' if optimized else 'false'
+    os.environ['STATIC_BUILD_PATH'] = build_path
+    app = create_app()
+    app.wsgi_app = ServerTime(app.wsgi_app)
+    return app
+
+
+def measure(app, page, views):
+    """(requests, bytes) for a first and a repeat view, and server CPU ms per view."""
+    counts = []
+    for repeat in (False, True):
+        client = app.test_client()
+        if page == '/':
+            client.get('/auth/guest')
+        browser = Browser(client)
+        browser.view(page)
+        if repeat:
+            browser.requests = browser.bytes = 0
+            browser.view(page)
+        counts.append((browser.requests, browser.bytes))
+
+    # Returning visitors, as most page views are
+    client = app.test_client()
+    if page == '/':
+        client.get('/auth/guest')
+    browser = Browser(client)
+    browser.view(page)
+    app.wsgi_app.seconds = 0.0
+    for _ in range(views):
+        browser.view(page)
+        # Expire the page itself, so each view reaches the server
+        browser.cache[page]['fetched'] = float('-inf')
+    return counts, app.wsgi_app.seconds / views * 1e3
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--views', type=int, default=500)
+    args = parser.parse_args()
+
+    os.environ.setdefault('WARM_UP', 'off')
+    os.environ['MEAL_LOG_PATH'] = ''
+    os.environ['METRICS_ENABLED'] = 'false'
+
+    with tempfile.TemporaryDirectory() as build_path:
+        apps = {'before': make_app(False, build_path), 'after': make_app(True, build_path)}
+        print(f"{'page':<9} {'':<7} {'first view':>17} {'repeat view':>17} {'CPU/view':>9}")
+        for page in PAGES:
+            for name, app in apps.items():
+                (first, repeat), cpu = measure(app, page, args.views)
+                print(f"{page:<9} {name:<7} {first[0]:3d} req {first[1]:7d} B "
+                      f"{repeat[0]:3d} req {repeat[1]:7d} B {cpu:7.2f}ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+"""
+Memory and CPU spent on uploads that end up rejected, before and after
+header validation.
+
+Each bad upload is run through the old path (read the whole upload, then
+decode it with prepare_image(), which is where it used to fail, if at
+all) and through UploadValidator.validate(), which reads only the
+header. Every (upload, path) pair runs in a fresh process so its peak RSS
+is its own. Finally the rejected uploads are posted to /analyze through
+the test client to show the status they now get.
+
+Usage: python -m benchmarks.bench_upload_validation [--repeat 20]
+"""
+import argparse
+import io
+import json
+import os
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import zlib
+
+from benchmarks.bench_image_decode import peak_rss_mb
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FORM = {
+    'gender': 'Male', 'age': '30', 'weight': '80', 'height': '180',
+    'activity_level': 'Sedentary (Office Job)', 'goal': 'Weight Loss', 'diet_type': 'Keto',
+}
+
+
+def _png_chunk(kind, data):
+    return struct.pack('>I', len(data)) + kind + data + struct.pack('>I', zlib.crc32(kind + data))
+
+
+def png_bomb(width, height):
+    """A valid all-black grayscale PNG: tiny on the wire, width*height bytes decoded."""
+    compressor = zlib.compressobj(9)
+    row = b'\0' * (width + 1)
+    idat = b''.join(compressor.compress(row) for _ in range(height)) + compressor.flush()
+    ihdr = struct.pack('>IIBBBBB', width, height, 8, 0, 0, 0, 0)
+    return (b'\x89PNG\r\n\x1a\n' + _png_chunk(b'IHDR', ihdr) + _png_chunk(b'IDAT', idat)
+            + _png_chunk(b'IEND', b''))
+
+
+def uploads():
+    from PIL import Image
+
+    photo = io.BytesIO()
+    Image.new('RGB', (4032, 3024), 'red').save(photo, 'JPEG', quality=90)
+    photo = photo.getvalue()
+    return {
+        'png bomb 9000x9000': png_bomb(9000, 9000),
+        'png 6000x4000': png_bomb(6000, 4000),
+        'truncated jpeg': photo[:len(photo) // 3],
+        'not an image (8MB)': os.urandom(8 * 1024 * 1024),
+    }
+
+
+def run_one(path, mode, repeat):
+    """Child process: time and measure one path on one upload."""
+    from models.image_processing import prepare_image
+    from models.upload_validator import InvalidUpload, UploadValidator
+
+    with open(path, 'rb') as f:
+        spooled = io.BytesIO(f.read())
+    validator = UploadValidator()
+    baseline = peak_rss_mb()
+    outcome = None
+    start = time.process_time()
+    for _ in range(repeat):
+        spooled.seek(0)
+        try:
+            if mode == 'old':
+                prepare_image(spooled.read())
+            else:
+                validator.validate(spooled)
+            outcome = 'accepted'
+        except InvalidUpload as e:
+            outcome = f"{e.status} {e}"
+        except Exception as e:
+            outcome = type(e).__name__
+    cpu = (time.process_time() - start) / repeat * 1e3
+    peak = peak_rss_mb() - baseline
+    print(json.dumps({'cpu_ms': cpu, 'peak_mb': peak, 'outcome': outcome}))
+
+
+def measure(path, mode, repeat):
+    result = subprocess.run(
+        [sys.executable, '-m', 'benchmarks.bench_upload_validation', '--run-one', path, mode,
+         '--repeat', str(repeat)],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+        env={**os.environ, 'PYTHONPATH': ROOT},
+    )
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def through_app(cases):
+    os.environ.setdefault('WARM_UP', 'off')
+    os.environ['MEAL_LOG_PATH'] = ''
+    # Nothing here should reach the model; a truncated JPEG fails in decoding
+    os.environ.setdefault('GOOGLE_API_KEY', 'fake-key')
+    os.environ['GEMINI_BASE_URL'] = 'http://127.0.0.1:9/'
+    from app import create_app
+
+    client = create_app().test_client()
+    client.get('/auth/guest')
+    print("\n/analyze response per upload")
+    for name, data in cases.items():
+        response = client.post('/analyze', data={**FORM, 'image': (io.BytesIO(data), 'meal.png')},
+                               content_type='multipart/form-data')
+        print(f"  {name:<20} {response.status_code} {response.get_json()['error']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--run-one', nargs=2, metavar=('PATH', 'MODE'), help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_one:
+        run_one(*args.run_one, args.repeat)
+        return
+
+    cases = uploads()
+    print(f"{'upload':<20} {'bytes':>9}  {'path':<9} {'CPU/upload':>10} {'peak RSS':>9}  outcome")
+    with tempfile.TemporaryDirectory() as directory:
+        for name, data in cases.items():
+            path = os.path.join(directory, 'upload')
+            with open(path, 'wb') as f:
+                f.write(data)
+            for mode in ('old', 'validator'):
+                # Decoding a bomb is slow; a few rounds are enough for it
+                result = measure(path, mode, args.repeat if mode == 'validator' else max(1, args.repeat // 10))
+                print(f"{name:<20} {len(data):9d}  {mode:<9} {result['cpu_ms']:8.3f}ms "
+                      f"{result['peak_mb']:7.1f}MB  {result['outcome']}")
+    through_app(cases)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,206 @@
+"""
+Latency, tokens and agreement of the analysis tiers, replayed offline
+from recorded model responses.
+
+record calls the model once per tier for every photo, with no
+escalation, and appends each response with its latency and token usage
+to a JSONL file. It uses GOOGLE_API_KEY (and GEMINI_BASE_URL if set), or
+with --fake a local fake Gemini that bills tokens like the real API but
+always answers the same analysis, which checks the plumbing rather than
+the model:
+
+    python -m benchmarks.eval_model_tiers record --images photos/
+    python -m benchmarks.eval_model_tiers record --fake
+
+replay (the default) then runs the tier policy over the recordings
+without any network: each photo starts at the first tier and escalates
+exactly as AIService would. It reports calls, escalations, latency and
+tokens per tier, and per analysis against always calling the last tier,
+with the calorie difference from the last tier's answer. Several
+--min-confidence values can be compared in one run:
+
+    python -m benchmarks.eval_model_tiers --min-confidence 0.5 0.6 0.8
+"""
+import argparse
+import io
+import json
+import os
+import statistics
+import time
+
+from models import response_schema
+from models.model_tiers import parse_tiers
+
+DEFAULT_RECORDINGS = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                  'recordings', 'model_tiers.jsonl')
+DEFAULT_TIERS = '512:compact,1024:full'
+
+
+def synthetic_photos(count):
+    """Phone-sized JPEGs with some structure, for --fake runs without --images."""
+    from PIL import Image, ImageDraw
+
+    photos = {}
+    for i in range(count):
+        image = Image.new('RGB', (4032, 3024), (200 + i % 50, 180, 160))
+        draw = ImageDraw.Draw(image)
+        for j in range(12):
+            x, y = (i * 397 + j * 811) % 3600, (i * 211 + j * 457) % 2600
+            draw.ellipse((x, y, x + 420, y + 420), fill=((j * 40) % 256, (i * 30) % 256, 90))
+        buffered = io.BytesIO()
+        image.save(buffered, 'JPEG', quality=90)
+        photos[f"synthetic-{i:03d}.jpg"] = buffered.getvalue()
+    return photos
+
+
+def load_photos(directory):
+    return {
+        name: open(os.path.join(directory, name), 'rb').read()
+        for name in sorted(os.listdir(directory))
+        if name.lower().endswith(('.jpg', '.jpeg', '.png'))
+    }
+
+
+def record(args):
+    from models.ai_service import AIService
+    from models.image_processing import prepare_image
+
+    server = None
+    if args.fake:
+        from benchmarks.fake_gemini import FakeGeminiServer
+
+        server = FakeGeminiServer(latency=0.3, jitter=0.05, token_latency=0.0003, seed=1).start()
+        os.environ['GEMINI_BASE_URL'] = server.base_url
+        os.environ['GOOGLE_API_KEY'] = 'fake-key'
+    photos = load_photos(args.images) if args.images else synthetic_photos(args.count)
+    service = AIService()
+    client = service._client()
+    tiers = parse_tiers(args.tiers)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.recordings)), exist_ok=True)
+    with open(args.recordings, 'a') as out:
+        for name, data in photos.items():
+            image = prepare_image(data)
+            for tier in tiers:
+                request = service._tier_request(image, tier, args.goal, args.diet)
+                start = time.perf_counter()
+                try:
+                    response = client.models.generate_content(**request)
+                except Exception as e:
+                    print(f"{name} {tier.name}: {e}")
+                    continue
+                latency = time.perf_counter() - start
+                usage = response.usage_metadata
+                out.write(json.dumps({
+                    'photo': name,
+                    'tier': tier.name,
+                    'latency_ms': round(latency * 1e3, 1),
+                    'prompt_tokens': usage.prompt_token_count if usage else None,
+                    'response_tokens': usage.candidates_token_count if usage else None,
+                    'text': response.text,
+                }) + '\n')
+            print(f"recorded {name}")
+    if server is not None:
+        server.stop()
+    print(f"{len(photos)} photos x {len(tiers)} tiers appended to {args.recordings}")
+
+
+def _parse(text):
+    try:
+        return response_schema.parse_analysis(text)
+    except response_schema.SchemaError:
+        return None
+
+
+def replay(args):
+    if not os.path.exists(args.recordings):
+        raise SystemExit(f"No recordings at {args.recordings}; run the record command first")
+    recordings = {}
+    with open(args.recordings) as f:
+        for line in f:
+            entry = json.loads(line)
+            # A photo recorded twice keeps its latest responses
+            recordings.setdefault(entry['photo'], {})[entry['tier']] = entry
+
+    for min_confidence in args.min_confidence:
+        tiers = parse_tiers(args.tiers, min_confidence)
+        last = tiers[-1]
+        photos = {photo: entries for photo, entries in recordings.items()
+                  if all(tier.name in entries for tier in tiers)}
+        if not photos:
+            raise SystemExit(f"No photo has recordings for every tier in {args.tiers}")
+
+        per_tier = {tier.name: {'calls': 0, 'escalated': {}, 'latency': [], 'prompt': 0, 'response': 0}
+                    for tier in tiers}
+        tiered_latency, tiered_tokens, baseline_latency, baseline_tokens, calorie_error = [], [], [], [], []
+        for entries in photos.values():
+            latency = tokens = 0.0
+            kept = None
+            for i, tier in enumerate(tiers):
+                entry = entries[tier.name]
+                stats = per_tier[tier.name]
+                stats['calls'] += 1
+                stats['latency'].append(entry['latency_ms'])
+                stats['prompt'] += entry['prompt_tokens'] or 0
+                stats['response'] += entry['response_tokens'] or 0
+                latency += entry['latency_ms']
+                tokens += (entry['prompt_tokens'] or 0) + (entry['response_tokens'] or 0)
+                analysis = _parse(entry['text'])
+                reason = 'invalid' if analysis is None else tier.escalation_reason(analysis)
+                if reason is None or i == len(tiers) - 1:
+                    kept = analysis
+                    break
+                stats['escalated'][reason] = stats['escalated'].get(reason, 0) + 1
+            tiered_latency.append(latency)
+            tiered_tokens.append(tokens)
+            entry = entries[last.name]
+            baseline_latency.append(entry['latency_ms'])
+            baseline_tokens.append((entry['prompt_tokens'] or 0) + (entry['response_tokens'] or 0))
+            reference = _parse(entry['text'])
+            if kept is not None and reference and reference['total_calories']:
+                calorie_error.append(abs(kept['total_calories'] - reference['total_calories'])
+                                     / reference['total_calories'] * 100)
+
+        print(f"\n{len(photos)} photos, tiers {args.tiers}, min confidence {min_confidence:g}")
+        print(f"  {'tier':<24} {'calls':>6} {'escalated':>10} {'p50 ms':>8} {'p95 ms':>8} "
+              f"{'prompt tok':>11} {'resp tok':>9}")
+        for name, stats in per_tier.items():
+            if not stats['calls']:
+                print(f"  {name:<24} {0:6d}")
+                continue
+            latencies = sorted(stats['latency'])
+            p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+            escalated = sum(stats['escalated'].values())
+            print(f"  {name:<24} {stats['calls']:6d} {escalated:10d} {statistics.median(latencies):8.0f} "
+                  f"{p95:8.0f} {stats['prompt'] / stats['calls']:11.0f} {stats['response'] / stats['calls']:9.0f}"
+                  + (f"  {stats['escalated']}" if stats['escalated'] else ''))
+        print(f"  per analysis: {statistics.mean(tiered_latency):.0f}ms, {statistics.mean(tiered_tokens):.0f} tokens "
+              f"(last tier only: {statistics.mean(baseline_latency):.0f}ms, "
+              f"{statistics.mean(baseline_tokens):.0f} tokens)")
+        if calorie_error:
+            print(f"  calories vs last tier: mean {statistics.mean(calorie_error):.1f}% off, "
+                  f"{sum(error > 15 for error in calorie_error)} photos more than 15% off")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('command', nargs='?', choices=['replay', 'record'], default='replay')
+    parser.add_argument('--recordings', default=DEFAULT_RECORDINGS)
+    parser.add_argument('--tiers', default=os.getenv('MODEL_TIERS') or DEFAULT_TIERS)
+    parser.add_argument('--min-confidence', type=float, nargs='+', default=[0.6])
+    parser.add_argument('--images', help="directory of meal photos to record")
+    parser.add_argument('--count', type=int, default=20, help="synthetic photos without --images")
+    parser.add_argument('--fake', action='store_true', help="record from a local fake Gemini")
+    parser.add_argument('--goal', default='Weight Loss')
+    parser.add_argument('--diet', default='Keto')
+    args = parser.parse_args()
+
+    if args.command == 'record':
+        record(args)
+    else:
+        replay(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,277 @@
+"""
+Local stand-in for the Gemini generateContent REST API.
+
+Point the app at it with GEMINI_BASE_URL=http://127.0.0.1:<port>/ and every
+model call is answered with a canned nutrition analysis after a simulated
+latency. Run standalone with: python -m benchmarks.fake_gemini --port 8765
+"""
+import argparse
+import base64
+import io
+import json
+import math
+import random
+import re
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+SAMPLE_ANALYSIS = {
+    "food_items": ["grilled chicken", "brown rice", "broccoli"],
+    "total_calories": 540,
+    "macros": {"protein": 35, "fat": 20, "carbs": 45},
+    "health_score": 8,
+    "burn_off": {"walking": 110, "running": 50, "swimming": 60},
+    "is_diet_compliant": True,
+    "analysis": "A **balanced** plate with lean protein and fibre.",
+    "suggestion": "Add a drizzle of olive oil for healthy fats.",
+}
+
+
+def text_token_count(text):
+    """Roughly four characters per token."""
+    return -(-len(text) // 4)
+
+
+def image_token_count(data):
+    """258 tokens for an image up to 384px, else 258 per 768px tile."""
+    from models.upload_validator import InvalidUpload, read_image_header
+
+    try:
+        header = read_image_header(io.BytesIO(data))
+    except InvalidUpload:
+        return 258
+    if max(header.width, header.height) <= 384:
+        return 258
+    return 258 * -(-header.width // 768) * -(-header.height // 768)
+
+
+def prompt_token_count(request_body):
+    """Tokens in a generateContent request: its text and images."""
+    try:
+        contents = json.loads(request_body).get('contents', [])
+    except ValueError:
+        return 0
+    tokens = 0
+    for content in contents:
+        for part in content.get('parts', []):
+            inline = part.get('inlineData') or part.get('inline_data')
+            if inline:
+                tokens += image_token_count(base64.b64decode(inline.get('data', '')))
+            elif 'text' in part:
+                tokens += text_token_count(part['text'])
+    return tokens
+
+
+class FakeGeminiServer(ThreadingHTTPServer):
+    """
+    Threaded HTTP server answering like the Gemini API.
+
+    Latency is latency +/- a uniform jitter, or with latency_dist='lognormal'
+    a log-normal with median latency and log-space sigma jitter, which gives
+    the long tail real model calls have. error_rate and rate_limit_rate are
+    the fractions of calls answered with a 500 or a 429. Token usage is
+    counted from the request like Gemini bills it, and token_latency adds
+    that many seconds per prompt token (the model's prefill time).
+    """
+
+    daemon_threads = True
+    request_queue_size = 1024
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.5, jitter=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, analysis=None, seed=None,
+                 stream_interval=0.05, quota=None, latency_dist='uniform', token_latency=0.0):
+        super().__init__((host, port), FakeGeminiHandler)
+        self.latency = latency
+        self.jitter = jitter
+        self.latency_dist = latency_dist
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.analysis = analysis or SAMPLE_ANALYSIS
+        self.stream_interval = stream_interval
+        self.token_latency = token_latency
+        # Optional requests-per-second quota, enforced like the real API
+        self.quota = quota
+        self._quota_tokens = quota or 0.0
+        self._quota_updated = time.monotonic()
+        self.rate_limited_count = 0
+        self.rng = random.Random(seed)
+        self.rng_lock = threading.Lock()
+        self.request_count = 0
+        self.connection_count = 0
+        # Calls being answered right now, and the most at any one time
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def _over_quota(self):
+        """Token-bucket quota check; call with rng_lock held."""
+        if not self.quota:
+            return False
+        now = time.monotonic()
+        self._quota_tokens = min(self.quota, self._quota_tokens + (now - self._quota_updated) * self.quota)
+        self._quota_updated = now
+        if self._quota_tokens < 1:
+            return True
+        self._quota_tokens -= 1
+        return False
+
+    def next_outcome(self):
+        """Pick (delay, status) for the next request."""
+        with self.rng_lock:
+            self.request_count += 1
+            if self.latency_dist == 'lognormal' and self.latency > 0:
+                delay = self.rng.lognormvariate(math.log(self.latency), self.jitter)
+            else:
+                delay = max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter))
+            roll = self.rng.random()
+            over_quota = self._over_quota()
+            if over_quota or roll < self.rate_limit_rate:
+                self.rate_limited_count += 1
+        if over_quota:
+            return 0.0, 429
+        if roll < self.rate_limit_rate:
+            return delay, 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return delay, 500
+        return delay, 200
+
+    def start(self):
+        """Serve in a background thread and return self."""
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def handle_error(self, request, client_address):
+        # Clients that time out hang up mid-answer, as they would on the real API
+        if not isinstance(sys.exc_info()[1], ConnectionError):
+            super().handle_error(request, client_address)
+
+
+class FakeGeminiHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    def setup(self):
+        super().setup()
+        with self.server.rng_lock:
+            self.server.connection_count += 1
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        with self.server.rng_lock:
+            self.server.in_flight += 1
+            self.server.max_in_flight = max(self.server.max_in_flight, self.server.in_flight)
+        try:
+            self._answer()
+        finally:
+            with self.server.rng_lock:
+                self.server.in_flight -= 1
+
+    def _answer(self):
+        length = int(self.headers.get('Content-Length', 0))
+        request_body = self.rfile.read(length)
+        delay, status = self.server.next_outcome()
+        prompt_tokens = prompt_token_count(request_body)
+        time.sleep(delay + prompt_tokens * self.server.token_latency)
+
+        if status == 429:
+            self._send_json(429, {"error": {
+                "code": 429,
+                "message": "Resource has been exhausted. Please retry in 1.0s.",
+                "status": "RESOURCE_EXHAUSTED",
+            }})
+        elif status != 200:
+            self._send_json(status, {"error": {
+                "code": status, "message": "Internal error", "status": "INTERNAL",
+            }})
+        elif ':streamGenerateContent' in self.path:
+            self._send_stream(self._analysis_payload(request_body, prompt_tokens))
+        else:
+            self._send_json(200, self._analysis_payload(request_body, prompt_tokens))
+
+    def _analysis_payload(self, request_body, prompt_tokens):
+        # Packed multi-image prompts ask for "exactly N objects"
+        analysis = self.server.analysis
+        match = re.search(rb"exactly (\d+) objects", request_body)
+        if match:
+            analysis = [analysis] * int(match.group(1))
+        text = json.dumps(analysis)
+        response_tokens = text_token_count(text)
+        return {
+            "candidates": [{
+                "content": {
+                    "role": "model",
+                    "parts": [{"text": text}],
+                },
+                "finishReason": "STOP",
+            }],
+            "usageMetadata": {
+                "promptTokenCount": prompt_tokens,
+                "candidatesTokenCount": response_tokens,
+                "totalTokenCount": prompt_tokens + response_tokens,
+            },
+        }
+
+    def _send_stream(self, payload, pieces=6):
+        """Send the analysis text as server-sent events split into pieces."""
+        text = payload["candidates"][0]["content"]["parts"][0]["text"]
+        step = max(1, len(text) // pieces)
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for start in range(0, len(text), step):
+            event = {"candidates": [{"content": {
+                "role": "model", "parts": [{"text": text[start:start + step]}],
+            }}]}
+            data = f"data: {json.dumps(event)}\r\n\r\n".encode()
+            self.wfile.write(f"{len(data):X}\r\n".encode() + data + b"\r\n")
+            time.sleep(self.server.stream_interval)
+        self.wfile.write(b"0\r\n\r\n")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--latency', type=float, default=0.5)
+    parser.add_argument('--jitter', type=float, default=0.0)
+    parser.add_argument('--latency-dist', choices=['uniform', 'lognormal'], default='uniform')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0)
+    parser.add_argument('--quota', type=float, default=None,
+                        help='requests per second before answering 429')
+    parser.add_argument('--token-latency', type=float, default=0.0,
+                        help='extra seconds per prompt token')
+    args = parser.parse_args()
+
+    server = FakeGeminiServer(port=args.port, latency=args.latency, jitter=args.jitter,
+                              error_rate=args.error_rate,
+                              rate_limit_rate=args.rate_limit_rate, quota=args.quota,
+                              latency_dist=args.latency_dist, token_latency=args.token_latency)
+    print(f"Fake Gemini listening on {server.base_url}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,482 @@
+"""
+Offline load test of the whole app against the fake Gemini server.
+
+Each scenario runs in a fresh Python process. That process serves
+create_app() over HTTP from a server with a fixed pool of request threads,
+the way gunicorn's gthread worker does with --threads. Client threads then
+drive /analyze and /update_profile at a fixed concurrency with synthetic
+meal photos. Each upload has its JPEG quantization table nudged, so its
+pixels (and so its prepared bytes) are new and every request misses the
+analysis cache and reaches the model.
+
+Scenarios marked 'gevent' serve the app from gevent's WSGI server on
+greenlets instead, like gunicorn's gevent worker
+(GUNICORN_WORKER_CLASS=gevent), in a process with the standard library
+monkey-patched. analyze_crowd and analyze_crowd_gevent drive 256 clients
+each way; the gevent one must keep at least min_model_in_flight model
+calls in flight at once, or --check fails.
+
+Reported per scenario:
+- throughput
+- p50/p95/p99 latency, measured from the moment a request is sent
+- responses by status code
+- model calls and 429s seen by the fake server, and the most in flight
+- the process's RSS
+
+The fake server runs in the same process, so RSS includes it.
+
+Results can be saved as a baseline and later checked against it. A check
+fails (exit status 1) when throughput drops, or latency or RSS grows, by
+more than the tolerance:
+
+    python -m benchmarks.load_test --save-baseline
+    python -m benchmarks.load_test --check
+
+Usage: python -m benchmarks.load_test [--scenario analyze ...] [--threads 8]
+       [--concurrency 16] [--requests 200] [--check | --save-baseline]
+"""
+import sys
+
+# gevent scenarios run in a child process started with --gevent, which
+# must patch the standard library before anything else imports it
+if '--gevent' in sys.argv:
+    from gevent import monkey
+    monkey.patch_all()
+
+import argparse
+import http.client
+import io
+import json
+import os
+import random
+import subprocess
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from socketserver import ThreadingMixIn
+from urllib.parse import urlencode
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baselines', 'load_test.json')
+
+PROFILE = {
+    'gender': 'Male', 'age': '30', 'weight': '80', 'height': '180',
+    'activity_level': 'Sedentary (Office Job)', 'goal': 'Weight Loss', 'diet_type': 'Keto',
+}
+
+# Fake Gemini behaviour, request mix and app settings of each scenario,
+# plus optional overrides of the server ('threads' or 'gevent'), the
+# client concurrency and the request count. The rate limiter is off unless
+# a scenario is about 429s, so the numbers measure the app rather than the
+# configured quota.
+SCENARIOS = {
+    'analyze': {
+        'description': '/analyze with log-normal model latency',
+        'gemini': {'latency': 0.3, 'jitter': 0.4, 'latency_dist': 'lognormal'},
+        'mix': {'analyze': 1.0},
+        'env': {'GEMINI_RATE_LIMIT': '0'},
+    },
+    'analyze_errors': {
+        'description': '/analyze with 5% model errors and 5% 429s',
+        'gemini': {'latency': 0.3, 'jitter': 0.4, 'latency_dist': 'lognormal',
+                   'error_rate': 0.05, 'rate_limit_rate': 0.05},
+        'mix': {'analyze': 1.0},
+        'env': {'GEMINI_RATE_LIMIT': '0'},
+    },
+    'analyze_quota': {
+        'description': '/analyze against a 10 req/s quota behind the shared rate limiter',
+        'gemini': {'latency': 0.3, 'jitter': 0.1, 'quota': 10},
+        'mix': {'analyze': 1.0},
+        'env': {'GEMINI_RATE_LIMIT': '8', 'GEMINI_RATE_LIMIT_MAX': '12'},
+    },
+    'analyze_async': {
+        'description': '/analyze in async mode, collected by long-polling /jobs/<id>',
+        'gemini': {'latency': 0.3, 'jitter': 0.4, 'latency_dist': 'lognormal'},
+        'mix': {'analyze_async': 1.0},
+        'env': {'GEMINI_RATE_LIMIT': '0', 'JOB_QUEUE_WORKERS': '8'},
+    },
+    'analyze_crowd': {
+        'description': '/analyze from 256 clients on the request threads',
+        'gemini': {'latency': 1.0, 'jitter': 0.1},
+        'mix': {'analyze': 1.0},
+        'env': {'GEMINI_RATE_LIMIT': '0'},
+        'concurrency': 256,
+        'requests': 512,
+    },
+    'analyze_crowd_gevent': {
+        'description': '/analyze from 256 clients on gevent greenlets',
+        'gemini': {'latency': 1.0, 'jitter': 0.1},
+        'mix': {'analyze': 1.0},
+        'env': {'GEMINI_RATE_LIMIT': '0'},
+        'server': 'gevent',
+        'concurrency': 256,
+        'requests': 512,
+        'min_model_in_flight': 200,
+    },
+    'update_profile': {
+        'description': '/update_profile only (no model calls)',
+        'gemini': {'latency': 0.3},
+        'mix': {'update_profile': 1.0},
+        'env': {},
+    },
+    'mixed': {
+        'description': '70% /analyze, 30% /update_profile',
+        'gemini': {'latency': 0.3, 'jitter': 0.4, 'latency_dist': 'lognormal'},
+        'mix': {'analyze': 0.7, 'update_profile': 0.3},
+        'env': {'GEMINI_RATE_LIMIT': '0'},
+    },
+}
+
+# Metrics compared against the baseline, and whether higher is better
+CHECKED_METRICS = {
+    'throughput': True,
+    'p50_ms': False,
+    'p95_ms': False,
+    'p99_ms': False,
+    'rss_mb': False,
+}
+
+# Largest drop in the share of 2xx responses, as an absolute fraction
+OK_RATIO_TOLERANCE = 0.02
+
+
+class PooledWSGIServer(ThreadingMixIn, WSGIServer):
+    """WSGI server handling requests on a fixed pool of threads, like gthread."""
+
+    request_queue_size = 1024
+
+    def __init__(self, *args, threads=8, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._pool = ThreadPoolExecutor(max_workers=threads)
+
+    def process_request(self, request, client_address):
+        self._pool.submit(self.process_request_thread, request, client_address)
+
+
+class QuietHandler(WSGIRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(app, server, threads):
+    """Serve app in the background; returns (port, stop)."""
+    if server == 'gevent':
+        from gevent.pool import Pool
+        from gevent.pywsgi import WSGIServer
+
+        # gunicorn's default worker_connections
+        gevent_server = WSGIServer(('127.0.0.1', 0), app, spawn=Pool(1000), log=None)
+        gevent_server.start()
+        return gevent_server.server_port, gevent_server.stop
+    pooled = make_server('127.0.0.1', 0, app, server_class=lambda *a, **kw: PooledWSGIServer(*a, threads=threads, **kw),
+                         handler_class=QuietHandler)
+    threading.Thread(target=pooled.serve_forever, daemon=True).start()
+    return pooled.server_address[1], pooled.shutdown
+
+
+def synthetic_images(count, seed):
+    """
+    JPEG meal photos: half already small enough to pass through untouched,
+    half phone-sized so they are decoded, shrunk and re-encoded.
+    """
+    from PIL import Image, ImageFilter
+
+    rng = random.Random(seed)
+    images = []
+    for i in range(count):
+        size = (800, 600) if i % 2 == 0 else (2016, 1512)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        image = Image.new('RGB', size, color)
+        noise = Image.effect_noise(size, 60).filter(ImageFilter.GaussianBlur(2))
+        image = Image.merge('RGB', [Image.blend(band, noise, 0.4) for band in image.split()])
+        buffered = io.BytesIO()
+        image.save(buffered, format='JPEG', quality=85)
+        images.append(buffered.getvalue())
+    return images
+
+
+def vary_jpeg(data, rng):
+    """
+    Nudge the lowest-frequency entries of the first quantization table.
+
+    The decoded pixels change, so even a resized and re-encoded upload is
+    new to the analysis cache, without re-encoding anything here.
+    """
+    table = data.index(b'\xff\xdb') + 5
+    varied = bytearray(data)
+    for i in range(table, table + 6):
+        varied[i] = min(255, max(1, varied[i] + rng.randint(-4, 4)))
+    return bytes(varied)
+
+
+def multipart(fields, files):
+    """Encode form fields and (name, filename, bytes) files as multipart/form-data."""
+    boundary = uuid.uuid4().hex
+    parts = []
+    for name, value in fields.items():
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n'.encode())
+    for name, filename, data in files:
+        parts.append(f'--{boundary}\r\nContent-Disposition: form-data; name="{name}"; '
+                     f'filename="{filename}"\r\nContent-Type: image/jpeg\r\n\r\n'.encode())
+        parts.append(data + b'\r\n')
+    parts.append(f'--{boundary}--\r\n'.encode())
+    return b''.join(parts), f'multipart/form-data; boundary={boundary}'
+
+
+class Client:
+    """One simulated user: a guest session and its cookie."""
+
+    def __init__(self, port):
+        self.port = port
+        self.cookie = None
+        self.request('GET', '/auth/guest')
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.cookie:
+            headers['Cookie'] = self.cookie
+        conn = http.client.HTTPConnection('127.0.0.1', self.port, timeout=120)
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+            body = response.read()
+            cookie = response.getheader('Set-Cookie')
+            if cookie:
+                self.cookie = cookie.split(';', 1)[0]
+            return response.status, body
+        finally:
+            conn.close()
+
+
+def rss_mb():
+    """Current and peak resident set size of this process, in MiB."""
+    values = {}
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                key, _, value = line.partition(':')
+                if key in ('VmRSS', 'VmHWM'):
+                    values[key] = int(value.split()[0]) / 1024
+    except OSError:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        values = {'VmRSS': peak, 'VmHWM': peak}
+    return values['VmRSS'], values['VmHWM']
+
+
+def percentile(ordered, pct):
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct / 100))]
+
+
+def run_scenario(name, threads, concurrency, requests, seed):
+    """Run one scenario in this process and return its results."""
+    from benchmarks.fake_gemini import FakeGeminiServer
+
+    scenario = SCENARIOS[name]
+    gemini = FakeGeminiServer(seed=seed, **scenario['gemini']).start()
+    os.environ.update({
+        'GEMINI_BASE_URL': gemini.base_url,
+        'GOOGLE_API_KEY': os.environ.get('GOOGLE_API_KEY', 'fake-key'),
+        'MEAL_LOG_PATH': '',
+        'NEAR_DUPLICATE_MAX_DISTANCE': '-1',
+        'TRACE_SAMPLE_RATE': '0',
+        **scenario['env'],
+    })
+    from app import create_app
+    app = create_app()
+    port, stop_server = start_server(app, scenario.get('server', 'threads'), threads)
+
+    images = synthetic_images(8, seed)
+    paths, weights = zip(*scenario['mix'].items())
+    plan_rng = random.Random(seed)
+    plan = plan_rng.choices(paths, weights, k=requests)
+    profile_body = urlencode(PROFILE)
+
+    def analyze_body(rng, mode='sync'):
+        data = vary_jpeg(rng.choice(images), rng)
+        return multipart({**PROFILE, 'mode': mode}, [('image', 'meal.jpg', data)])
+
+    clients = [Client(port) for _ in range(concurrency)]
+    rss_before, _ = rss_mb()
+    model_calls = gemini.request_count
+    rate_limited = gemini.rate_limited_count
+    next_index = iter(range(requests))
+    lock = threading.Lock()
+    latencies = []
+    statuses = {}
+
+    def drive(client, rng):
+        while True:
+            with lock:
+                index = next(next_index, None)
+            if index is None:
+                return
+            if plan[index] == 'analyze':
+                body, content_type = analyze_body(rng)
+                path = '/analyze'
+            elif plan[index] == 'analyze_async':
+                body, content_type = analyze_body(rng, mode='async')
+                path = '/analyze'
+            else:
+                body, content_type = profile_body, 'application/x-www-form-urlencoded'
+                path = '/update_profile'
+            start = time.perf_counter()
+            status, response = client.request('POST', path, body, content_type)
+            if status == 202:
+                # Long-poll the job until it is final; report its outcome
+                status_url = json.loads(response)['status_url']
+                while True:
+                    status, response = client.request('GET', f"{status_url}?wait=10")
+                    job = json.loads(response)
+                    if job['status'] in ('done', 'failed', 'cancelled', 'expired'):
+                        status = 200 if job['status'] == 'done' else job.get('error', job['status'])
+                        break
+            elapsed = time.perf_counter() - start
+            with lock:
+                latencies.append(elapsed)
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+
+    started = time.perf_counter()
+    workers = [threading.Thread(target=drive, args=(client, random.Random(seed + i)))
+               for i, client in enumerate(clients)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    wall = time.perf_counter() - started
+
+    rss, peak = rss_mb()
+    stop_server()
+    gemini.stop()
+    latencies.sort()
+    return {
+        'requests': requests,
+        'threads': threads,
+        'concurrency': concurrency,
+        'throughput': round(requests / wall, 2),
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'statuses': dict(sorted(statuses.items())),
+        'ok_ratio': round(sum(count for status, count in statuses.items() if status.startswith('2')) / requests, 3),
+        'model_calls': gemini.request_count - model_calls,
+        'model_429s': gemini.rate_limited_count - rate_limited,
+        'model_in_flight_peak': gemini.max_in_flight,
+        'rss_mb': round(rss, 1),
+        'rss_growth_mb': round(rss - rss_before, 1),
+        'peak_rss_mb': round(peak, 1),
+    }
+
+
+def run_isolated(name, args):
+    """Run a scenario in a child process so each starts from a clean heap."""
+    scenario = SCENARIOS[name]
+    command = [sys.executable, '-m', 'benchmarks.load_test', '--run-scenario', name,
+               '--threads', str(args.threads),
+               '--concurrency', str(scenario.get('concurrency', args.concurrency)),
+               '--requests', str(scenario.get('requests', args.requests)), '--seed', str(args.seed)]
+    if scenario.get('server') == 'gevent':
+        command.append('--gevent')
+    output = subprocess.run(command, check=True, capture_output=True, text=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def report(name, result):
+    statuses = ' '.join(f"{status}:{count}" for status, count in result['statuses'].items())
+    print(f"{name:<15} {result['throughput']:7.1f} req/s  p50 {result['p50_ms']:7.1f}ms  "
+          f"p95 {result['p95_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  "
+          f"rss {result['rss_mb']:6.1f}MiB  [{statuses}]  "
+          f"model calls {result['model_calls']} ({result['model_429s']} 429s, "
+          f"{result['model_in_flight_peak']} at once)")
+
+
+def compare(results, baseline, tolerance):
+    """Return a description of each metric that regressed past the tolerance or missed its target."""
+    regressions = []
+    for name, result in results.items():
+        target = SCENARIOS[name].get('min_model_in_flight')
+        if target and result['model_in_flight_peak'] < target:
+            regressions.append(f"{name}: {result['model_in_flight_peak']} model calls in flight, "
+                               f"target {target}")
+        expected = baseline.get('scenarios', {}).get(name)
+        if expected is None:
+            continue
+        for metric, higher_is_better in CHECKED_METRICS.items():
+            old, new = expected[metric], result[metric]
+            if higher_is_better:
+                regressed = new < old * (1 - tolerance)
+            else:
+                regressed = new > old * (1 + tolerance)
+            if regressed:
+                regressions.append(f"{name}: {metric} {old} -> {new}")
+        if result['ok_ratio'] < expected['ok_ratio'] - OK_RATIO_TOLERANCE:
+            regressions.append(f"{name}: ok_ratio {expected['ok_ratio']} -> {result['ok_ratio']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', nargs='+', choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument('--threads', type=int, default=int(os.getenv('GUNICORN_THREADS', 8)),
+                        help='request threads serving the app, like gunicorn --threads')
+    parser.add_argument('--concurrency', type=int, default=16, help='concurrent clients')
+    parser.add_argument('--requests', type=int, default=200, help='requests per scenario')
+    parser.add_argument('--seed', type=int, default=1234)
+    parser.add_argument('--baseline', default=BASELINE_PATH)
+    parser.add_argument('--tolerance', type=float, default=0.3,
+                        help='allowed relative regression before --check fails')
+    parser.add_argument('--check', action='store_true', help='compare against the baseline')
+    parser.add_argument('--save-baseline', action='store_true', help='store the results as the baseline')
+    parser.add_argument('--run-scenario', help=argparse.SUPPRESS)
+    parser.add_argument('--gevent', action='store_true', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.run_scenario:
+        result = run_scenario(args.run_scenario, args.threads, args.concurrency, args.requests, args.seed)
+        print(json.dumps(result))
+        return
+
+    print(f"{args.requests} requests per scenario, {args.concurrency} clients, {args.threads} server threads "
+          "(unless a scenario sets its own)")
+    results = {}
+    for name in args.scenario:
+        results[name] = run_isolated(name, args)
+        report(name, results[name])
+
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(args.baseline), exist_ok=True)
+        settings = {'threads': args.threads, 'concurrency': args.concurrency,
+                    'requests': args.requests, 'seed': args.seed}
+        # Scenarios that weren't run keep their recorded baseline
+        scenarios = {}
+        if os.path.exists(args.baseline):
+            with open(args.baseline) as f:
+                previous = json.load(f)
+            if previous['settings'] == settings:
+                scenarios = previous['scenarios']
+        baseline = {'settings': settings, 'scenarios': {**scenarios, **results}}
+        with open(args.baseline, 'w') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        print(f"baseline written to {args.baseline}")
+
+    if args.check:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline['settings'] != {'threads': args.threads, 'concurrency': args.concurrency,
+                                    'requests': args.requests, 'seed': args.seed}:
+            print(f"warning: baseline was recorded with {baseline['settings']}")
+        regressions = compare(results, baseline, args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+        print(f"no regressions beyond {args.tolerance:.0%} of the baseline")
+
+
+if __name__ == '__main__':
+    main()
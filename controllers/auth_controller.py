@@ -1,5 +1,8 @@
 from flask import Blueprint, redirect, url_for, session, render_template, current_app
 from functools import wraps
+import secrets
+
+from models.session_store import regenerate_session
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -14,12 +17,21 @@ def login_required(f):
     return decorated_function
 
 
+def _static_page(template, max_age=None):
+    """Render a page that is the same for every visitor, from the page cache if enabled."""
+    page_cache = current_app.extensions['page_cache']
+    if page_cache is None:
+        return render_template(template)
+    return page_cache.respond(template, lambda: render_template(template), max_age)
+
+
 @auth_bp.route('/login')
 def login():
     """Show the login page."""
     if 'user' in session:
         return redirect(url_for('main.index'))
-    return render_template('login.html')
+    # Revalidated on every visit, since signed-in users are redirected
+    return _static_page('login.html', max_age=0)
 
 
 @auth_bp.route('/auth/google')
@@ -38,6 +50,7 @@ def google_callback():
     user_info = token.get('userinfo')
 
     if user_info:
+        regenerate_session(session)
         session['user'] = {
             'name': user_info.get('name', ''),
             'email': user_info.get('email', ''),
@@ -50,10 +63,13 @@ def google_callback():
 @auth_bp.route('/auth/guest')
 def guest_login():
     """Log in as a guest without Google OAuth."""
+    regenerate_session(session)
     session['user'] = {
         'name': 'Guest',
         'email': '',
         'picture': '',
+        # Keys this guest's meal log until they log out
+        'guest_id': secrets.token_urlsafe(16),
     }
     return redirect(url_for('main.index'))
 
@@ -69,10 +85,10 @@ def logout():
 @auth_bp.route('/privacy')
 def privacy():
     """Show the privacy policy page."""
-    return render_template('privacy.html')
+    return _static_page('privacy.html')
 
 
 @auth_bp.route('/terms')
 def terms():
     """Show the terms of service page."""
-    return render_template('terms.html')
+    return _static_page('terms.html')
@@ -1,14 +1,22 @@
-from flask import Blueprint, render_template, request, jsonify, session, current_app
+from flask import Blueprint, render_template, request, jsonify, session, current_app, Response, stream_with_context, url_for, abort, has_request_context
 from werkzeug.utils import secure_filename
 import os
-from PIL import Image
-import io
 import base64
+import json
+import logging
 import re
+import secrets
+from contextlib import nullcontext
+from datetime import date, datetime, timedelta, timezone
 
 from models.user_profile import UserProfile, NutritionResult
 from models.calculator import CalorieCalculator
 from models.ai_service import AIService
+from models import response_schema
+from models.food_index import no_estimate
+from models.preprocess_pool import PreprocessPoolFull
+from models.job_queue import JobQueueFull, DONE, FAILED, EXPIRED
+from models.upload_validator import InvalidUpload
 from models.translations import Translations
 from controllers.auth_controller import login_required
 
@@ -31,7 +39,305 @@ def index():
     
     return render_template('index.html', 
                          translations=translations,
-                         profile=profile)
+                         profile=profile,
+                         food_estimates='food_index' in current_app.extensions)
+
+def _profile_from_form(form, translations):
+    """
+    Build the user profile and daily calorie target from a submitted form.
+
+    Returns (profile, daily_target, error) where error is a ready-made
+    (response, status) tuple when the form is invalid.
+    """
+    # Debug: Log received form data (built only when debug logging is on)
+    debug = current_app.logger.isEnabledFor(logging.DEBUG)
+    if debug:
+        current_app.logger.debug(f"Received form data: {dict(form)}")
+    
+    # Get form values with defaults
+    gender = form.get('gender')
+    age = form.get('age', '25')
+    weight = form.get('weight', '70')
+    height = form.get('height', '170')
+    activity_level = form.get('activity_level')
+    goal = form.get('goal')
+    diet_type = form.get('diet_type')
+    
+    # Debug: Log individual values
+    if debug:
+        current_app.logger.debug(f"Parsed values - gender: {gender}, activity: {activity_level}, goal: {goal}, diet: {diet_type}")
+    
+    # Validate required fields
+    if not all([gender, activity_level, goal, diet_type]):
+        return None, None, (jsonify({'error': 'Please fill in all profile fields'}), 400)
+    
+    # Create user profile
+    try:
+        profile = UserProfile(
+            gender=gender,
+            age=int(age),
+            weight=float(weight),
+            height=float(height),
+            activity_level=activity_level,
+            goal=goal,
+            diet_type=diet_type
+        )
+    except (ValueError, TypeError) as e:
+        return None, None, (jsonify({'error': 'Invalid profile data'}), 400)
+    
+    # Save profile to session
+    session['user_profile'] = {
+        'gender': profile.gender,
+        'age': profile.age,
+        'weight': profile.weight,
+        'height': profile.height,
+        'activity_level': profile.activity_level,
+        'goal': profile.goal,
+        'diet_type': profile.diet_type
+    }
+    
+    # Calculate daily target calories with error handling
+    try:
+        gender_idx = profile.get_gender_index(translations['genders'])
+        activity_idx = profile.get_activity_index(translations['activities'])
+        goal_idx = profile.get_goal_index(translations['goals'])
+    except ValueError as e:
+        return None, None, (jsonify({'error': f'Invalid profile selection: {str(e)}'}), 400)
+    
+    with _stage('calculator'):
+        daily_target = CalorieCalculator.calculate_target_calories(
+            gender_idx, profile.age, profile.weight, profile.height, 
+            activity_idx, goal_idx
+        )
+    return profile, daily_target, None
+
+def _stage(stage):
+    """Time a pipeline stage when metrics are enabled."""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is None:
+        return nullcontext()
+    return metrics.stage(stage)
+
+def _count_error(kind):
+    """Count an error response of the current endpoint when metrics are enabled."""
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        metrics.errors.inc(endpoint=request.endpoint, kind=kind)
+
+def _ai_service():
+    """Create an AIService wired to the app's shared cache and client."""
+    return AIService(
+        cache=current_app.extensions.get('analysis_cache'),
+        image_index=current_app.extensions.get('image_index'),
+        client=current_app.extensions['genai_pool'].client,
+        rate_limiter=current_app.extensions.get('rate_limiter'),
+        single_flight=current_app.extensions.get('single_flight'),
+        max_rate_limit_retries=current_app.config['GEMINI_RATE_RETRIES'],
+        metrics=current_app.extensions.get('metrics'),
+        model_tiers=current_app.extensions.get('model_tiers'),
+        on_fresh_analysis=_food_index_learner(),
+    )
+
+def _food_index_learner():
+    """
+    A callback teaching the food index each analysis the model produces,
+    so cache hits and coalesced duplicates are learned from only once.
+    Failures are only logged. None when the index is disabled.
+    """
+    food_index = current_app.extensions.get('food_index')
+    if food_index is None:
+        return None
+    # Analyses may finish on job threads, after the request is gone
+    logger = current_app.logger
+    
+    def learn(analysis):
+        try:
+            food_index.record([analysis])
+        except Exception as e:
+            logger.error(f"Food index error: {e}")
+    return learn
+
+def _prepare_images(ai_service, uploads):
+    """
+    Prepare uploaded image bytes for analysis, in the preprocessing worker
+    processes when they are enabled.
+    """
+    pool = current_app.extensions.get('preprocess_pool')
+    if pool is None:
+        images = [ai_service.prepare_image(data) for data in uploads]
+    else:
+        futures = [pool.submit(data) for data in uploads]
+        images = [future.result() for future in futures]
+    
+    # Stage timings are measured where the work ran, worker or not
+    metrics = current_app.extensions.get('metrics')
+    if metrics is not None:
+        for image in images:
+            for stage, seconds in image.timings.items():
+                metrics.observe_stage(stage, seconds)
+    return images
+
+def _busy_response():
+    """Build the 503 response returned when preprocessing is saturated."""
+    _count_error('busy')
+    response = jsonify({
+        'error': 'BUSY',
+        'message': 'The server is busy. Please try again in a moment.'
+    })
+    response.headers['Retry-After'] = '1'
+    return response, 503
+
+def _result_payload(result, daily_target):
+    """Serialize a NutritionResult together with its meal impact."""
+    with _stage('calculator'):
+        meal_impact_pct = CalorieCalculator.calculate_meal_impact_percentage(
+            result.total_calories, daily_target
+        )
+        progress_ratio = CalorieCalculator.calculate_progress_ratio(
+            result.total_calories, daily_target
+        )
+    return {
+        'food_items': result.food_items,
+        'total_calories': result.total_calories,
+        'macros': result.macros,
+        'health_score': result.health_score,
+        'burn_off': result.burn_off,
+        'is_diet_compliant': result.is_diet_compliant,
+        'analysis': result.analysis,
+        'suggestion': result.suggestion,
+        'daily_target': daily_target,
+        'meal_impact_pct': int(meal_impact_pct),
+        'progress_ratio': progress_ratio,
+    }
+
+def _validate_uploads(files):
+    """
+    Check uploads from their headers alone, before anything reads or decodes them.
+
+    Returns a ready-made (response, status) tuple for the first bad file, or None.
+    """
+    if not all(allowed_file(f.filename) for f in files):
+        _count_error('invalid_upload')
+        return jsonify({'error': 'Invalid file type'}), 400
+    validator = current_app.extensions['upload_validator']
+    for f in files:
+        try:
+            validator.validate(f.stream)
+        except InvalidUpload as e:
+            _count_error('invalid_upload')
+            return jsonify({'error': str(e)}), e.status
+    return None
+
+def _uploaded_image():
+    """
+    Validate the uploaded 'image' file.
+
+    Returns (file, error) where error is a ready-made (response, status)
+    tuple when the upload is missing or not an acceptable image. The file
+    is only read once the rest of the request has checked out.
+    """
+    # Handle image upload
+    if 'image' not in request.files:
+        return None, (jsonify({'error': 'No image uploaded'}), 400)
+    
+    file = request.files['image']
+    if file.filename == '':
+        return None, (jsonify({'error': 'No image selected'}), 400)
+    
+    return file, _validate_uploads([file])
+
+def _user_id():
+    """The key the signed-in user's meals are logged under, or None."""
+    user = session.get('user', {})
+    if user.get('email'):
+        return user['email']
+    if user.get('guest_id'):
+        return f"guest:{user['guest_id']}"
+    return None
+
+def _job_owner():
+    """
+    The key the caller's jobs are owned by: their user id, or for a session
+    without one an id kept in the session, so no job is ever unowned.
+    """
+    user_id = _user_id()
+    if user_id is not None:
+        return user_id
+    if 'job_owner' not in session:
+        session['job_owner'] = secrets.token_urlsafe(16)
+    return f"session:{session['job_owner']}"
+
+def _local_now():
+    """
+    The current time in the user's timezone, from the browser's
+    getTimezoneOffset() value sent as tz_offset (minutes behind UTC);
+    server time if it is missing. The result is timezone-aware, so its
+    timestamp() is the real UTC epoch while date() is the user's day.
+    """
+    offset = request.values.get('tz_offset', type=int)
+    if offset is None or abs(offset) > 14 * 60:
+        return datetime.now().astimezone()
+    return datetime.now(timezone(timedelta(minutes=-offset)))
+
+def _log_meals(results, user_id=None, logged_at=None):
+    """
+    Record analysis results in the user's meal log; failures are only logged.
+
+    Background jobs pass the user and time captured with the request.
+    Repeats of an analysis the user logged moments ago (cache and
+    near-duplicate hits for a retried upload) are skipped by the meal log.
+    """
+    meal_log = current_app.extensions.get('meal_log')
+    if user_id is None and has_request_context():
+        user_id = _user_id()
+    if meal_log is None or user_id is None or not results:
+        return
+    try:
+        meal_log.log_meals(user_id, results, logged_at or _local_now())
+    except Exception as e:
+        current_app.logger.error(f"Meal log error: {e}")
+
+def _session_daily_target():
+    """The daily calorie target for the profile saved in the session, or None."""
+    profile = session.get('user_profile')
+    if not profile:
+        return None
+    translations = Translations.get_translation('English')
+    try:
+        return CalorieCalculator.calculate_target_calories(
+            translations['genders'].index(profile['gender']),
+            profile['age'], profile['weight'], profile['height'],
+            translations['activities'].index(profile['activity_level']),
+            translations['goals'].index(profile['goal'])
+        )
+    except (KeyError, ValueError):
+        return None
+
+def _meal_impact(calories, daily_target):
+    """Meal impact percentage and progress ratio of a calorie total."""
+    return {
+        'meal_impact_pct': int(CalorieCalculator.calculate_meal_impact_percentage(calories, daily_target)),
+        'progress_ratio': CalorieCalculator.calculate_progress_ratio(calories, daily_target),
+    }
+
+def _rate_limit_body(error_msg):
+    """Build the JSON body describing a Gemini rate-limit error."""
+    # Extract wait time from error message if available
+    wait_time = 30  # default
+    match = re.search(r"retry in ([0-9\.]+)s", error_msg)
+    if match:
+        wait_time = int(float(match.group(1)))
+    
+    return {
+        'error': 'RATE_LIMIT',
+        'message': f'Please wait {wait_time} seconds before trying again.',
+        'wait_time': wait_time
+    }
+
+def _rate_limit_response(error_msg):
+    """Build the 429 response for a Gemini rate-limit error."""
+    _count_error('rate_limit')
+    return jsonify(_rate_limit_body(error_msg)), 429
 
 @main_bp.route('/analyze', methods=['POST'])
 @login_required
@@ -39,150 +345,487 @@ def analyze():
     """Handle image upload and nutrition analysis."""
     try:
         # Get form data with validation
-        translations = Translations.get_translation('English')
+        # Reject bad uploads before any other work
+        upload, error = _uploaded_image()
+        if error:
+            return error
         
-        # Debug: Log received form data
-        current_app.logger.info(f"Received form data: {dict(request.form)}")
+        translations = Translations.get_translation('English')
+        profile, daily_target, error = _profile_from_form(request.form, translations)
+        if error:
+            return error
         
-        # Get form values with defaults
-        gender = request.form.get('gender')
-        age = request.form.get('age', '25')
-        weight = request.form.get('weight', '70')
-        height = request.form.get('height', '170')
-        activity_level = request.form.get('activity_level')
-        goal = request.form.get('goal')
-        diet_type = request.form.get('diet_type')
+        # Get AI analysis
+        ai_service = _ai_service()
+        processed_image, = _prepare_images(ai_service, [upload.read()])
         
-        # Debug: Log individual values
-        current_app.logger.info(f"Parsed values - gender: {gender}, activity: {activity_level}, goal: {goal}, diet: {diet_type}")
+        # In 'async' mode the analysis runs on the job queue and the client
+        # collects it from /jobs/<id>; otherwise it runs on this thread
+        job_queue = current_app.extensions.get('job_queue')
+        mode = request.form.get('mode', current_app.config['ANALYZE_MODE'])
+        if mode == 'async' and job_queue is not None:
+            return _enqueue_analysis(job_queue, ai_service, processed_image, profile, daily_target)
         
-        # Validate required fields
-        if not all([gender, activity_level, goal, diet_type]):
-            return jsonify({'error': 'Please fill in all profile fields'}), 400
+        payload = _analyze_prepared(ai_service, processed_image, profile, daily_target)
+        payload.update(_image_fields(processed_image))
         
-        # Create user profile
-        try:
-            profile = UserProfile(
-                gender=gender,
-                age=int(age),
-                weight=float(weight),
-                height=float(height),
-                activity_level=activity_level,
-                goal=goal,
-                diet_type=diet_type
-            )
-        except (ValueError, TypeError) as e:
-            return jsonify({'error': 'Invalid profile data'}), 400
-        
-        # Save profile to session
-        session['user_profile'] = {
-            'gender': profile.gender,
-            'age': profile.age,
-            'weight': profile.weight,
-            'height': profile.height,
-            'activity_level': profile.activity_level,
-            'goal': profile.goal,
-            'diet_type': profile.diet_type
-        }
+        with _stage('serialize'):
+            return jsonify({
+                'success': True,
+                'result': payload
+            })
         
-        # Calculate daily target calories with error handling
-        try:
-            gender_idx = profile.get_gender_index(translations['genders'])
-            activity_idx = profile.get_activity_index(translations['activities'])
-            goal_idx = profile.get_goal_index(translations['goals'])
-        except ValueError as e:
-            return jsonify({'error': f'Invalid profile selection: {str(e)}'}), 400
+    except (PreprocessPoolFull, JobQueueFull):
+        return _busy_response()
+    except Exception as e:
+        error_msg = str(e)
         
-        daily_target = CalorieCalculator.calculate_target_calories(
-            gender_idx, profile.age, profile.weight, profile.height, 
-            activity_idx, goal_idx
+        if "RATE_LIMIT_EXCEEDED" in error_msg:
+            return _rate_limit_response(error_msg)
+        else:
+            current_app.logger.error(f"Analysis error: {e}")
+            _count_error('analysis_error')
+            return jsonify({
+                'error': 'ANALYSIS_ERROR',
+                'message': 'An error occurred during analysis. Please try again.'
+            }), 500
+
+def _analyze_prepared(ai_service, processed_image, profile, daily_target,
+                      user_id=None, logged_at=None):
+    """Analyze a prepared image, log the meal and return the result payload."""
+    analysis_data = ai_service.get_nutrition_analysis(
+        processed_image, profile.goal, profile.diet_type
+    )
+    
+    # Create nutrition result
+    result = NutritionResult.from_dict(analysis_data)
+    payload = _result_payload(result, daily_target)
+    _log_meals([analysis_data], user_id, logged_at)
+    return payload
+
+def _image_fields(processed_image):
+    """
+    Return the processed image as requested: embedded as base64 ('inline'),
+    as a cacheable /images/<digest> URL ('url'), or not at all ('none') when
+    the client already holds it. Either way the bytes are the ones already
+    encoded for the model, so nothing is re-encoded.
+    """
+    image_mode = request.form.get('image_mode', current_app.config['ANALYZE_IMAGE_MODE'])
+    if image_mode == 'inline':
+        return {'image_data': base64.b64encode(processed_image.data).decode()}
+    if image_mode == 'url':
+        digest = current_app.extensions['image_store'].put(
+            processed_image.data, processed_image.mime_type
         )
+        return {'image_url': url_for('main.image', digest=digest)}
+    return {}
+
+def _enqueue_analysis(job_queue, ai_service, processed_image, profile, daily_target):
+    """Queue the analysis of a prepared image and return the 202 job response."""
+    # Everything that needs the request is resolved now; the job itself
+    # runs on a worker thread with only an app context
+    app = current_app._get_current_object()
+    user_id = _user_id()
+    logged_at = _local_now()
+    image_fields = _image_fields(processed_image)
+    
+    # The queue retries rate-limited jobs itself without holding a worker,
+    # so a 429 fails the attempt at once instead of also retrying inside it
+    ai_service.max_rate_limit_retries = 0
+    
+    def run(job):
+        # A cancelled job stops before its next model call (e.g. the next
+        # tier), and no call may run past the job's deadline
+        ai_service.should_stop = lambda: job.cancel_requested
+        ai_service.deadline = job.deadline
+        with app.app_context():
+            try:
+                payload = _analyze_prepared(ai_service, processed_image, profile, daily_target,
+                                            user_id, logged_at)
+            except Exception as e:
+                if not str(e).startswith(("RATE_LIMIT_EXCEEDED", "CANCELLED", "DEADLINE_EXCEEDED")):
+                    app.logger.error(f"Analysis job error: {e}")
+                raise
+        payload.update(image_fields)
+        return payload
+    
+    job = job_queue.submit(run, owner=_job_owner())
+    response = jsonify({**job.as_dict(), 'success': True,
+                        'status_url': url_for('main.job_status', job_id=job.id)})
+    response.headers['Location'] = url_for('main.job_status', job_id=job.id)
+    return response, 202
+
+def _job_body(job):
+    """The /jobs response for a job: its status plus the result or error once final."""
+    body = job.as_dict()
+    if job.status == DONE:
+        body.update(success=True, result=job.result)
+    elif job.status == FAILED:
+        error_msg = str(job.error)
+        if "RATE_LIMIT_EXCEEDED" in error_msg:
+            body.update(_rate_limit_body(error_msg))
+        else:
+            body.update(error='ANALYSIS_ERROR',
+                        message='An error occurred during analysis. Please try again.')
+    elif job.status == EXPIRED:
+        body.update(error='DEADLINE_EXCEEDED',
+                    message='The analysis could not finish in time. Please try again.')
+    return body
+
+@main_bp.route('/jobs/<job_id>', methods=['GET'])
+@login_required
+def job_status(job_id):
+    """
+    Status of a queued analysis, with its result once done.
+
+    ?wait=<seconds> long-polls: the response is held until the job finishes
+    or the wait (capped by JOB_MAX_WAIT) runs out.
+    """
+    job_queue = current_app.extensions.get('job_queue')
+    job = job_queue.get(job_id, owner=_job_owner()) if job_queue is not None else None
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    wait = min(request.args.get('wait', 0, type=float), current_app.config['JOB_MAX_WAIT'])
+    if wait > 0:
+        job_queue.wait(job, wait)
+    return jsonify(_job_body(job))
+
+@main_bp.route('/jobs/<job_id>', methods=['DELETE'])
+@login_required
+def cancel_job(job_id):
+    """Cancel a queued or running analysis."""
+    job_queue = current_app.extensions.get('job_queue')
+    job = job_queue.get(job_id, owner=_job_owner()) if job_queue is not None else None
+    if job is None:
+        return jsonify({'error': 'Unknown job'}), 404
+    
+    job_queue.cancel(job)
+    return jsonify(_job_body(job))
+
+@main_bp.route('/analyze/stream', methods=['POST'])
+@login_required
+def analyze_stream():
+    """
+    Stream the analysis as newline-delimited JSON events.
+
+    The daily target is sent straight away, then one 'field' event per
+    analysis field as the model produces it, then a 'done' event carrying
+    the complete result (or an 'error' event). When every food item is in
+    the food index, an 'estimate' event with its totals follows the
+    food_items field.
+    """
+    try:
+        # Reject bad uploads before any other work
+        upload, error = _uploaded_image()
+        if error:
+            return error
+        
+        translations = Translations.get_translation('English')
+        profile, daily_target, error = _profile_from_form(request.form, translations)
+        if error:
+            return error
         
-        # Handle image upload
-        if 'image' not in request.files:
-            return jsonify({'error': 'No image uploaded'}), 400
+        ai_service = _ai_service()
+        processed_image, = _prepare_images(ai_service, [upload.read()])
+    except PreprocessPoolFull:
+        return _busy_response()
+    except Exception as e:
+        current_app.logger.error(f"Analysis error: {e}")
+        _count_error('analysis_error')
+        return jsonify({
+            'error': 'ANALYSIS_ERROR',
+            'message': 'An error occurred during analysis. Please try again.'
+        }), 500
+    
+    def event(payload):
+        return json.dumps(payload) + '\n'
+    
+    food_index = current_app.extensions.get('food_index')
+    
+    def generate():
+        yield event({'event': 'target', 'daily_target': daily_target})
+        try:
+            fields = {}
+            for field, value in ai_service.stream_nutrition_analysis(
+                processed_image, profile.goal, profile.diet_type
+            ):
+                fields[field] = value
+                payload = {'event': 'field', 'field': field, 'value': value}
+                if field == 'total_calories' and isinstance(value, (int, float)):
+                    payload.update(_meal_impact(value, daily_target))
+                yield event(payload)
+                if field == 'food_items' and food_index is not None and isinstance(value, list):
+                    # Known foods get numbers now, long before the model's own
+                    try:
+                        estimate = food_index.estimate([str(item) for item in value])
+                    except ValueError as e:
+                        current_app.logger.error(f"Food index error: {e}")
+                        estimate = no_estimate(value)
+                    if estimate['complete']:
+                        yield event({'event': 'estimate', **estimate,
+                                     **_meal_impact(estimate['total_calories'], daily_target)})
+            # The streamed fields are only coerced one by one; the meal log
+            # gets the analysis validated as a whole
+            analysis = response_schema.validate_analysis(fields)
+            result = NutritionResult.from_dict(analysis)
+            _log_meals([analysis])
+            yield event({'event': 'done', 'result': _result_payload(result, daily_target)})
+        except Exception as e:
+            error_msg = str(e)
+            if "RATE_LIMIT_EXCEEDED" in error_msg:
+                _count_error('rate_limit')
+                yield event({'event': 'error', **_rate_limit_body(error_msg)})
+            else:
+                current_app.logger.error(f"Analysis error: {e}")
+                _count_error('analysis_error')
+                yield event({
+                    'event': 'error',
+                    'error': 'ANALYSIS_ERROR',
+                    'message': 'An error occurred during analysis. Please try again.'
+                })
+    
+    return Response(
+        stream_with_context(generate()),
+        mimetype='application/x-ndjson',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'},
+    )
+
+@main_bp.route('/analyze_batch', methods=['POST'])
+@login_required
+def analyze_batch():
+    """Analyze several meal photos against one computed daily target."""
+    try:
+        files = [f for f in request.files.getlist('images') if f.filename != '']
+        if not files:
+            return jsonify({'error': 'No images uploaded'}), 400
         
-        file = request.files['image']
-        if file.filename == '':
-            return jsonify({'error': 'No image selected'}), 400
+        max_images = current_app.config['BATCH_MAX_IMAGES']
+        if len(files) > max_images:
+            return jsonify({'error': f'Upload at most {max_images} images at once'}), 400
         
-        if not allowed_file(file.filename):
-            return jsonify({'error': 'Invalid file type'}), 400
+        # Reject bad uploads before any other work
+        error = _validate_uploads(files)
+        if error:
+            return error
         
-        # Process image
-        image_bytes = file.read()
-        image = Image.open(io.BytesIO(image_bytes))
+        translations = Translations.get_translation('English')
+        profile, daily_target, error = _profile_from_form(request.form, translations)
+        if error:
+            return error
         
-        # Get AI analysis
-        ai_service = AIService()
-        processed_image = ai_service.process_image(image)
-        analysis_data = ai_service.get_nutrition_analysis(
-            processed_image, profile.goal, profile.diet_type
+        ai_service = _ai_service()
+        images = _prepare_images(ai_service, [f.read() for f in files])
+        analyses = ai_service.get_batch_nutrition_analysis(
+            images, profile.goal, profile.diet_type,
+            max_parallel=current_app.config['BATCH_MAX_PARALLEL'],
+            pack=current_app.config['BATCH_PACK_IMAGES'],
         )
         
-        # Create nutrition result
-        result = NutritionResult.from_dict(analysis_data)
+        results = []
+        total_calories = 0
+        rate_limited = None
+        for f, analysis in zip(files, analyses):
+            if isinstance(analysis, Exception):
+                if "RATE_LIMIT_EXCEEDED" in str(analysis):
+                    rate_limited = analysis
+                current_app.logger.error(f"Batch analysis error for {f.filename}: {analysis}")
+                results.append({
+                    'filename': f.filename,
+                    'success': False,
+                    'error': 'RATE_LIMIT' if "RATE_LIMIT_EXCEEDED" in str(analysis) else 'ANALYSIS_ERROR',
+                })
+                continue
+            result = NutritionResult.from_dict(analysis)
+            total_calories += result.total_calories
+            results.append({
+                'filename': f.filename,
+                'success': True,
+                'result': _result_payload(result, daily_target),
+            })
         
-        # Calculate meal impact
-        meal_impact_pct = CalorieCalculator.calculate_meal_impact_percentage(
-            result.total_calories, daily_target
-        )
-        progress_ratio = CalorieCalculator.calculate_progress_ratio(
-            result.total_calories, daily_target
-        )
+        if rate_limited is not None and not any(r['success'] for r in results):
+            return _rate_limit_response(str(rate_limited))
         
-        # Convert image to base64 for display
-        buffered = io.BytesIO()
-        processed_image.save(buffered, format="JPEG")
-        img_str = base64.b64encode(buffered.getvalue()).decode()
+        _log_meals([a for a in analyses if not isinstance(a, Exception)])
         
-        return jsonify({
-            'success': True,
-            'result': {
-                'food_items': result.food_items,
-                'total_calories': result.total_calories,
-                'macros': result.macros,
-                'health_score': result.health_score,
-                'burn_off': result.burn_off,
-                'is_diet_compliant': result.is_diet_compliant,
-                'analysis': result.analysis,
-                'suggestion': result.suggestion,
-                'daily_target': daily_target,
-                'meal_impact_pct': int(meal_impact_pct),
-                'progress_ratio': progress_ratio,
-                'image_data': img_str
-            }
-        })
+        with _stage('calculator'):
+            meal_impact_pct = CalorieCalculator.calculate_meal_impact_percentage(
+                total_calories, daily_target
+            )
+            progress_ratio = CalorieCalculator.calculate_progress_ratio(
+                total_calories, daily_target
+            )
+        
+        with _stage('serialize'):
+            return jsonify({
+                'success': True,
+                'results': results,
+                'daily_total': {
+                    'total_calories': total_calories,
+                    'daily_target': daily_target,
+                    'remaining_calories': daily_target - total_calories,
+                    'meal_impact_pct': int(meal_impact_pct),
+                    'progress_ratio': progress_ratio,
+                }
+            })
         
+    except PreprocessPoolFull:
+        return _busy_response()
     except Exception as e:
         error_msg = str(e)
         
         if "RATE_LIMIT_EXCEEDED" in error_msg:
-            # Extract wait time from error message if available
-            wait_time = 30  # default
-            match = re.search(r"retry in ([0-9\.]+)s", error_msg)
-            if match:
-                wait_time = int(float(match.group(1)))
-            
-            return jsonify({
-                'error': 'RATE_LIMIT',
-                'message': f'Please wait {wait_time} seconds before trying again.',
-                'wait_time': wait_time
-            }), 429
+            return _rate_limit_response(error_msg)
         else:
-            current_app.logger.error(f"Analysis error: {e}")
+            current_app.logger.error(f"Batch analysis error: {e}")
+            _count_error('analysis_error')
             return jsonify({
                 'error': 'ANALYSIS_ERROR',
                 'message': 'An error occurred during analysis. Please try again.'
             }), 500
 
+@main_bp.route('/images/<digest>')
+@login_required
+def image(digest):
+    """Serve a processed meal image by content digest."""
+    stored = current_app.extensions['image_store'].get(digest)
+    if stored is None:
+        abort(404)
+    
+    data, mime_type = stored
+    response = Response(data, mimetype=mime_type)
+    # The digest names the exact bytes, so the image can never change
+    response.set_etag(digest)
+    response.cache_control.private = True
+    response.cache_control.max_age = 31536000
+    response.cache_control.immutable = True
+    return response.make_conditional(request)
+
+def _query_date(name, default):
+    """Parse an ISO date query parameter, or None if it is malformed."""
+    value = request.args.get(name)
+    if not value:
+        return default
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+@main_bp.route('/summary/daily')
+@login_required
+def daily_summary():
+    """Calorie and macro totals per day, read from the precomputed rollups."""
+    meal_log = current_app.extensions.get('meal_log')
+    user_id = _user_id()
+    if meal_log is None or user_id is None:
+        return jsonify({'error': 'Meal history is not available'}), 404
+    
+    end = _query_date('end', _local_now().date())
+    start = _query_date('start', end)
+    if start is None or end is None or start > end:
+        return jsonify({'error': 'Invalid date range'}), 400
+    if (end - start).days >= 366:
+        return jsonify({'error': 'Date range is limited to one year'}), 400
+    
+    daily_target = _session_daily_target()
+    days = meal_log.daily_totals(user_id, start, end)
+    if daily_target:
+        for day in days:
+            day['remaining_calories'] = daily_target - day['calories']
+    return jsonify({'success': True, 'daily_target': daily_target, 'days': days})
+
+@main_bp.route('/summary/weekly')
+@login_required
+def weekly_summary():
+    """Calorie and macro totals for the last few ISO weeks."""
+    meal_log = current_app.extensions.get('meal_log')
+    user_id = _user_id()
+    if meal_log is None or user_id is None:
+        return jsonify({'error': 'Meal history is not available'}), 404
+    
+    weeks = request.args.get('weeks', 4, type=int)
+    if not 1 <= weeks <= 104:
+        return jsonify({'error': 'weeks must be between 1 and 104'}), 400
+    
+    today = _local_now().date()
+    daily_target = _session_daily_target()
+    return jsonify({
+        'success': True,
+        'weekly_target': daily_target * 7 if daily_target else None,
+        'weeks': meal_log.weekly_totals(user_id, today - timedelta(weeks=weeks - 1), today),
+    })
+
+@main_bp.route('/meals')
+@login_required
+def meals():
+    """The meals logged on one day (today by default)."""
+    meal_log = current_app.extensions.get('meal_log')
+    user_id = _user_id()
+    if meal_log is None or user_id is None:
+        return jsonify({'error': 'Meal history is not available'}), 404
+    
+    day = _query_date('date', _local_now().date())
+    if day is None:
+        return jsonify({'error': 'Invalid date'}), 400
+    return jsonify({'success': True, 'date': day.isoformat(),
+                    'meals': meal_log.meals_for_day(user_id, day)})
+
+@main_bp.route('/estimate', methods=['POST'])
+@login_required
+def estimate():
+    """
+    Estimate a meal typed as text ("2 eggs, toast and coffee") from the
+    food index alone, without calling the model.
+    """
+    food_index = current_app.extensions.get('food_index')
+    if food_index is None:
+        return jsonify({'error': 'Food estimates are not available'}), 404
+    
+    data = request.get_json(silent=True) or request.form
+    text = str(data.get('text', ''))[:2000]
+    if not text.strip():
+        return jsonify({'error': 'No food items given'}), 400
+    
+    try:
+        result = food_index.estimate(food_index.split_items(text))
+    except ValueError as e:
+        # A corrupt index file; nothing is matched until a rebuild replaces it
+        current_app.logger.error(f"Food index error: {e}")
+        result = no_estimate([text.strip()])
+    daily_target = _session_daily_target()
+    if daily_target:
+        result.update(_meal_impact(result['total_calories'], daily_target))
+    return jsonify({'success': True, 'daily_target': daily_target, **result})
+
+@main_bp.route('/foods')
+@login_required
+def foods():
+    """Indexed foods starting with ?prefix=, most often seen first."""
+    food_index = current_app.extensions.get('food_index')
+    if food_index is None:
+        return jsonify({'error': 'Food estimates are not available'}), 404
+    
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+    try:
+        entries = food_index.suggest(request.args.get('prefix', ''), limit)
+    except ValueError as e:
+        current_app.logger.error(f"Food index error: {e}")
+        entries = []
+    return jsonify({'success': True, 'foods': [
+        {'name': entry.name, 'calories': round(entry.calories), 'meals_seen': entry.meals}
+        for entry in entries
+    ]})
+
 @main_bp.route('/update_profile', methods=['POST'])
 @login_required
 def update_profile():
     """Update user profile in session."""
     try:
-        # Debug: Log received form data
-        current_app.logger.info(f"Update profile received form data: {dict(request.form)}")
+        # Debug: Log received form data (built only when debug logging is on)
+        debug = current_app.logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            current_app.logger.debug(f"Update profile received form data: {dict(request.form)}")
         
         # Get form values with validation
         gender = request.form.get('gender')
@@ -194,7 +837,8 @@ def update_profile():
         diet_type = request.form.get('diet_type')
         
         # Debug: Log individual values
-        current_app.logger.info(f"Update profile values - gender: {gender}, activity: {activity_level}, goal: {goal}, diet: {diet_type}")
+        if debug:
+            current_app.logger.debug(f"Update profile values - gender: {gender}, activity: {activity_level}, goal: {goal}, diet: {diet_type}")
         
         # Validate required fields
         if not all([gender, activity_level, goal, diet_type]):
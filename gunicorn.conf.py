@@ -0,0 +1,16 @@
+# Gunicorn settings, overridable through the environment.
+#
+# The default gthread worker holds one thread per in-flight /analyze call.
+# Set GUNICORN_WORKER_CLASS=gevent to serve each request on a greenlet
+# instead: the blocking Gemini HTTP call then yields to the hub, so a single
+# worker can keep hundreds of model calls in flight.
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', '8080')}"
+# Async analysis jobs are kept per process, so app.py turns the job queue
+# off when this is above 1
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+worker_connections = int(os.getenv('GUNICORN_WORKER_CONNECTIONS', 1000))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 0))
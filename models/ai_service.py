@@ -1,16 +1,95 @@
-import json
 import os
-from google import genai
-from google.genai import types
-from google.genai.errors import ClientError
-from PIL import Image
-from dotenv import load_dotenv
+import re
+import time
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from models.analysis_cache import AnalysisCache
+from models.model_tiers import Tier
+from models.json_stream import IncrementalJSONObjectParser
+from models import response_schema
+from models import image_processing
+from models.genai_pool import read_timeout
+from models.image_processing import PreparedImage
+
+MODEL_NAME = os.getenv("GEMINI_MODEL", "gemini-flash-latest")
+
+# JSON shape the model is asked to return for each analyzed meal
+ANALYSIS_FORMAT = """{
+            "food_items": ["item1", "item2"],
+            "total_calories": 000,
+            "macros": { "protein": 0, "fat": 0, "carbs": 0 },
+            "health_score": 0,  
+            "burn_off": { "walking": 0, "running": 0, "swimming": 0 },
+            "is_diet_compliant": true, 
+            "analysis": "Brief analysis in English.",
+            "suggestion": "One specific tip in English."
+        }"""
+
+# The single call made when no MODEL_TIERS are configured
+DEFAULT_TIER = Tier()
+
+
+@lru_cache(maxsize=256)
+def build_prompt(diet_goal, diet_type, compact=False):
+    """
+    Build the nutritionist instruction, once per goal, diet and style.
+
+    The compact prompt leaves the answer's shape to the response schema
+    sent with it, and asks the model to rate its confidence, which decides
+    whether a cheaper tier's answer is kept.
+    """
+    if compact:
+        return (f"Nutritionist. User goal: {diet_goal}; diet: {diet_type}. "
+                "Analyze the meal photo. English, one sentence each for analysis and suggestion. "
+                "confidence: 0-1, how sure you are of the foods and portions.")
+    return f"""
+        You are an expert Personal Nutritionist speaking English.
+        User Profile: Goal={diet_goal}, Diet={diet_type}.
+
+        Analyze the food image. Respond in English for text fields.
+        Return ONLY JSON:
+        {ANALYSIS_FORMAT}
+        """
+
+
+@lru_cache(maxsize=256)
+def build_batch_prompt(diet_goal, diet_type, count):
+    """Build the instruction for analyzing several meal images at once."""
+    return f"""
+        You are an expert Personal Nutritionist speaking English.
+        User Profile: Goal={diet_goal}, Diet={diet_type}.
+
+        You are given {count} food images, each a separate meal.
+        Analyze each image on its own. Respond in English for text fields.
+        Return ONLY a JSON array with exactly {count} objects, one per image
+        in the order the images were given, each shaped like:
+        {ANALYSIS_FORMAT}
+        """
 
-load_dotenv()
 
 class AIService:
-    def __init__(self):
-        self.api_key = self._load_api_key()
+    def __init__(self, cache=None, image_index=None, client=None,
+                 rate_limiter=None, single_flight=None, max_rate_limit_retries=2,
+                 metrics=None, model_tiers=None, on_fresh_analysis=None, should_stop=None,
+                 deadline=None):
+        # A shared (pooled) client already carries the API key
+        self.client = client
+        self.api_key = None if client is not None else self._load_api_key()
+        self.cache = cache
+        self.image_index = image_index
+        self.rate_limiter = rate_limiter
+        self.single_flight = single_flight
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.metrics = metrics
+        self.model_tiers = model_tiers
+        # Called with each analysis the model produced, never with cache hits
+        self.on_fresh_analysis = on_fresh_analysis
+        # Checked before every model call; True abandons the analysis
+        self.should_stop = should_stop
+        # time.monotonic() by which the analysis must finish; model calls
+        # aren't started past it and can't wait on a reply beyond it
+        self.deadline = deadline
     
     def _load_api_key(self):
         """Load API key from environment variables."""
@@ -21,47 +100,414 @@ class AIService:
     
     def process_image(self, image):
         """Process image for AI analysis."""
-        image.thumbnail((1024, 1024))
+        return image_processing.process_image(image)
+
+    def prepare_image(self, image_bytes):
+        """Prepare uploaded image bytes for AI analysis."""
+        return image_processing.prepare_image(image_bytes)
+
+    def _stage(self, stage):
+        """Time a pipeline stage when metrics are enabled."""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.stage(stage)
+
+    def _in_flight(self):
+        """Count a Gemini call as in flight when metrics are enabled."""
+        if self.metrics is None:
+            return nullcontext()
+        return self.metrics.gemini_in_flight.track()
+
+    def _timed_stream(self, stream):
+        """
+        Iterate a response stream, recording only the time spent waiting on
+        the model as the model_call stage, not the time the caller spends
+        between chunks.
+        """
+        if self.metrics is None:
+            yield from stream
+            return
+        waited = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    response = next(stream)
+                except StopIteration:
+                    return
+                finally:
+                    waited += time.perf_counter() - start
+                yield response
+        finally:
+            self.metrics.observe_stage('model_call', waited)
+
+    def _parse(self, parse, text):
+        with self._stage('json_parse'):
+            return parse(text)
+
+    def _model_input(self, image):
+        """Send prepared images as their encoded bytes so the SDK doesn't re-encode."""
+        if isinstance(image, PreparedImage):
+            from google.genai import types
+            return types.Part.from_bytes(data=image.data, mime_type=image.mime_type)
         return image
     
     def get_nutrition_analysis(self, image, diet_goal, diet_type):
         """
-        Get nutrition analysis from Google Gemini AI.
+        Get nutrition analysis, serving repeat uploads from the result cache.
         """
-        client = genai.Client(api_key=self.api_key)
-        
-        sys_instruction = f"""
-        You are an expert Personal Nutritionist speaking English.
-        User Profile: Goal={diet_goal}, Diet={diet_type}.
+        cached, pending = self._lookup_analysis(image, diet_goal, diet_type)
+        if cached is not None:
+            return cached
+        return self._shared_analysis(image, diet_goal, diet_type, pending)
 
-        Analyze the food image. Respond in English for text fields.
-        Return ONLY JSON:
-        {{
-            "food_items": ["item1", "item2"],
-            "total_calories": 000,
-            "macros": {{ "protein": "0%", "fat": "0%", "carbs": "0%" }},
-            "health_score": 0,  
-            "burn_off": {{ "walking": 0, "running": 0, "swimming": 0 }},
-            "is_diet_compliant": true, 
-            "analysis": "Brief analysis in English.",
-            "suggestion": "One specific tip in English."
-        }}
+    def _shared_analysis(self, image, diet_goal, diet_type, pending):
+        """Generate and store an analysis, sharing one model call between identical uploads in flight."""
+        def generate():
+            analysis = self._generate_nutrition_analysis(image, diet_goal, diet_type)
+            self._store_analysis(pending, analysis)
+            return analysis
+
+        if self.single_flight is None:
+            return generate()
+        return self.single_flight.do(pending[0], generate)
+
+    def stream_nutrition_analysis(self, image, diet_goal, diet_type):
         """
-        
+        Yield (field, value) pairs of the analysis as the model generates them.
+
+        Cached analyses are replayed field by field at once, as is the result
+        of an identical upload already being analyzed. While a stream runs,
+        identical uploads wait for its result instead of calling the model.
+        A fresh analysis is stored in the caches only after the full
+        response has parsed.
+        """
+        cached, pending = self._lookup_analysis(image, diet_goal, diet_type)
+        if cached is not None:
+            yield from cached.items()
+            return
+
+        finish = None
+        if self.single_flight is not None:
+            finish = self.single_flight.lead(pending[0])
+            if finish is None:
+                yield from self._shared_analysis(image, diet_goal, diet_type, pending).items()
+                return
+
+        analysis = None
+        # A client that hangs up mid-stream leaves no result to share
+        error = Exception("ANALYSIS_ERROR: streamed analysis was abandoned")
         try:
-            response = client.models.generate_content(
-                model="gemini-flash-latest",
-                contents=[image, sys_instruction],
-                config=types.GenerateContentConfig(
-                    response_mime_type="application/json"
+            analysis = yield from self._stream_model(image, diet_goal, diet_type)
+            self._store_analysis(pending, analysis)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            if finish is not None:
+                finish(analysis, None if analysis is not None else error)
+
+    def _stream_model(self, image, diet_goal, diet_type):
+        """
+        Stream one analysis from the model, yielding its fields and
+        returning the parsed result.
+
+        Like _call_model, a rate-limited attempt is retried once the
+        limiter allows it, but only while no field has been sent yet.
+        """
+        client = self._client()
+        # Fields already sent can't be taken back, so streams skip straight
+        # to the last tier, with the full prompt spelling out the field order
+        last = self._tiers()[-1]
+        request = self._tier_request(image, Tier(last.model, last.max_size), diet_goal, diet_type)
+        # A response_schema would make the model emit fields in alphabetical
+        # order (the SDK can't send propertyOrdering), putting total_calories
+        # last; the prompt keeps the order the UI fills in, and the result is
+        # validated all the same
+        request['config'] = self._generation_config(schema=None)
+        attempts = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            parser = IncrementalJSONObjectParser()
+            chunks = []
+            sent = False
+            try:
+                with self._in_flight():
+                    for response in self._timed_stream(client.models.generate_content_stream(**request)):
+                        text = response.text
+                        if not text:
+                            continue
+                        chunks.append(text)
+                        for field, value in parser.feed(text):
+                            sent = True
+                            yield field, response_schema.coerce_field(field, value)
+                analysis = self._parse(response_schema.parse_analysis, ''.join(chunks))
+            except Exception as e:
+                error = self._translate_error(e)
+                self._record_outcome(error)
+                attempts += 1
+                if sent or not self._should_retry(error, attempts):
+                    raise error
+                continue
+            self._record_outcome(None)
+            return analysis
+
+    def get_batch_nutrition_analysis(self, images, diet_goal, diet_type,
+                                     max_parallel=4, pack=True):
+        """
+        Analyze several meal photos for one profile.
+
+        Cache hits are served first. The remaining images are packed into a
+        single model call when pack is set; if that fails or the reply does
+        not contain one analysis per image, they are analyzed individually
+        with at most max_parallel calls in flight. Returns one entry per
+        image, in order: the analysis dict, or the Exception it raised.
+        """
+        results = [None] * len(images)
+        pending = {}
+        for i, image in enumerate(images):
+            cached, pending_keys = self._lookup_analysis(image, diet_goal, diet_type)
+            if cached is not None:
+                results[i] = cached
+            else:
+                pending[i] = pending_keys
+
+        missing = list(pending)
+        if pack and len(missing) > 1:
+            try:
+                analyses = self._generate_packed_analysis(
+                    [images[i] for i in missing], diet_goal, diet_type
                 )
-            )
-            return json.loads(response.text)
-        except ClientError as e:
-            error_text = str(e)
+            except Exception as e:
+                # A rate limit will hit the per-image calls too
+                if "RATE_LIMIT_EXCEEDED" in str(e):
+                    raise
+                analyses = None
+            if analyses is not None:
+                for i, analysis in zip(missing, analyses):
+                    results[i] = analysis
+                    self._store_analysis(pending[i], analysis)
+                return results
+
+        def analyze_one(i):
+            try:
+                analysis = self._generate_nutrition_analysis(images[i], diet_goal, diet_type)
+            except Exception as e:
+                return i, e
+            self._store_analysis(pending[i], analysis)
+            return i, analysis
+
+        if missing:
+            workers = max(1, min(max_parallel, len(missing)))
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                for i, analysis in executor.map(analyze_one, missing):
+                    results[i] = analysis
+        return results
+
+    def _lookup_analysis(self, image, diet_goal, diet_type):
+        """
+        Check the exact and near-duplicate caches.
+
+        Returns (analysis, pending) where pending carries the keys needed to
+        store a fresh analysis when there was no hit.
+        """
+        prepared = isinstance(image, PreparedImage)
+        cache_key = None
+        if self.cache is not None or self.single_flight is not None:
+            content = image.data if prepared else image
+            cache_key = AnalysisCache.make_key(content, diet_goal, diet_type)
+        if self.cache is not None:
+            cached = self.cache.get(cache_key)
+            if cached is not None:
+                return cached, None
+
+        # Re-shot or re-encoded photos of the same plate reuse the stored result
+        image_hash = None
+        namespace = f"{diet_goal}:{diet_type}"
+        if self.image_index is not None:
+            image_hash = self.image_index.hash_image(image.preview() if prepared else image)
+            match = self.image_index.lookup(image_hash, namespace)
+            if match is not None:
+                analysis = dict(match[0])
+                if self.cache is not None:
+                    self.cache.set(cache_key, analysis)
+                return analysis, None
+
+        return None, (cache_key, image_hash, namespace)
+
+    def _store_analysis(self, pending, analysis):
+        """Record a fresh model analysis in the caches."""
+        cache_key, image_hash, namespace = pending
+        if self.cache is not None:
+            self.cache.set(cache_key, analysis)
+        if image_hash is not None:
+            self.image_index.add(image_hash, namespace, analysis)
+        if self.on_fresh_analysis is not None:
+            self.on_fresh_analysis(analysis)
+
+    def _client(self):
+        """
+        Return the shared Gemini client, or create one honouring
+        GEMINI_BASE_URL for local stubs.
+        """
+        if self.client is not None:
+            return self.client
+        from google import genai
+        base_url = os.getenv("GEMINI_BASE_URL")
+        if base_url:
+            return genai.Client(api_key=self.api_key, http_options={'base_url': base_url})
+        return genai.Client(api_key=self.api_key)
+
+    def _generation_config(self, schema=response_schema.ANALYSIS_MODEL_SCHEMA):
+        from google.genai import types
+        return types.GenerateContentConfig(
+            response_mime_type="application/json",
+            response_schema=schema,
+        )
+
+    def _translate_error(self, error):
+        """Map SDK errors onto the messages the controllers understand."""
+        if str(error).startswith(("RATE_LIMIT_EXCEEDED", "API_ERROR", "ANALYSIS_ERROR", "CANCELLED")):
+            return error
+        from google.genai.errors import ClientError
+        if isinstance(error, ClientError):
+            error_text = str(error)
             if "429" in error_text or "RESOURCE_EXHAUSTED" in error_text:
-                raise Exception("RATE_LIMIT_EXCEEDED")
-            else:
-                raise Exception(f"API_ERROR: {e}")
+                retry_after = self._retry_delay(error_text)
+                if retry_after is not None:
+                    return Exception(f"RATE_LIMIT_EXCEEDED: retry in {retry_after:g}s")
+                return Exception("RATE_LIMIT_EXCEEDED")
+            return Exception(f"API_ERROR: {error}")
+        return Exception(f"ANALYSIS_ERROR: {error}")
+
+    def _retry_delay(self, error_text):
+        """Pull the server's suggested retry delay (seconds) out of a 429 message."""
+        match = re.search(r"retry in ([0-9\.]+)s", error_text, re.IGNORECASE)
+        if not match:
+            match = re.search(r"retryDelay['\"]?:\s*['\"]([0-9\.]+)s", error_text)
+        return float(match.group(1)) if match else None
+
+    def _record_outcome(self, error):
+        """Feed the result of a model call back into the shared rate limiter."""
+        if error is not None and self.metrics is not None:
+            kind = str(error).split(':', 1)[0]
+            self.metrics.gemini_errors.inc(
+                kind='rate_limited' if kind == 'RATE_LIMIT_EXCEEDED' else kind.lower()
+            )
+        if self.rate_limiter is None:
+            return
+        if error is None:
+            self.rate_limiter.on_success()
+        elif "RATE_LIMIT_EXCEEDED" in str(error):
+            self.rate_limiter.on_rate_limited(self._retry_delay(str(error)))
+
+    def _should_retry(self, error, attempts):
+        """Retry rate-limited calls while the limiter can pace them, up to max_rate_limit_retries."""
+        return (self.rate_limiter is not None and "RATE_LIMIT_EXCEEDED" in str(error)
+                and attempts <= self.max_rate_limit_retries)
+
+    def _call_model(self, call):
+        """
+        Run one Gemini request under the shared rate limiter.
+
+        Requests queue for a slot instead of failing, and a rate-limited
+        attempt is retried once the limiter's back-off allows it.
+        """
+        attempts = 0
+        while True:
+            if self.should_stop is not None and self.should_stop():
+                raise Exception("CANCELLED")
+            if self.rate_limiter is not None:
+                self.rate_limiter.wait()
+            remaining = None
+            if self.deadline is not None:
+                remaining = self.deadline - time.monotonic()
+                if remaining <= 0:
+                    raise Exception("DEADLINE_EXCEEDED: the analysis ran out of time")
+            try:
+                with self._stage('model_call'), self._in_flight(), read_timeout(remaining):
+                    response = call()
+            except Exception as e:
+                error = self._translate_error(e)
+                self._record_outcome(error)
+                attempts += 1
+                if not self._should_retry(error, attempts):
+                    raise error
+                continue
+            self._record_outcome(None)
+            return response
+
+    def _tiers(self):
+        return (DEFAULT_TIER,) if self.model_tiers is None else self.model_tiers.tiers
+
+    def _tier_request(self, image, tier, diet_goal, diet_type):
+        """generate_content arguments for one analysis at one tier."""
+        if tier.max_size < image_processing.MAX_IMAGE_SIZE and isinstance(image, PreparedImage):
+            with self._stage('downscale'):
+                image = image.resized(tier.max_size)
+        return {
+            'model': tier.model or MODEL_NAME,
+            'contents': [self._model_input(image), build_prompt(diet_goal, diet_type, tier.compact)],
+            'config': self._generation_config(),
+        }
+
+    def _tier_result(self, tier, response, last):
+        """
+        Parse one tier's response. Returns the analysis, or None when a
+        later tier should be asked instead; the last tier's parse errors raise.
+        """
+        try:
+            analysis = self._parse(response_schema.parse_analysis, response.text)
+        except response_schema.SchemaError:
+            if last:
+                raise
+            reason = 'invalid'
+        else:
+            reason = None if last else tier.escalation_reason(analysis)
+        if self.model_tiers is not None:
+            self.model_tiers.record(tier, getattr(response, 'usage_metadata', None), reason)
+        return analysis if reason is None else None
+
+    def _generate_nutrition_analysis(self, image, diet_goal, diet_type):
+        """
+        Get nutrition analysis from Google Gemini AI, cheapest tier first.
+        """
+        client = self._client()
+        tiers = self._tiers()
+        
+        try:
+            for i, tier in enumerate(tiers):
+                request = self._tier_request(image, tier, diet_goal, diet_type)
+                response = self._call_model(lambda: client.models.generate_content(**request))
+                analysis = self._tier_result(tier, response, i == len(tiers) - 1)
+                if analysis is not None:
+                    return analysis
         except Exception as e:
-            raise Exception(f"ANALYSIS_ERROR: {e}")
+            raise self._translate_error(e)
+
+    def _generate_packed_analysis(self, images, diet_goal, diet_type):
+        """
+        Analyze several images in one Gemini call.
+
+        Returns a list with one analysis per image, or None when the model
+        did not answer with exactly that many objects.
+        """
+        client = self._client()
+
+        try:
+            response = self._call_model(lambda: client.models.generate_content(
+                model=self._tiers()[-1].model or MODEL_NAME,
+                contents=[*map(self._model_input, images), build_batch_prompt(diet_goal, diet_type, len(images))],
+                config=self._generation_config(response_schema.ANALYSIS_LIST_MODEL_SCHEMA)
+            ))
+        except Exception as e:
+            raise self._translate_error(e)
+
+        try:
+            analyses = self._parse(response_schema.parse_analysis_list, response.text)
+        except response_schema.SchemaError:
+            return None
+        if len(analyses) != len(images):
+            return None
+        return analyses
@@ -0,0 +1,80 @@
+import copy
+import hashlib
+
+from models.cache_backends import MemoryBackend, SQLiteBackend
+
+
+class AnalysisCache:
+    """
+    Content-addressed cache for Gemini nutrition analyses.
+
+    Entries are keyed by a hash of the image content plus the prompt inputs
+    (goal and diet), so re-uploading the same photo with the same profile
+    never costs another model call. Lookups try the in-process tier first and
+    fall back to the optional on-disk tier shared by all workers.
+    """
+
+    def __init__(self, memory_backend=None, disk_backend=None):
+        # Backends are sized, so an empty one is falsy
+        self.memory = MemoryBackend() if memory_backend is None else memory_backend
+        self.disk = disk_backend
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the cache from the Flask app configuration."""
+        ttl = config.get('ANALYSIS_CACHE_TTL', 24 * 3600)
+        memory = MemoryBackend(
+            max_entries=config.get('ANALYSIS_CACHE_MAX_ENTRIES', 512),
+            ttl=ttl,
+        )
+        disk = None
+        if config.get('ANALYSIS_CACHE_PATH'):
+            disk = SQLiteBackend(
+                config['ANALYSIS_CACHE_PATH'],
+                max_entries=config.get('ANALYSIS_CACHE_DISK_MAX_ENTRIES', 10000),
+                ttl=ttl,
+            )
+        return cls(memory, disk)
+
+    @staticmethod
+    def image_digest(image):
+        """Hash raw image bytes, or the decoded pixels of a PIL image."""
+        digest = hashlib.sha256()
+        if isinstance(image, (bytes, bytearray, memoryview)):
+            digest.update(image)
+        else:
+            digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+            digest.update(image.tobytes())
+        return digest.hexdigest()
+
+    @classmethod
+    def make_key(cls, image, diet_goal, diet_type):
+        """Build the cache key for an image and its prompt inputs."""
+        return f"{cls.image_digest(image)}:{diet_goal}:{diet_type}"
+
+    def get(self, key):
+        value = self.memory.get(key)
+        if value is None and self.disk is not None:
+            value = self.disk.get(key)
+            if value is not None:
+                self.memory.set(key, value)
+        # Hand out copies so callers can't mutate the cached analysis
+        return copy.deepcopy(value) if value is not None else None
+
+    def set(self, key, value):
+        value = copy.deepcopy(value)
+        self.memory.set(key, value)
+        if self.disk is not None:
+            self.disk.set(key, value)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def stats(self):
+        """Return hit/miss/eviction counters for each tier."""
+        stats = {'memory': self.memory.stats.as_dict()}
+        if self.disk is not None:
+            stats['disk'] = self.disk.stats.as_dict()
+        return stats
@@ -0,0 +1,571 @@
+"""
+Local nutrition estimates per food item, learned from past analyses.
+
+Bootstrap the index from an existing meal log with:
+
+    python -m models.food_index --meal-log instance/meal_log.sqlite3
+"""
+import argparse
+import mmap
+import os
+import re
+import sqlite3
+import struct
+import threading
+import time
+from collections import Counter
+
+from models.meal_log import KCAL_PER_GRAM, macro_grams
+from models.user_profile import MealRecord
+
+# Index file: magic, record count and record size, then fixed-size records
+# sorted by name: UTF-8 name (NUL padded), calories and protein, fat and
+# carbs grams per serving, and the number of meals the food was seen in
+MAGIC = b'FOODIDX1'
+HEADER = struct.Struct('<8sII')
+RECORD = struct.Struct('<48sffffI')
+NAME_BYTES = 48
+
+# Leading quantities, e.g. "2 eggs", "half an avocado", "a dozen oysters"
+NUMBER_WORDS = {
+    'a': 1, 'an': 1, 'one': 1, 'two': 2, 'three': 3, 'four': 4, 'five': 5,
+    'six': 6, 'seven': 7, 'eight': 8, 'nine': 9, 'ten': 10, 'half': 0.5,
+    'dozen': 12, 'couple': 2,
+}
+
+# Words that size a serving rather than name the food
+UNIT_WORDS = {
+    'of', 'x', 'slice', 'piece', 'cup', 'bowl', 'serving', 'portion', 'plate',
+    'glass', 'handful', 'scoop', 'tbsp', 'tsp', 'tablespoon', 'teaspoon',
+}
+
+ITEM_SEPARATORS = re.compile(r'\s*[,;\n+&]\s*')
+# Split typed items only where both sides are indexed foods, so that
+# "toast and jam" is two items but "mac and cheese" stays one
+JOINING_WORDS = re.compile(r'\s+(?:and|with)\s+', re.IGNORECASE)
+# Pieces with more joining words than this are split at every one
+MAX_JOINED = 8
+QUANTITY = re.compile(r'^(\d+/\d+|\d+(?:\.\d+)?)\s*')
+
+
+def _singular(word):
+    if len(word) <= 3 or word.endswith(('ss', 'us', 'is')):
+        return word
+    if word.endswith('ies'):
+        return word[:-3] + 'y'
+    if word.endswith(('oes', 'ches', 'shes', 'xes')):
+        return word[:-2]
+    if word.endswith('s'):
+        return word[:-1]
+    return word
+
+
+def parse_item(text):
+    """
+    Split a food item into (normalized name, quantity).
+
+    "2 Scrambled Eggs (large)" -> ("scrambled egg", 2.0). Names are lower
+    case, singular, without parentheticals, punctuation or unit words.
+    """
+    text = re.sub(r'\([^)]*\)', ' ', text.lower()).strip()
+    quantity = 1.0
+    match = QUANTITY.match(text)
+    if match:
+        number = match.group(1)
+        if '/' in number:
+            numerator, denominator = number.split('/')
+            quantity = float(numerator) / float(denominator) if float(denominator) else 1.0
+        else:
+            quantity = float(number)
+        text = text[match.end():]
+    words = re.findall(r'[^\W\d_]+', text)
+    while words and words[0] in NUMBER_WORDS:
+        quantity *= NUMBER_WORDS[words.pop(0)]
+    name = ' '.join(_singular(word) for word in words if _singular(word) not in UNIT_WORDS)
+    return name, quantity or 1.0
+
+
+def _encode_name(name):
+    encoded = name.encode()[:NAME_BYTES]
+    # Don't cut a multi-byte character in half
+    return encoded.decode(errors='ignore').encode().ljust(NAME_BYTES, b'\0')
+
+
+def _within_edits(a, b, limit):
+    """True if a and b are at most limit edits (Levenshtein) apart."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    # Only cells within limit of the diagonal can stay within limit, so
+    # each row computes a band of 2 * limit + 1 cells
+    outside = limit + 1
+    previous = {j: j for j in range(min(len(b), limit) + 1)}
+    for i, char_a in enumerate(a, 1):
+        current = {}
+        for j in range(max(0, i - limit), min(len(b), i + limit) + 1):
+            if j == 0:
+                current[j] = i
+                continue
+            current[j] = min(previous.get(j, outside) + 1, current.get(j - 1, outside) + 1,
+                             previous.get(j - 1, outside) + (char_a != b[j - 1]))
+        if min(current.values()) > limit:
+            return False
+        previous = current
+    return previous.get(len(b), outside) <= limit
+
+
+def write_index(path, rows):
+    """
+    Write (name, calories, protein_g, fat_g, carbs_g, meals) rows as an
+    index file, atomically replacing any existing one.
+    """
+    records = {}
+    for name, *values in rows:
+        # Names that collide once truncated keep the most-seen food
+        key = _encode_name(name)
+        if key not in records or values[-1] > records[key][-1]:
+            records[key] = values
+    temporary = f"{path}.{os.getpid()}.tmp"
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(temporary, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, len(records), RECORD.size))
+        for key in sorted(records):
+            f.write(RECORD.pack(key, *records[key]))
+    os.replace(temporary, path)
+
+
+class FoodEntry:
+    """Per-serving nutrition of one indexed food; match says how it was found."""
+
+    __slots__ = ('name', 'calories', 'protein', 'fat', 'carbs', 'meals', 'match')
+
+    def __init__(self, name, calories, protein, fat, carbs, meals, match='exact'):
+        self.name = name
+        self.calories = calories
+        self.protein = protein
+        self.fat = fat
+        self.carbs = carbs
+        self.meals = meals
+        self.match = match
+
+
+def no_estimate(items):
+    """An estimate() result in which none of items was found."""
+    return _estimate_result([], list(items), dict.fromkeys(('calories', 'protein', 'fat', 'carbs'), 0.0))
+
+
+def _estimate_result(matched, unmatched, totals):
+    calories = totals['calories']
+    return {
+        'items': matched,
+        'unmatched': unmatched,
+        'complete': bool(matched) and not unmatched,
+        'total_calories': round(calories),
+        'macros': {
+            name: round(totals[name] * KCAL_PER_GRAM[name] / calories * 100) if calories else 0
+            for name in ('protein', 'fat', 'carbs')
+        },
+        'macro_grams': {name: round(totals[name], 1) for name in ('protein', 'fat', 'carbs')},
+    }
+
+
+class FoodIndex:
+    """
+    Nutrition-per-item index: SQLite sums for learning, an mmap'd sorted
+    file for lookups.
+
+    Every analysis names its food items but only gives totals for the
+    whole meal. record() splits each meal's calories and macro grams over
+    its items, in proportion to what the index already believes each item
+    weighs (equally for items it hasn't seen), and adds the shares to
+    per-item sums. Every rebuild_every analyses the sums are compiled into
+    the index file, which lookups binary-search through mmap without
+    touching SQLite. Each process remaps it (checked at most every
+    reload_interval seconds) when any worker has rebuilt it. A corrupt
+    file raises ValueError from lookups.
+    """
+
+    def __init__(self, index_path, stats_path, min_meals=2, rebuild_every=50,
+                 reload_interval=5.0):
+        self.index_path = index_path
+        self.stats_path = stats_path
+        self.min_meals = min_meals
+        self.rebuild_every = rebuild_every
+        self.reload_interval = reload_interval
+        self._map = None
+        self._count = 0
+        self._mtime = None
+        self._checked = 0.0
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._conn = None
+
+        # Metrics
+        self.lookups = 0
+        self.hits = 0
+        self.recorded = 0
+        self.rebuilds = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the index from the Flask app configuration, or None if disabled."""
+        index_path = config.get('FOOD_INDEX_PATH')
+        if not index_path:
+            return None
+        return cls(
+            index_path,
+            config.get('FOOD_STATS_PATH') or f"{os.path.splitext(index_path)[0]}.sqlite3",
+            min_meals=config.get('FOOD_INDEX_MIN_MEALS', 2),
+            rebuild_every=config.get('FOOD_INDEX_REBUILD_EVERY', 50),
+        )
+
+    # Reading
+
+    def _mapping(self):
+        """The current (mmap, record count), remapping if the file was rebuilt."""
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return self._map, self._count
+        with self._lock:
+            self._checked = now
+            try:
+                mtime = os.stat(self.index_path).st_mtime_ns
+            except OSError:
+                return self._map, self._count
+            if mtime != self._mtime:
+                with open(self.index_path, 'rb') as f:
+                    if os.fstat(f.fileno()).st_size < HEADER.size:
+                        raise ValueError(f"{self.index_path} is not a food index")
+                    mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, count, record_size = HEADER.unpack_from(mapped)
+                if (magic != MAGIC or record_size != RECORD.size
+                        or len(mapped) < HEADER.size + count * RECORD.size):
+                    mapped.close()
+                    raise ValueError(f"{self.index_path} is not a food index")
+                # The old map is left to the garbage collector; another
+                # thread may still be reading from it
+                self._map, self._count, self._mtime = mapped, count, mtime
+        return self._map, self._count
+
+    def __len__(self):
+        return self._mapping()[1]
+
+    def _name_at(self, mapped, position):
+        offset = HEADER.size + position * RECORD.size
+        return mapped[offset:offset + NAME_BYTES]
+
+    def _entry_at(self, mapped, position, match='exact'):
+        name, calories, protein, fat, carbs, meals = RECORD.unpack_from(
+            mapped, HEADER.size + position * RECORD.size)
+        return FoodEntry(name.rstrip(b'\0').decode(), calories, protein, fat, carbs, meals, match)
+
+    def _bisect(self, mapped, count, key):
+        """First position whose name is >= key."""
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if self._name_at(mapped, middle) < key:
+                low = middle + 1
+            else:
+                high = middle
+        return low
+
+    def _exact(self, mapped, count, name, match='exact'):
+        key = _encode_name(name)
+        position = self._bisect(mapped, count, key)
+        if position < count and self._name_at(mapped, position) == key:
+            return self._entry_at(mapped, position, match)
+        return None
+
+    def _fuzzy(self, mapped, count, name, scan=256):
+        """The most-seen name a typo or two away, among names sharing the first two letters."""
+        limit = 1 if len(name) <= 5 else 2
+        prefix = name[:2].encode()
+        position = self._bisect(mapped, count, prefix)
+        letters = Counter(name)
+        best = None
+        for position in range(position, min(count, position + scan)):
+            candidate = self._name_at(mapped, position)
+            if not candidate.startswith(prefix):
+                break
+            candidate = candidate.rstrip(b'\0').decode()
+            if abs(len(candidate) - len(name)) > limit:
+                continue
+            # Letters in one name but not the other bound the edit distance
+            # from below, and are much cheaper to count
+            extra = Counter(candidate)
+            extra.subtract(letters)
+            if max(sum(n for n in extra.values() if n > 0), -sum(n for n in extra.values() if n < 0)) > limit:
+                continue
+            if _within_edits(name, candidate, limit):
+                entry = self._entry_at(mapped, position, 'fuzzy')
+                if best is None or entry.meals > best.meals:
+                    best = entry
+        return best
+
+    def _find(self, name):
+        mapped, count = self._mapping()
+        if not count or not name:
+            return None
+        entry = self._exact(mapped, count, name) or self._fuzzy(mapped, count, name)
+        words = name.split()
+        for start in range(1, len(words)):
+            if entry is not None:
+                break
+            entry = self._exact(mapped, count, ' '.join(words[start:]), 'partial')
+        return entry
+
+    def lookup(self, name):
+        """
+        Find a normalized food name: exactly, then allowing a typo or two,
+        then by its trailing words ("scrambled egg" -> "egg"). None if not found.
+        """
+        entry = self._find(name)
+        self.lookups += 1
+        if entry is not None:
+            self.hits += 1
+        return entry
+
+    def suggest(self, prefix, limit=10):
+        """Indexed names starting with prefix, most-seen first."""
+        mapped, count = self._mapping()
+        prefix = ' '.join(parse_item(prefix)[0].split()) if prefix.strip() else ''
+        if not count or not prefix:
+            return []
+        key = prefix.encode()
+        position = self._bisect(mapped, count, key)
+        entries = []
+        # Scan a bounded run of matches so a one-letter prefix stays cheap
+        for position in range(position, min(count, position + 20 * limit)):
+            if not self._name_at(mapped, position).startswith(key):
+                break
+            entries.append(self._entry_at(mapped, position, 'prefix'))
+        entries.sort(key=lambda entry: -entry.meals)
+        return entries[:limit]
+
+    def split_items(self, text):
+        """
+        Split typed text ("2 eggs, toast and jam") into food items.
+
+        Commas, semicolons, newlines, '+' and '&' always separate items;
+        'and' and 'with' only separate indexed foods.
+        """
+        items = []
+        for piece in ITEM_SEPARATORS.split(text):
+            if piece.strip():
+                items.extend(self._split_joined(piece.strip()))
+        return items
+
+    def _split_joined(self, piece):
+        """Split piece at joining words into the fewest indexed foods, or keep it whole."""
+        joins = list(JOINING_WORDS.finditer(piece))
+        if not joins:
+            return [piece]
+        starts = [0] + [join.end() for join in joins]
+        ends = [join.start() for join in joins] + [len(piece)]
+        if len(joins) > MAX_JOINED:
+            return [piece[start:end] for start, end in zip(starts, ends) if piece[start:end].strip()]
+
+        mapped, count = self._mapping()
+
+        def known(i, j):
+            name = parse_item(piece[starts[i]:ends[j - 1]])[0]
+            if j - i == 1:
+                return self._find(name) is not None
+            # A phrase spanning a joining word must be indexed as such, not
+            # just end in a known food ("toast and coffee" -> "coffee")
+            return bool(count and name) and self._exact(mapped, count, name) is not None
+
+        # fewest[i]: the shortest split of the parts from i on into known foods
+        parts = len(starts)
+        fewest = {parts: []}
+        for i in reversed(range(parts)):
+            for j in range(parts, i, -1):
+                if j in fewest and (i not in fewest or len(fewest[j]) + 1 < len(fewest[i])) and known(i, j):
+                    fewest[i] = [piece[starts[i]:ends[j - 1]]] + fewest[j]
+        return fewest.get(0, [piece])
+
+    def estimate(self, items):
+        """
+        Estimate a meal from its food items (model output or typed text).
+
+        Returns per-item matches, unmatched items, and the totals in the
+        analysis format (macros as % of calories) plus macro grams.
+        complete is True when every item was found.
+        """
+        matched, unmatched = [], []
+        totals = {'calories': 0.0, 'protein': 0.0, 'fat': 0.0, 'carbs': 0.0}
+        for item in items:
+            name, quantity = parse_item(item)
+            entry = self.lookup(name)
+            if entry is None:
+                unmatched.append(item)
+                continue
+            for key in totals:
+                totals[key] += getattr(entry, key) * quantity
+            matched.append({
+                'item': item,
+                'food': entry.name,
+                'quantity': quantity,
+                'calories': round(entry.calories * quantity),
+                'match': entry.match,
+                'meals_seen': entry.meals,
+            })
+        return _estimate_result(matched, unmatched, totals)
+
+    # Learning
+
+    def _stats_connection(self):
+        # Called with the stats lock held
+        if self._conn is None:
+            directory = os.path.dirname(self.stats_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.stats_path, timeout=30, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            with conn:
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS food_stats (
+                        name TEXT PRIMARY KEY,
+                        meals INTEGER NOT NULL,
+                        servings REAL NOT NULL,
+                        calories REAL NOT NULL,
+                        protein_g REAL NOT NULL,
+                        fat_g REAL NOT NULL,
+                        carbs_g REAL NOT NULL
+                    ) WITHOUT ROWID
+                    """
+                )
+            self._conn = conn
+        return self._conn
+
+    def _shares(self, record):
+        """Each item's (name, servings, calories, grams) share of one meal."""
+        items = [parse_item(item) for item in record.food_items]
+        items = [(name, quantity) for name, quantity in items if name]
+        if not items or record.total_calories <= 0:
+            return []
+        weights = []
+        for name, quantity in items:
+            entry = self._find(name)
+            weights.append(entry.calories * quantity if entry is not None and entry.match == 'exact' else None)
+        known = [weight for weight in weights if weight]
+        fallback = sum(known) / len(known) if known else 1.0
+        weights = [weight or fallback for weight in weights]
+        total_weight = sum(weights)
+        grams = macro_grams(record)
+        return [
+            (name, quantity, record.total_calories * weight / total_weight,
+             {macro: value * weight / total_weight for macro, value in grams.items()})
+            for (name, quantity), weight in zip(items, weights)
+        ]
+
+    def record(self, results):
+        """Learn from analysis results (dicts in the model's format)."""
+        rows = []
+        for result in results:
+            # A food listed twice in one meal still counts as one meal
+            foods = {}
+            for name, servings, calories, grams in self._shares(MealRecord.from_dict(result)):
+                sums = foods.setdefault(name, [0.0] * 5)
+                for i, value in enumerate((servings, calories, grams['protein'], grams['fat'], grams['carbs'])):
+                    sums[i] += value
+            rows.extend((name, *sums) for name, sums in foods.items())
+        if not rows:
+            return
+        with self._stats_lock:
+            conn = self._stats_connection()
+            with conn:
+                conn.executemany(
+                    """
+                    INSERT INTO food_stats (name, meals, servings, calories, protein_g, fat_g, carbs_g)
+                    VALUES (?, 1, ?, ?, ?, ?, ?)
+                    ON CONFLICT (name) DO UPDATE SET
+                        meals = meals + 1,
+                        servings = servings + excluded.servings,
+                        calories = calories + excluded.calories,
+                        protein_g = protein_g + excluded.protein_g,
+                        fat_g = fat_g + excluded.fat_g,
+                        carbs_g = carbs_g + excluded.carbs_g
+                    """,
+                    rows,
+                )
+            self.recorded += len(results)
+            self._pending += len(results)
+            rebuild = self._pending >= self.rebuild_every
+            if rebuild:
+                self._pending = 0
+        if rebuild:
+            threading.Thread(target=self.rebuild, daemon=True, name='food-index-rebuild').start()
+
+    def rebuild(self):
+        """Compile the per-item sums into a new index file."""
+        with self._stats_lock:
+            rows = self._stats_connection().execute(
+                "SELECT name, calories / servings, protein_g / servings, fat_g / servings, "
+                "carbs_g / servings, meals FROM food_stats WHERE meals >= ? AND servings > 0",
+                (self.min_meals,),
+            ).fetchall()
+        write_index(self.index_path, rows)
+        self.rebuilds += 1
+        # Pick the new file up on the next lookup
+        self._checked = 0.0
+
+    def import_meal_log(self, path, chunk_size=10000):
+        """Learn from every meal in a MealLog database; returns the number read."""
+        conn = sqlite3.connect(path)
+        count = 0
+        try:
+            cursor = conn.execute("SELECT record FROM meals ORDER BY id")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                if not rows:
+                    break
+                self.record([MealRecord.unpack(row[0]).to_dict() for row in rows])
+                count += len(rows)
+        finally:
+            conn.close()
+        return count
+
+    def close(self):
+        with self._stats_lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+    def stats(self):
+        return {
+            'foods': len(self),
+            'lookups': self.lookups,
+            'hits': self.hits,
+            'recorded': self.recorded,
+            'rebuilds': self.rebuilds,
+        }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--index', default=os.path.join('instance', 'food_index.bin'))
+    parser.add_argument('--stats', default=None, help="SQLite sums (default: next to the index)")
+    parser.add_argument('--meal-log', help="learn from every meal in this meal log first")
+    parser.add_argument('--min-meals', type=int, default=2)
+    parser.add_argument('--lookup', nargs='*', default=[], help="items to estimate afterwards")
+    args = parser.parse_args()
+
+    index = FoodIndex(args.index, args.stats or f"{os.path.splitext(args.index)[0]}.sqlite3",
+                      min_meals=args.min_meals, rebuild_every=float('inf'), reload_interval=0)
+    if args.meal_log:
+        print(f"learned from {index.import_meal_log(args.meal_log)} meals")
+    index.rebuild()
+    print(f"{args.index}: {len(index)} foods")
+    if args.lookup:
+        print(index.estimate(args.lookup))
+
+
+if __name__ == '__main__':
+    main()
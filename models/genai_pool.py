@@ -0,0 +1,170 @@
+import contextvars
+import json
+import os
+import threading
+from contextlib import contextmanager
+from functools import lru_cache
+
+# Read timeout for calls made in the current context, when shorter than the
+# pool's (e.g. the time a background job has left before its deadline)
+_read_timeout = contextvars.ContextVar('read_timeout', default=None)
+
+
+@contextmanager
+def read_timeout(seconds):
+    """Cap the read timeout of pooled calls made inside the block at seconds."""
+    token = _read_timeout.set(seconds)
+    try:
+        yield
+    finally:
+        _read_timeout.reset(token)
+
+
+@lru_cache(maxsize=None)
+def _pooled_client_class():
+    """
+    Define the pooled client classes on first use.
+
+    They subclass SDK classes, and importing the genai SDK (and requests)
+    takes a large share of app start-up, so it waits until the first
+    model call instead of happening at import time.
+    """
+    from google import genai
+    from google.genai import errors
+    from google.genai._api_client import ApiClient, HttpResponse, RequestJsonEncoder
+
+    class _PooledApiClient(ApiClient):
+        """
+        SDK transport that sends every call through one shared requests.Session.
+
+        The stock client opens a fresh session (and TCP/TLS connection) per
+        call; reusing the session keeps connections alive between analyses and
+        lets each call carry a timeout.
+        """
+
+        def __init__(self, session, timeout, **kwargs):
+            super().__init__(**kwargs)
+            self._session = session
+            self._timeout = timeout
+
+        def _request_unauthorized(self, http_request, stream=False):
+            data = None
+            if http_request.data:
+                if not isinstance(http_request.data, bytes):
+                    data = json.dumps(http_request.data, cls=RequestJsonEncoder)
+                else:
+                    data = http_request.data
+
+            connect_timeout, timeout = self._timeout
+            if _read_timeout.get() is not None:
+                timeout = min(timeout, _read_timeout.get())
+            response = self._session.request(
+                method=http_request.method,
+                url=http_request.url,
+                headers=http_request.headers,
+                data=data,
+                stream=stream,
+                timeout=(connect_timeout, timeout),
+            )
+            errors.APIError.raise_for_response(response)
+            return HttpResponse(
+                response.headers, response if stream else [response.text]
+            )
+
+    class _PooledClient(genai.Client):
+        """genai.Client whose API client uses a shared connection pool."""
+
+        def __init__(self, *, session, timeout, **kwargs):
+            self._session = session
+            self._timeout = timeout
+            super().__init__(**kwargs)
+
+        def _get_api_client(self, vertexai=None, api_key=None, credentials=None,
+                            project=None, location=None, debug_config=None,
+                            http_options=None):
+            return _PooledApiClient(
+                self._session,
+                self._timeout,
+                vertexai=vertexai,
+                api_key=api_key,
+                credentials=credentials,
+                project=project,
+                location=location,
+                http_options=http_options,
+            )
+
+    return _PooledClient
+
+
+class GenaiClientPool:
+    """
+    Process-wide, thread-safe Gemini client backed by a keep-alive HTTP pool.
+
+    The client is created on first use so the app can start without an API
+    key; every request afterwards shares it and its pooled connections.
+    """
+
+    def __init__(self, api_key=None, pool_size=16, timeout=60.0,
+                 connect_timeout=10.0, base_url=None):
+        self.api_key = api_key
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, timeout)
+        self.base_url = base_url
+        self._client = None
+        self._session = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the pool from the Flask app configuration."""
+        return cls(
+            api_key=config.get('GOOGLE_API_KEY'),
+            pool_size=config.get('GEMINI_POOL_SIZE', 16),
+            timeout=config.get('GEMINI_TIMEOUT', 60.0),
+            connect_timeout=config.get('GEMINI_CONNECT_TIMEOUT', 10.0),
+            base_url=config.get('GEMINI_BASE_URL'),
+        )
+
+    def _new_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    @property
+    def client(self):
+        """Return the shared client, creating it on first use."""
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    api_key = self.api_key or os.getenv("GOOGLE_API_KEY")
+                    if not api_key:
+                        raise ValueError("GOOGLE_API_KEY not found in environment variables")
+                    http_options = {'base_url': self.base_url} if self.base_url else None
+                    self._session = self._new_session()
+                    self._client = _pooled_client_class()(
+                        session=self._session,
+                        timeout=self.timeout,
+                        api_key=api_key,
+                        http_options=http_options,
+                    )
+        return self._client
+
+    def warm_up(self):
+        """Load the SDK and create the client if there's a key (no network calls)."""
+        _pooled_client_class()
+        from google.genai import types  # noqa: F401
+        if self.api_key or os.getenv("GOOGLE_API_KEY"):
+            self.client
+
+    def close(self):
+        """Drop the client and close its pooled connections."""
+        with self._lock:
+            if self._session is not None:
+                self._session.close()
+            self._client = None
+            self._session = None
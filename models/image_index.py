@@ -0,0 +1,232 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+HASH_BITS = 64
+
+# PIL.Image.BILINEAR; hashing only ever receives images PIL has already
+# opened, so the module doesn't need to import PIL itself
+BILINEAR = 2
+
+
+def average_hash(image, hash_size=8):
+    """aHash: one bit per pixel of a tiny grayscale copy, set if above the mean."""
+    small = image.convert('L').resize((hash_size, hash_size), BILINEAR)
+    pixels = list(small.getdata())
+    mean = sum(pixels) / len(pixels)
+    value = 0
+    for pixel in pixels:
+        value = (value << 1) | (pixel > mean)
+    return value
+
+
+def difference_hash(image, hash_size=8):
+    """dHash: one bit per horizontal gradient of a tiny grayscale copy."""
+    small = image.convert('L').resize((hash_size + 1, hash_size), BILINEAR)
+    pixels = list(small.getdata())
+    value = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] < pixels[offset + col + 1])
+    return value
+
+
+HASH_FUNCTIONS = {
+    'ahash': average_hash,
+    'dhash': difference_hash,
+}
+
+
+class PerceptualIndex:
+    """
+    Near-duplicate lookup over 64-bit perceptual image hashes.
+
+    Uses multi-index hashing: each hash is split into max_distance + 1
+    disjoint bit blocks, and every block gets its own exact-match table. By
+    the pigeonhole principle, any stored hash within max_distance bits of the
+    query shares at least one block with it exactly, so a lookup only has to
+    compare the handful of candidates in the matching buckets instead of
+    walking every entry.
+
+    Entries live in a namespace (e.g. the goal/diet the analysis was made
+    for) so a match never crosses prompt inputs. Like the analysis cache
+    they serve, entries expire after ttl seconds and the oldest are evicted
+    beyond max_entries. When a path is given, entries are also kept in a
+    SQLite file, pruned the same way, and reloaded on startup.
+    """
+
+    def __init__(self, max_distance=4, hash_func='dhash', path=None,
+                 max_entries=10000, ttl=None):
+        if not 0 <= max_distance < HASH_BITS:
+            raise ValueError(f"max_distance must be between 0 and {HASH_BITS - 1}")
+        self.max_distance = max_distance
+        self.hash_image = HASH_FUNCTIONS[hash_func]
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+
+        # Split the 64 bits into max_distance + 1 near-equal (shift, mask) blocks
+        num_blocks = max_distance + 1
+        self._blocks = []
+        start = 0
+        for i in range(num_blocks):
+            width = HASH_BITS // num_blocks + (1 if i < HASH_BITS % num_blocks else 0)
+            self._blocks.append((start, (1 << width) - 1))
+            start += width
+
+        # (hash, namespace) -> (value, added_at), oldest first
+        self._entries = OrderedDict()
+        self._tables = [{} for _ in self._blocks]
+        self._lock = threading.Lock()
+        self._conn = None
+        self.evicted = 0
+
+        if path:
+            self._load()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the index from the Flask app configuration, or None if disabled."""
+        max_distance = config.get('NEAR_DUPLICATE_MAX_DISTANCE', 4)
+        if max_distance is None or max_distance < 0:
+            return None
+        return cls(
+            max_distance=max_distance,
+            hash_func=config.get('NEAR_DUPLICATE_HASH', 'dhash'),
+            path=config.get('NEAR_DUPLICATE_INDEX_PATH'),
+            max_entries=config.get('NEAR_DUPLICATE_MAX_ENTRIES', 10000),
+            ttl=config.get('ANALYSIS_CACHE_TTL'),
+        )
+
+    def _load(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        with self._conn:
+            self._conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS image_hashes (
+                    hash INTEGER NOT NULL,
+                    namespace TEXT NOT NULL,
+                    value BLOB NOT NULL,
+                    added_at REAL,
+                    PRIMARY KEY (hash, namespace)
+                )
+                """
+            )
+            # Indexes saved before entries expired lack the column; their
+            # entries start their ttl now
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(image_hashes)")}
+            if 'added_at' not in columns:
+                self._conn.execute("ALTER TABLE image_hashes ADD COLUMN added_at REAL")
+            self._conn.execute("UPDATE image_hashes SET added_at = ? WHERE added_at IS NULL", (time.time(),))
+        rows = self._conn.execute("SELECT hash, namespace, value, added_at FROM image_hashes ORDER BY added_at")
+        for stored_hash, namespace, value, added_at in rows:
+            # SQLite integers are signed; stored hashes are shifted into range
+            self._insert(stored_hash + (1 << (HASH_BITS - 1)), namespace, pickle.loads(value), added_at)
+        with self._conn:
+            self._delete(self._evict(time.time()))
+
+    def _block_keys(self, image_hash, namespace):
+        return [
+            (namespace, (image_hash >> shift) & mask)
+            for shift, mask in self._blocks
+        ]
+
+    def _insert(self, image_hash, namespace, value, added_at):
+        key = (image_hash, namespace)
+        if key in self._entries:
+            # A re-analysis refreshes the entry's age
+            self._entries.move_to_end(key)
+        else:
+            for table, block_key in zip(self._tables, self._block_keys(image_hash, namespace)):
+                table.setdefault(block_key, set()).add(image_hash)
+        self._entries[key] = (value, added_at)
+
+    def _evict(self, now):
+        """Drop expired entries and the oldest beyond max_entries; return their keys."""
+        evicted = []
+        while self._entries:
+            key, (_, added_at) = next(iter(self._entries.items()))
+            expired = self.ttl is not None and now - added_at >= self.ttl
+            if not expired and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[key]
+            image_hash, namespace = key
+            for table, block_key in zip(self._tables, self._block_keys(image_hash, namespace)):
+                bucket = table[block_key]
+                bucket.discard(image_hash)
+                if not bucket:
+                    del table[block_key]
+            evicted.append(key)
+        self.evicted += len(evicted)
+        return evicted
+
+    def _delete(self, keys):
+        if keys and self._conn is not None:
+            self._conn.executemany(
+                "DELETE FROM image_hashes WHERE hash = ? AND namespace = ?",
+                [(image_hash - (1 << (HASH_BITS - 1)), namespace) for image_hash, namespace in keys],
+            )
+
+    def add(self, image_hash, namespace, value):
+        """Store a value under an image hash, replacing any exact duplicate."""
+        now = time.time()
+        with self._lock:
+            self._insert(image_hash, namespace, value, now)
+            evicted = self._evict(now)
+            if self._conn is not None:
+                with self._conn:
+                    self._conn.execute(
+                        "INSERT OR REPLACE INTO image_hashes (hash, namespace, value, added_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        (
+                            image_hash - (1 << (HASH_BITS - 1)),
+                            namespace,
+                            pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                            now,
+                        ),
+                    )
+                    self._delete(evicted)
+
+    def lookup(self, image_hash, namespace):
+        """
+        Return (value, distance) for the closest stored hash within
+        max_distance bits, or None if there is no near duplicate.
+        """
+        best_value = None
+        best_distance = self.max_distance + 1
+        seen = set()
+        now = time.time()
+        with self._lock:
+            for table, key in zip(self._tables, self._block_keys(image_hash, namespace)):
+                for candidate in table.get(key, ()):
+                    if candidate in seen:
+                        continue
+                    seen.add(candidate)
+                    distance = (candidate ^ image_hash).bit_count()
+                    if distance >= best_distance:
+                        continue
+                    value, added_at = self._entries[(candidate, namespace)]
+                    # Expired entries are only removed by the next add()
+                    if self.ttl is not None and now - added_at >= self.ttl:
+                        continue
+                    if distance == 0:
+                        return value, 0
+                    best_value, best_distance = value, distance
+
+        if best_value is None:
+            return None
+        return best_value, best_distance
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'evicted': self.evicted}
+
+    def __len__(self):
+        return len(self._entries)
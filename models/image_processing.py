@@ -0,0 +1,130 @@
+import io
+import time
+
+# PIL is imported where it's used, so the app starts without loading it
+
+# Longest edge of the image sent to the model
+MAX_IMAGE_SIZE = 1024
+
+# Formats the model accepts as-is, keyed by PIL format name
+PASSTHROUGH_FORMATS = {
+    'JPEG': 'image/jpeg',
+    'PNG': 'image/png',
+}
+
+EXIF_ORIENTATION = 0x0112
+
+
+class PreparedImage:
+    """
+    An upload ready for analysis: the encoded bytes sent to the model plus a
+    lazily decoded PIL view for callers that need pixels.
+
+    timings holds the seconds spent in each preparation stage (decode,
+    thumbnail, encode); it travels back from preprocessing workers with
+    the bytes so the request thread can record it.
+    """
+
+    def __init__(self, data, mime_type, image=None, passthrough=False, timings=None):
+        self.data = data
+        self.mime_type = mime_type
+        self.passthrough = passthrough
+        self.timings = timings or {}
+        self._image = image
+
+    def __getstate__(self):
+        # Ship only the encoded bytes between processes
+        state = self.__dict__.copy()
+        state['_image'] = None
+        return state
+
+    def resized(self, max_size):
+        """This image shrunk to fit max_size and re-encoded as JPEG; self if it already fits."""
+        if max(self.size) <= max_size:
+            return self
+        resized = prepare_image(self.data, max_size)
+        # Only the bytes are sent; don't keep the pixels alive with them
+        resized._image = None
+        return resized
+
+    @property
+    def image(self):
+        """The decoded image, decoded on first access."""
+        if self._image is None:
+            from PIL import Image
+            self._image = Image.open(io.BytesIO(self.data))
+            self._image.load()
+        return self._image
+
+    @property
+    def size(self):
+        if self._image is not None:
+            return self._image.size
+        from PIL import Image
+        return Image.open(io.BytesIO(self.data)).size
+
+    def preview(self, size=64):
+        """
+        A small grayscale view for perceptual hashing.
+
+        JPEGs are decoded with DCT scaling at up to 1/8 resolution, which is
+        far cheaper than decoding the full image.
+        """
+        from PIL import Image
+        preview = Image.open(io.BytesIO(self.data))
+        preview.draft('L', (size, size))
+        return preview
+
+
+def process_image(image, max_size=MAX_IMAGE_SIZE, timings=None):
+    """
+    Shrink a freshly opened (not yet decoded) image to fit max_size.
+
+    draft() lets the JPEG decoder scale by 1/2, 1/4 or 1/8 while decoding,
+    so large phone photos never materialize at full resolution. EXIF
+    orientation is applied once here, so the model sees the photo upright.
+    Seconds spent decoding and resizing are added to timings when given.
+    """
+    start = time.perf_counter()
+    width, height = image.size
+    scale = min(max_size / width, max_size / height, 1.0)
+    image.draft('RGB', (max(1, int(width * scale)), max(1, int(height * scale))))
+    image.load()
+    decoded = time.perf_counter()
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        from PIL import ImageOps
+        image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_size, max_size))
+    if timings is not None:
+        timings['decode'] = timings.get('decode', 0.0) + decoded - start
+        timings['thumbnail'] = time.perf_counter() - decoded
+    return image
+
+
+def prepare_image(data, max_size=MAX_IMAGE_SIZE):
+    """
+    Turn uploaded image bytes into a PreparedImage.
+
+    Uploads that are already small enough, upright, and in a format the
+    model accepts are passed through untouched with no decode or re-encode.
+    Everything else is decoded at reduced size and re-encoded once as JPEG.
+    """
+    from PIL import Image
+
+    start = time.perf_counter()
+    image = Image.open(io.BytesIO(data))
+    orientation = image.getexif().get(EXIF_ORIENTATION, 1)
+    mime_type = PASSTHROUGH_FORMATS.get(image.format)
+    # Passed-through uploads only ever have their header parsed
+    timings = {'decode': time.perf_counter() - start}
+    if mime_type and orientation == 1 and max(image.size) <= max_size:
+        return PreparedImage(data, mime_type, passthrough=True, timings=timings)
+
+    image = process_image(image, max_size, timings)
+    start = time.perf_counter()
+    if image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffered = io.BytesIO()
+    image.save(buffered, format='JPEG')
+    timings['encode'] = time.perf_counter() - start
+    return PreparedImage(buffered.getvalue(), 'image/jpeg', image=image, timings=timings)
@@ -0,0 +1,39 @@
+import hashlib
+
+from models.cache_backends import MemoryBackend, SQLiteBackend
+
+
+class ImageStore:
+    """
+    Content-addressed store for processed meal images.
+
+    Images are saved once under the SHA-256 of their encoded bytes, so the
+    digest doubles as a strong, immutable ETag for the /images/<digest>
+    route.
+    """
+
+    def __init__(self, backend=None):
+        # Backends are sized, so an empty one is falsy
+        self.backend = MemoryBackend(max_entries=256, ttl=3600) if backend is None else backend
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the store from the Flask app configuration."""
+        max_entries = config.get('IMAGE_STORE_MAX_ENTRIES', 256)
+        ttl = config.get('IMAGE_STORE_TTL', 3600)
+        if config.get('IMAGE_STORE_PATH'):
+            backend = SQLiteBackend(config['IMAGE_STORE_PATH'], max_entries=max_entries, ttl=ttl)
+        else:
+            backend = MemoryBackend(max_entries=max_entries, ttl=ttl)
+        return cls(backend)
+
+    def put(self, data, mime_type='image/jpeg'):
+        """Store encoded image bytes and return their digest."""
+        digest = hashlib.sha256(data).hexdigest()
+        if self.backend.get(digest) is None:
+            self.backend.set(digest, (bytes(data), mime_type))
+        return digest
+
+    def get(self, digest):
+        """Return (data, mime_type) for a digest, or None if unknown or expired."""
+        return self.backend.get(digest)
@@ -0,0 +1,275 @@
+import heapq
+import itertools
+import re
+import secrets
+import threading
+import time
+
+# Job states; the last four are final
+QUEUED = 'queued'
+RUNNING = 'running'
+RETRYING = 'retrying'
+DONE = 'done'
+FAILED = 'failed'
+CANCELLED = 'cancelled'
+EXPIRED = 'expired'
+FINAL_STATES = {DONE, FAILED, CANCELLED, EXPIRED}
+
+
+class JobQueueFull(Exception):
+    """Raised when the job queue already holds max_pending unfinished jobs."""
+
+
+class Job:
+    """One queued call and its outcome."""
+
+    def __init__(self, fn, owner, deadline):
+        self.id = secrets.token_urlsafe(16)
+        self.fn = fn
+        self.owner = owner
+        self.created = time.monotonic()
+        self.deadline = deadline
+        self.status = QUEUED
+        self.attempts = 0
+        self.result = None
+        self.error = None
+        self.finished = None
+        self.cancel_requested = False
+        self.retry_at = None
+
+    def as_dict(self):
+        """Status fields for the /jobs API (result and error are added by the caller)."""
+        data = {'job_id': self.id, 'status': self.status, 'attempts': self.attempts}
+        if self.status == RUNNING and self.cancel_requested:
+            data['cancel_requested'] = True
+        if self.status == RETRYING:
+            data['retry_in'] = round(max(0.0, self.retry_at - time.monotonic()), 1)
+        return data
+
+
+def _retry_hint(error):
+    """The server's suggested retry delay in a rate-limit error, if any."""
+    match = re.search(r"retry in ([0-9\.]+)s", str(error))
+    return float(match.group(1)) if match else None
+
+
+class JobQueue:
+    """
+    In-process queue running analyses on a fixed pool of worker threads.
+
+    Requests hand over a ready-to-run callable and get a job id back at
+    once, so an HTTP thread is never held for a model call. Workers run
+    jobs oldest first, calling fn(job). A job that fails with
+    RATE_LIMIT_EXCEEDED is rescheduled with exponential backoff (or the
+    server's retry hint) as long as it can still start before its
+    deadline. A job that hasn't started by its deadline, or fails once
+    it has passed, expires; fn should stop by job.deadline (a
+    time.monotonic() value). Other failures are final. Cancelling a queued job drops it; cancelling a
+    running one sets job.cancel_requested, which fn should check between
+    steps to stop early, and discards whatever it returns.
+
+    Finished jobs are kept for result_ttl seconds for clients to collect;
+    wait() lets them long-poll instead of polling in a loop.
+    """
+
+    def __init__(self, workers=4, max_pending=64, deadline=120.0, max_retries=3,
+                 retry_base_delay=2.0, result_ttl=600.0):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.deadline = deadline
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self.result_ttl = result_ttl
+        self._jobs = {}
+        self._ready = []  # heap of (not_before, sequence, job)
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._changed = threading.Condition(self._lock)
+        self._threads = []
+        self._closed = False
+
+        # Metrics
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+        self.cancelled = 0
+        self.expired = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the queue from the Flask app configuration, or None if disabled."""
+        workers = config.get('JOB_QUEUE_WORKERS', 0)
+        if workers <= 0:
+            return None
+        return cls(
+            workers=workers,
+            max_pending=config.get('JOB_QUEUE_MAX_PENDING', 16 * workers),
+            deadline=config.get('JOB_DEADLINE', 120.0),
+            max_retries=config.get('JOB_MAX_RETRIES', 3),
+            retry_base_delay=config.get('JOB_RETRY_BASE_DELAY', 2.0),
+            result_ttl=config.get('JOB_RESULT_TTL', 600.0),
+        )
+
+    def _start_workers(self):
+        # Started on first use so app start-up doesn't spawn threads
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._work, daemon=True,
+                                      name=f"job-worker-{len(self._threads)}")
+            thread.start()
+            self._threads.append(thread)
+
+    def _unfinished(self):
+        return sum(1 for job in self._jobs.values() if job.status not in FINAL_STATES)
+
+    def _prune(self, now):
+        expired = [job_id for job_id, job in self._jobs.items()
+                   if job.finished is not None and now - job.finished > self.result_ttl]
+        for job_id in expired:
+            del self._jobs[job_id]
+
+    def submit(self, fn, owner, deadline=None):
+        """Queue fn(job) to run on a worker and return its Job; only owner can look it up."""
+        now = time.monotonic()
+        with self._lock:
+            self._prune(now)
+            if self._unfinished() >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull("Job queue is full")
+            job = Job(fn, owner, now + (deadline or self.deadline))
+            self._jobs[job.id] = job
+            heapq.heappush(self._ready, (now, next(self._sequence), job))
+            self.submitted += 1
+            self._start_workers()
+            self._wakeup.notify()
+        return job
+
+    def get(self, job_id, owner):
+        """Return the job if it exists and belongs to owner, else None."""
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None or owner is None or job.owner != owner:
+            return None
+        return job
+
+    def wait(self, job, timeout):
+        """Block until the job is finished or timeout seconds pass; return the job."""
+        end = time.monotonic() + timeout
+        with self._lock:
+            while job.status not in FINAL_STATES:
+                remaining = end - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._changed.wait(remaining)
+        return job
+
+    def cancel(self, job):
+        """Cancel a job; returns False if it had already finished."""
+        with self._lock:
+            if job.status in FINAL_STATES:
+                return False
+            job.cancel_requested = True
+            if job.status != RUNNING:
+                # Still in the heap; the worker that pops it skips it
+                self._finish(job, CANCELLED)
+            return True
+
+    def _finish(self, job, status, result=None, error=None):
+        # Called with the lock held
+        job.status = status
+        job.result = result
+        job.error = error
+        job.fn = None
+        job.finished = time.monotonic()
+        if status == DONE:
+            self.completed += 1
+        elif status == FAILED:
+            self.failed += 1
+        elif status == CANCELLED:
+            self.cancelled += 1
+        elif status == EXPIRED:
+            self.expired += 1
+        self._changed.notify_all()
+
+    def _next_job(self):
+        """Wait for the next job whose time has come; None once closed."""
+        with self._lock:
+            while True:
+                if self._closed:
+                    return None
+                now = time.monotonic()
+                if self._ready and self._ready[0][0] <= now:
+                    _, _, job = heapq.heappop(self._ready)
+                    if job.status in FINAL_STATES:
+                        continue
+                    if now > job.deadline:
+                        self._finish(job, EXPIRED)
+                        continue
+                    job.status = RUNNING
+                    job.attempts += 1
+                    self._changed.notify_all()
+                    return job
+                timeout = self._ready[0][0] - now if self._ready else None
+                self._wakeup.wait(timeout)
+
+    def _work(self):
+        while True:
+            job = self._next_job()
+            if job is None:
+                return
+            try:
+                result, error = job.fn(job), None
+            except Exception as e:
+                result, error = None, e
+            with self._lock:
+                self._settle(job, result, error)
+
+    def _settle(self, job, result, error):
+        # Called with the lock held
+        if job.cancel_requested:
+            self._finish(job, CANCELLED)
+            return
+        if error is None:
+            self._finish(job, DONE, result=result)
+            return
+        if time.monotonic() > job.deadline:
+            self._finish(job, EXPIRED, error=error)
+            return
+        if "RATE_LIMIT_EXCEEDED" in str(error) and job.attempts <= self.max_retries:
+            backoff = self.retry_base_delay * 2 ** (job.attempts - 1)
+            retry_at = time.monotonic() + max(backoff, _retry_hint(error) or 0.0)
+            if retry_at <= job.deadline:
+                job.status = RETRYING
+                job.retry_at = retry_at
+                job.error = error
+                heapq.heappush(self._ready, (retry_at, next(self._sequence), job))
+                self.retried += 1
+                self._wakeup.notify()
+                self._changed.notify_all()
+                return
+        self._finish(job, FAILED, error=error)
+
+    def close(self):
+        """Stop the workers once their current jobs finish."""
+        with self._lock:
+            self._closed = True
+            self._wakeup.notify_all()
+
+    def stats(self):
+        with self._lock:
+            by_status = dict.fromkeys([QUEUED, RUNNING, RETRYING, *sorted(FINAL_STATES)], 0)
+            for job in self._jobs.values():
+                by_status[job.status] += 1
+            return {
+                'workers': len(self._threads),
+                'jobs': by_status,
+                'submitted': self.submitted,
+                'completed': self.completed,
+                'failed': self.failed,
+                'retried': self.retried,
+                'cancelled': self.cancelled,
+                'expired': self.expired,
+                'rejected': self.rejected,
+            }
@@ -0,0 +1,83 @@
+import json
+
+
+class IncrementalJSONObjectParser:
+    """
+    Parse a JSON object as it streams in, one top-level field at a time.
+
+    feed() takes the next chunk of model output and returns the (key, value)
+    pairs whose values became complete with it, so callers can act on
+    "food_items" long before "suggestion" has been generated. Values are
+    only emitted once they are unambiguous: a number or literal at the very
+    end of the buffer is held back until the next delimiter arrives.
+    """
+
+    def __init__(self):
+        self._decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._state = 'start'
+        self._key = None
+
+    @property
+    def done(self):
+        """True once the closing brace of the object has been seen."""
+        return self._state == 'done'
+
+    def _skip_whitespace(self):
+        while self._pos < len(self._buffer) and self._buffer[self._pos] in ' \t\r\n':
+            self._pos += 1
+
+    def feed(self, text):
+        self._buffer += text
+        fields = []
+        while self._state != 'done':
+            self._skip_whitespace()
+            if self._pos >= len(self._buffer):
+                break
+
+            if self._state == 'start':
+                # Tolerate anything (e.g. a code fence) before the object
+                start = self._buffer.find('{', self._pos)
+                if start == -1:
+                    self._pos = len(self._buffer)
+                    break
+                self._pos = start + 1
+                self._state = 'key'
+
+            elif self._state == 'key':
+                char = self._buffer[self._pos]
+                if char == '}':
+                    self._pos += 1
+                    self._state = 'done'
+                    break
+                if char == ',':
+                    self._pos += 1
+                    continue
+                try:
+                    key, end = self._decoder.raw_decode(self._buffer, self._pos)
+                except json.JSONDecodeError:
+                    break
+                colon = end
+                while colon < len(self._buffer) and self._buffer[colon] in ' \t\r\n':
+                    colon += 1
+                if colon >= len(self._buffer):
+                    break
+                if self._buffer[colon] != ':':
+                    raise ValueError(f"Expected ':' after key {key!r}")
+                self._key = key
+                self._pos = colon + 1
+                self._state = 'value'
+
+            else:  # value
+                try:
+                    value, end = self._decoder.raw_decode(self._buffer, self._pos)
+                except json.JSONDecodeError:
+                    break
+                # "12" may still become "125"; wait for the delimiter
+                if end >= len(self._buffer) and not isinstance(value, (str, list, dict)):
+                    break
+                fields.append((self._key, value))
+                self._pos = end
+                self._state = 'key'
+        return fields
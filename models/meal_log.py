@@ -0,0 +1,322 @@
+import hashlib
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+
+from models.user_profile import MealRecord
+
+# Energy per gram, used to turn the model's macro percentages into grams
+KCAL_PER_GRAM = {'protein': 4, 'carbs': 4, 'fat': 9}
+
+_TOTAL_COLUMNS = ('meals', 'calories', 'protein_g', 'carbs_g', 'fat_g')
+
+
+def macro_grams(record):
+    """Grams of each macro in a MealRecord, from its calories and percentage split."""
+    shares = {'protein': record.protein_pct, 'carbs': record.carbs_pct, 'fat': record.fat_pct}
+    return {
+        name: round(record.total_calories * shares[name] / 100 / kcal_per_gram, 1)
+        for name, kcal_per_gram in KCAL_PER_GRAM.items()
+    }
+
+
+def week_start(day):
+    """The Monday of the ISO week containing day."""
+    return day - timedelta(days=day.weekday())
+
+
+class MealLog:
+    """
+    Per-user history of analyzed meals, stored in SQLite.
+
+    Every meal is a row in `meals`, indexed on (user_id, day), holding the
+    analysis as a packed MealRecord. Alongside it,
+    `daily_totals` and `weekly_totals` hold running sums of calories and
+    macros that are updated in the same transaction as the insert, so
+    summaries read one precomputed row per day or week instead of scanning
+    the user's history. Connections are opened once and handed out from a
+    small pool; the database runs in WAL mode so readers never block the
+    writer.
+    """
+
+    def __init__(self, path, pool_size=4, dedupe_window=600):
+        self.path = path
+        self.pool_size = pool_size
+        self.dedupe_window = dedupe_window
+        self._pool = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._opened = 0
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self._connection() as conn:
+            self._create_schema(conn)
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the log from the Flask app configuration, or None if disabled."""
+        path = config.get('MEAL_LOG_PATH')
+        if not path:
+            return None
+        return cls(path, pool_size=config.get('MEAL_LOG_POOL_SIZE', 4),
+                   dedupe_window=config.get('MEAL_LOG_DEDUPE_WINDOW', 600))
+
+    def _create_schema(self, conn):
+        with conn:
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS meals (
+                    id INTEGER PRIMARY KEY,
+                    user_id TEXT NOT NULL,
+                    day TEXT NOT NULL,
+                    logged_at REAL NOT NULL,
+                    calories INTEGER NOT NULL,
+                    protein_g REAL NOT NULL,
+                    carbs_g REAL NOT NULL,
+                    fat_g REAL NOT NULL,
+                    health_score INTEGER,
+                    record BLOB NOT NULL,
+                    digest BLOB
+                )
+                """
+            )
+            # Logs created before meals were de-duplicated lack the column
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(meals)")}
+            if 'digest' not in columns:
+                conn.execute("ALTER TABLE meals ADD COLUMN digest BLOB")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_meals_user_day "
+                "ON meals (user_id, day, logged_at)"
+            )
+            # Finds a user's recent identical analyses; imported meals have
+            # no digest and are never treated as duplicates. Logs created
+            # before the dedupe window allowed one per day only
+            conn.execute("DROP INDEX IF EXISTS idx_meals_digest")
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS idx_meals_user_digest "
+                "ON meals (user_id, digest, logged_at)"
+            )
+            for table, period in (('daily_totals', 'day'), ('weekly_totals', 'week')):
+                conn.execute(
+                    f"""
+                    CREATE TABLE IF NOT EXISTS {table} (
+                        user_id TEXT NOT NULL,
+                        {period} TEXT NOT NULL,
+                        meals INTEGER NOT NULL,
+                        calories INTEGER NOT NULL,
+                        protein_g REAL NOT NULL,
+                        carbs_g REAL NOT NULL,
+                        fat_g REAL NOT NULL,
+                        PRIMARY KEY (user_id, {period})
+                    ) WITHOUT ROWID
+                    """
+                )
+
+    def _open(self):
+        conn = sqlite3.connect(self.path, timeout=30, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    @contextmanager
+    def _connection(self):
+        """Borrow a pooled connection, opening a new one while under pool_size."""
+        try:
+            conn = self._pool.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                can_open = self._opened < self.pool_size
+                if can_open:
+                    self._opened += 1
+            if can_open:
+                try:
+                    conn = self._open()
+                except Exception:
+                    with self._lock:
+                        self._opened -= 1
+                    raise
+            else:
+                conn = self._pool.get()
+        try:
+            yield conn
+        finally:
+            self._pool.put(conn)
+
+    def log_meal(self, user_id, result, logged_at=None):
+        """Record one analysis result (a dict) for user_id and return its row id (see log_meals)."""
+        return self.log_meals(user_id, [result], logged_at)[0]
+
+    def log_meals(self, user_id, results, logged_at=None):
+        """
+        Record several analysis results in one transaction and return their ids.
+
+        An analysis identical to one the user logged less than
+        dedupe_window seconds earlier (a retried upload answered from the
+        cache, or a re-shot photo matched as a near duplicate) is not logged
+        again; its id is None. The same meal eaten again later is logged.
+
+        logged_at decides which day and week the meals count towards, by its
+        date in the user's timezone: pass a timezone-aware datetime in that
+        timezone (a naive one is taken as server local time). It defaults
+        to now. The stored logged_at is its UTC epoch.
+        """
+        logged_at = logged_at or datetime.now().astimezone()
+        return self._insert([(user_id, logged_at, result) for result in results], dedupe=True)
+
+    def import_meals(self, meals, chunk_size=10000):
+        """
+        Bulk-load (user_id, logged_at, result) tuples, e.g. from a backup.
+
+        Rows are inserted chunk_size at a time with executemany(), and the
+        rollups are updated once per (user, day) per chunk rather than once
+        per meal. Returns the number of meals loaded.
+        """
+        count = 0
+        chunk = []
+        for meal in meals:
+            chunk.append(meal)
+            if len(chunk) >= chunk_size:
+                self._insert(chunk)
+                count += len(chunk)
+                chunk = []
+        if chunk:
+            self._insert(chunk)
+            count += len(chunk)
+        return count
+
+    def _insert(self, meals, dedupe=False):
+        """
+        Insert meals and fold them into the rollups. With dedupe, each row
+        carries a digest of its record, rows repeating a meal logged within
+        dedupe_window are skipped, and the row ids (None for a skipped
+        repeat) are returned. Identical meals within one call are all kept.
+        """
+        rows = []
+        for user_id, logged_at, result in meals:
+            record = MealRecord.from_dict(result)
+            packed = record.pack()
+            grams = macro_grams(record)
+            rows.append((
+                user_id, logged_at.date().isoformat(), logged_at.timestamp(), record.total_calories,
+                grams['protein'], grams['carbs'], grams['fat'], record.health_score, packed,
+                hashlib.blake2b(packed, digest_size=16).digest() if dedupe else None,
+            ))
+
+        sql = (
+            "INSERT INTO meals (user_id, day, logged_at, calories, "
+            "protein_g, carbs_g, fat_g, health_score, record, digest) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        ids = []
+        with self._connection() as conn, conn:
+            if dedupe:
+                # Take the write lock before looking, so no other worker can
+                # log the same meal between the check and the insert
+                conn.execute("BEGIN IMMEDIATE")
+                repeats = [
+                    self.dedupe_window > 0 and conn.execute(
+                        "SELECT 1 FROM meals WHERE user_id = ? AND digest = ? "
+                        "AND logged_at > ? AND logged_at <= ?",
+                        (row[0], row[-1], row[2] - self.dedupe_window, row[2]),
+                    ).fetchone() is not None
+                    for row in rows
+                ]
+                # executemany() doesn't report row ids, and these batches are small
+                for row, repeat in zip(rows, repeats):
+                    ids.append(None if repeat else conn.execute(sql, row).lastrowid)
+                rows = [row for row, row_id in zip(rows, ids) if row_id is not None]
+            else:
+                conn.executemany(sql, rows)
+            totals = {}
+            for user_id, day, _, calories, protein, carbs, fat, *_ in rows:
+                day_totals = totals.setdefault((user_id, day), dict.fromkeys(_TOTAL_COLUMNS, 0))
+                day_totals['meals'] += 1
+                day_totals['calories'] += calories
+                day_totals['protein_g'] += protein
+                day_totals['carbs_g'] += carbs
+                day_totals['fat_g'] += fat
+            for (user_id, day), day_totals in totals.items():
+                self._add_totals(conn, user_id, date.fromisoformat(day), day_totals)
+        return ids
+
+    def _add_totals(self, conn, user_id, day, totals):
+        """Fold a batch of meals for one day into the daily and weekly rollups."""
+        values = tuple(totals[column] for column in _TOTAL_COLUMNS)
+        for table, period, key in (('daily_totals', 'day', day),
+                                   ('weekly_totals', 'week', week_start(day))):
+            conn.execute(
+                f"INSERT INTO {table} (user_id, {period}, meals, calories, protein_g, carbs_g, fat_g) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?) "
+                f"ON CONFLICT (user_id, {period}) DO UPDATE SET "
+                "meals = meals + excluded.meals, "
+                "calories = calories + excluded.calories, "
+                "protein_g = protein_g + excluded.protein_g, "
+                "carbs_g = carbs_g + excluded.carbs_g, "
+                "fat_g = fat_g + excluded.fat_g",
+                (user_id, key.isoformat()) + values,
+            )
+
+    def meals_for_day(self, user_id, day):
+        """The meals logged by user_id on day, oldest first."""
+        with self._connection() as conn:
+            rows = conn.execute(
+                "SELECT id, logged_at, record FROM meals "
+                "WHERE user_id = ? AND day = ? ORDER BY logged_at",
+                (user_id, day.isoformat()),
+            ).fetchall()
+        return [
+            {'id': meal_id, 'logged_at': logged_at, **MealRecord.unpack(record).to_dict()}
+            for meal_id, logged_at, record in rows
+        ]
+
+    def _totals(self, table, period, user_id, start, end):
+        with self._connection() as conn:
+            rows = conn.execute(
+                f"SELECT {period}, meals, calories, protein_g, carbs_g, fat_g FROM {table} "
+                f"WHERE user_id = ? AND {period} BETWEEN ? AND ? ORDER BY {period}",
+                (user_id, start.isoformat(), end.isoformat()),
+            ).fetchall()
+        return {
+            period_key: {
+                'meals': meals, 'calories': calories, 'protein_g': round(protein, 1),
+                'carbs_g': round(carbs, 1), 'fat_g': round(fat, 1),
+            }
+            for period_key, meals, calories, protein, carbs, fat in rows
+        }
+
+    def daily_totals(self, user_id, start, end):
+        """One totals dict per day from start to end inclusive; empty days are zero."""
+        found = self._totals('daily_totals', 'day', user_id, start, end)
+        days = []
+        day = start
+        while day <= end:
+            totals = found.get(day.isoformat(), dict.fromkeys(_TOTAL_COLUMNS, 0))
+            days.append({'day': day.isoformat(), **totals})
+            day += timedelta(days=1)
+        return days
+
+    def weekly_totals(self, user_id, start, end):
+        """One totals dict per ISO week overlapping start..end; empty weeks are zero."""
+        first, last = week_start(start), week_start(end)
+        found = self._totals('weekly_totals', 'week', user_id, first, last)
+        weeks = []
+        week = first
+        while week <= last:
+            totals = found.get(week.isoformat(), dict.fromkeys(_TOTAL_COLUMNS, 0))
+            weeks.append({'week': week.isoformat(), **totals})
+            week += timedelta(days=7)
+        return weeks
+
+    def close(self):
+        """Close every pooled connection."""
+        while True:
+            try:
+                conn = self._pool.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._opened -= 1
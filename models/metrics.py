@@ -0,0 +1,280 @@
+import contextvars
+import random
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+# Upper bounds (seconds) for stage timings, from sub-millisecond decode
+# steps up to slow model calls
+DEFAULT_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1,
+    0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+# The trace of the current request, when it was sampled
+_current_trace = contextvars.ContextVar('trace', default=None)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+class _Metric:
+    type_name = None
+
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} takes labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type_name}"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.extend(self._render_series(key, value))
+        return lines
+
+    def _render_series(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+
+class Counter(_Metric):
+    """A monotonically increasing count."""
+    type_name = 'counter'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(_Metric):
+    """A value that goes up and down, e.g. requests in flight."""
+    type_name = 'gauge'
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    @contextmanager
+    def track(self, **labels):
+        """Count the block as in flight while it runs."""
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+
+class Histogram(_Metric):
+    """Observations counted into cumulative buckets, plus their sum."""
+    type_name = 'histogram'
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help_text, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._values.get(key)
+            if series is None:
+                # One count per bucket plus +Inf, then the sum
+                series = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def _render_series(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), series):
+            cumulative += count
+            le = f'le="{_format_value(float(bound))}"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+        labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{labels} {_format_value(series[-1])}")
+        lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Trace:
+    """Stage timings of one sampled request, in the order they ran."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.spans = []
+
+    def add(self, stage, seconds):
+        self.spans.append((stage, seconds))
+
+    def summary(self):
+        total = time.perf_counter() - self.started
+        spans = ' '.join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.spans)
+        return f"total={total * 1000:.1f}ms {spans}".rstrip()
+
+
+class Metrics:
+    """
+    The app's metrics registry, rendered in the Prometheus text format.
+
+    Besides the metrics registered on it, it carries the per-stage timing
+    histogram the analysis pipeline reports into through stage() and
+    observe_stage(). Collectors registered with add_collector() run at
+    scrape time, for gauges read from other components (cache sizes,
+    rate limiter queue depth) rather than updated on the hot path.
+
+    A sampled fraction of requests also gets a Trace: stage timings
+    observed while it is active are recorded on it too.
+    """
+
+    def __init__(self, trace_sample_rate=0.0):
+        self.trace_sample_rate = trace_sample_rate
+        self._metrics = []
+        self._collectors = []
+        self.stage_seconds = self.histogram(
+            'calorie_counter_stage_seconds',
+            'Time spent in each stage of the analysis pipeline.',
+            ['stage'],
+        )
+        self.requests = self.counter(
+            'calorie_counter_requests_total',
+            'HTTP requests handled, by endpoint and status code.',
+            ['endpoint', 'status'],
+        )
+        self.request_seconds = self.histogram(
+            'calorie_counter_request_seconds',
+            'Time to produce each HTTP response (first byte for streams).',
+            ['endpoint'],
+        )
+        self.requests_in_flight = self.gauge(
+            'calorie_counter_requests_in_flight',
+            'HTTP requests being handled.',
+        )
+        self.gemini_in_flight = self.gauge(
+            'calorie_counter_gemini_calls_in_flight',
+            'Gemini calls waiting on a response.',
+        )
+        self.gemini_errors = self.counter(
+            'calorie_counter_gemini_errors_total',
+            'Failed Gemini calls, by kind (rate_limited counts 429s).',
+            ['kind'],
+        )
+        self.errors = self.counter(
+            'calorie_counter_errors_total',
+            'Error responses returned by the analysis endpoints, by kind.',
+            ['endpoint', 'kind'],
+        )
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the registry from the Flask app configuration, or None if disabled."""
+        if not config.get('METRICS_ENABLED', True):
+            return None
+        return cls(trace_sample_rate=config.get('TRACE_SAMPLE_RATE', 0.0))
+
+    def _register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self._register(Counter(name, help_text, labelnames))
+
+    def gauge(self, name, help_text, labelnames=()):
+        return self._register(Gauge(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, collect):
+        """Register a function called at scrape time to refresh gauges."""
+        self._collectors.append(collect)
+
+    def add_stats(self, name, help_text, stats):
+        """
+        Expose a component's stats() dict as a gauge labelled by stat name.
+
+        Nested dicts are flattened with '_' (e.g. memory_hits); non-numeric
+        values are skipped.
+        """
+        gauge = self.gauge(name, help_text, ['stat'])
+
+        def collect():
+            pending = list(stats().items())
+            while pending:
+                key, value = pending.pop()
+                if isinstance(value, dict):
+                    pending.extend((f"{key}_{k}", v) for k, v in value.items())
+                elif isinstance(value, (int, float)):
+                    gauge.set(float(value), stat=key)
+
+        self.add_collector(collect)
+        return gauge
+
+    def observe_stage(self, stage, seconds):
+        """Record a stage timing measured elsewhere (e.g. in a worker process)."""
+        self.stage_seconds.observe(seconds, stage=stage)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.add(stage, seconds)
+
+    @contextmanager
+    def stage(self, stage):
+        """Time the block as one pipeline stage."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe_stage(stage, time.perf_counter() - start)
+
+    def start_trace(self):
+        """Start tracing the current request if it is sampled; returns the Trace or None."""
+        if self.trace_sample_rate <= 0 or random.random() >= self.trace_sample_rate:
+            return None
+        trace = Trace()
+        _current_trace.set(trace)
+        return trace
+
+    def end_trace(self):
+        _current_trace.set(None)
+
+    def render(self):
+        for collect in self._collectors:
+            collect()
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
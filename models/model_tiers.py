@@ -0,0 +1,103 @@
+import threading
+
+from models.image_processing import MAX_IMAGE_SIZE
+
+# Macro percentages further than this from 100 in total are treated as a
+# failed answer by every tier but the last
+MACRO_TOTAL_TOLERANCE = 10
+
+
+class Tier:
+    """
+    One way of asking for an analysis: an image size, a prompt style and
+    a model (None for GEMINI_MODEL).
+    """
+
+    __slots__ = ('model', 'max_size', 'compact', 'min_confidence', 'name')
+
+    def __init__(self, model=None, max_size=MAX_IMAGE_SIZE, compact=False,
+                 min_confidence=0.0):
+        self.model = model
+        self.max_size = max_size
+        self.compact = compact
+        self.min_confidence = min_confidence
+        self.name = f"{max_size}px_{'compact' if compact else 'full'}" + (f"_{model}" if model else '')
+
+    def escalation_reason(self, analysis):
+        """Why this tier's analysis should not be trusted, or None to keep it."""
+        confidence = analysis.get('confidence')
+        if confidence is not None and confidence > 1:  # given as a percentage
+            confidence /= 100
+        if confidence is not None and confidence < self.min_confidence:
+            return 'low_confidence'
+        if not analysis['food_items']:
+            return 'no_food_items'
+        if analysis['total_calories'] <= 0:
+            return 'no_calories'
+        if abs(sum(analysis['macros'].values()) - 100) > MACRO_TOTAL_TOLERANCE:
+            return 'macros'
+        return None
+
+
+def parse_tiers(spec, min_confidence=0.6):
+    """
+    Parse MODEL_TIERS: comma-separated max_size:prompt[:model] entries,
+    cheapest first, e.g. "512:compact,1024:full". prompt is compact or full.
+    """
+    tiers = []
+    for entry in spec.split(','):
+        parts = entry.strip().split(':')
+        if len(parts) not in (2, 3) or not parts[0].isdigit() or parts[1] not in ('compact', 'full'):
+            raise ValueError(f"Invalid MODEL_TIERS entry '{entry.strip()}'")
+        tiers.append(Tier(parts[2] if len(parts) == 3 else None, int(parts[0]),
+                          parts[1] == 'compact', min_confidence))
+    return tiers
+
+
+class ModelTiers:
+    """
+    Cheapest-first analysis tiers, with per-tier call and token counts.
+
+    Each analysis starts at the first tier. Its answer is kept unless it
+    fails validation, reports a confidence below min_confidence, or is
+    implausible (no foods, no calories, macros far from 100%), in which
+    case the next tier is asked. The last tier's answer is always kept.
+    """
+
+    def __init__(self, tiers):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = tiers
+        self._lock = threading.Lock()
+
+        # Metrics
+        self._stats = {
+            tier.name: {'calls': 0, 'kept': 0, 'escalated': {}, 'prompt_tokens': 0, 'response_tokens': 0}
+            for tier in tiers
+        }
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the tiers from the Flask app configuration, or None for a single call."""
+        spec = config.get('MODEL_TIERS', '')
+        if not spec:
+            return None
+        return cls(parse_tiers(spec, config.get('MODEL_TIER_MIN_CONFIDENCE', 0.6)))
+
+    def record(self, tier, usage, escalated=None):
+        """Count a call to tier, its token usage (SDK usage metadata) and outcome."""
+        with self._lock:
+            stats = self._stats[tier.name]
+            stats['calls'] += 1
+            if usage is not None:
+                stats['prompt_tokens'] += usage.prompt_token_count or 0
+                stats['response_tokens'] += usage.candidates_token_count or 0
+            if escalated is None:
+                stats['kept'] += 1
+            else:
+                stats['escalated'][escalated] = stats['escalated'].get(escalated, 0) + 1
+
+    def stats(self):
+        with self._lock:
+            return {name: {**stats, 'escalated': dict(stats['escalated'])}
+                    for name, stats in self._stats.items()}
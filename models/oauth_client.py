@@ -0,0 +1,102 @@
+import json
+import os
+import threading
+import time
+
+GOOGLE_METADATA_URL = 'https://accounts.google.com/.well-known/openid-configuration'
+
+
+class GoogleOAuth:
+    """
+    Google sign-in client, built on first use.
+
+    Importing authlib and fetching Google's OpenID discovery document are
+    the slowest parts of a cold start, and most requests (guests, the
+    analysis API) never need either. The authlib client is created the
+    first time a sign-in route asks for it, and the discovery document is
+    kept in a JSON file for metadata_ttl seconds so fresh instances skip
+    the extra round trip to Google.
+    """
+
+    def __init__(self, app, client_id=None, client_secret=None, metadata_cache_path=None,
+                 metadata_ttl=24 * 3600):
+        self.app = app
+        self.client_id = client_id
+        self.client_secret = client_secret
+        self.metadata_cache_path = metadata_cache_path
+        self.metadata_ttl = metadata_ttl
+        self._google = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, app):
+        """Build the client from the Flask app configuration."""
+        config = app.config
+        return cls(
+            app,
+            client_id=config.get('GOOGLE_CLIENT_ID'),
+            client_secret=config.get('GOOGLE_CLIENT_SECRET'),
+            metadata_cache_path=config.get('OAUTH_METADATA_CACHE_PATH') or None,
+            metadata_ttl=config.get('OAUTH_METADATA_TTL', 24 * 3600),
+        )
+
+    @property
+    def google(self):
+        """The registered authlib client for Google."""
+        if self._google is None:
+            with self._lock:
+                if self._google is None:
+                    self._google = self._register()
+        return self._google
+
+    def _register(self):
+        from authlib.integrations.flask_client import OAuth
+
+        oauth = OAuth(self.app)
+        client = oauth.register(
+            name='google',
+            client_id=self.client_id,
+            client_secret=self.client_secret,
+            server_metadata_url=GOOGLE_METADATA_URL,
+            client_kwargs={'scope': 'openid email profile'},
+        )
+        metadata = self._load_metadata()
+        if metadata is not None:
+            # authlib skips the discovery request once _loaded_at is set
+            client.server_metadata.update(metadata, _loaded_at=time.time())
+        elif self.metadata_cache_path:
+            # The first redirect would fetch it anyway; do it now to cache it
+            self._save_metadata(client.load_server_metadata())
+        return client
+
+    def _load_metadata(self):
+        """The cached discovery document, or None if missing or stale."""
+        if not self.metadata_cache_path:
+            return None
+        try:
+            if time.time() - os.path.getmtime(self.metadata_cache_path) > self.metadata_ttl:
+                return None
+            with open(self.metadata_cache_path) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def _save_metadata(self, metadata):
+        # Written to a temporary file and renamed so other workers never
+        # read a half-written document; the key set is refetched on demand
+        metadata = {key: value for key, value in metadata.items()
+                    if key not in ('_loaded_at', 'jwks')}
+        temporary = f"{self.metadata_cache_path}.{os.getpid()}.tmp"
+        try:
+            directory = os.path.dirname(self.metadata_cache_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            with open(temporary, 'w') as f:
+                json.dump(metadata, f)
+            os.replace(temporary, self.metadata_cache_path)
+        except OSError as e:
+            self.app.logger.warning(f"Could not cache OAuth metadata: {e}")
+
+    def warm_up(self):
+        """Import authlib ahead of the first sign-in (no network calls)."""
+        import authlib.integrations.flask_client  # noqa: F401
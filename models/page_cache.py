@@ -0,0 +1,82 @@
+import gzip
+import hashlib
+import threading
+
+from flask import Response, request
+
+
+class CachedPage:
+    """A rendered page with its gzip copy and ETags."""
+
+    __slots__ = ('body', 'gzipped', 'etag', 'gzip_etag')
+
+    def __init__(self, body):
+        self.body = body
+        self.gzipped = gzip.compress(body, compresslevel=9, mtime=0)
+        self.etag = hashlib.sha256(body).hexdigest()[:16]
+        # Each encoding of the page is a different representation
+        self.gzip_etag = f"{self.etag}-gzip"
+
+
+class PageCache:
+    """
+    Rendered output of pages that are the same for every visitor.
+
+    Each page is rendered and compressed once per process; afterwards a
+    request costs a dict lookup, and clients holding the ETag get a 304.
+    """
+
+    def __init__(self, max_age=3600):
+        self.max_age = max_age
+        self._pages = {}
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.renders = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the cache from the Flask app configuration, or None if disabled."""
+        if not config.get('PAGE_CACHE', True) or config.get('DEBUG'):
+            return None
+        return cls(max_age=config.get('PAGE_CACHE_MAX_AGE', 3600))
+
+    def get(self, key, render):
+        """Return the cached page for key, rendering it with render() on first use."""
+        page = self._pages.get(key)
+        if page is not None:
+            self.hits += 1
+            return page
+        page = CachedPage(render().encode())
+        with self._lock:
+            self.renders += 1
+            # Concurrent first renders produce the same page; keep the first
+            return self._pages.setdefault(key, page)
+
+    def respond(self, key, render, max_age=None):
+        """
+        Serve the cached page for the current request.
+
+        max_age defaults to the cache's; 0 makes clients revalidate every
+        time, for pages whose route may redirect some visitors elsewhere.
+        """
+        page = self.get((request.script_root, key), render)
+        if request.accept_encodings['gzip']:
+            body, etag, encoding = page.gzipped, page.gzip_etag, [('Content-Encoding', 'gzip')]
+        else:
+            body, etag, encoding = page.body, page.etag, []
+        max_age = self.max_age if max_age is None else max_age
+        # Headers are built as a plain list; werkzeug's header helpers cost
+        # more than the rest of serving a cached page
+        headers = [
+            ('ETag', f'"{etag}"'),
+            ('Vary', 'Accept-Encoding'),
+            ('Cache-Control', f"public, max-age={max_age}" if max_age else 'no-cache'),
+        ]
+        if 'HTTP_IF_NONE_MATCH' in request.environ and etag in request.if_none_match:
+            return Response(status=304, headers=headers)
+        return Response(body, mimetype='text/html', headers=headers + encoding)
+
+    def stats(self):
+        return {'pages': len(self._pages), 'hits': self.hits, 'renders': self.renders}
@@ -0,0 +1,111 @@
+import atexit
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from models.image_processing import MAX_IMAGE_SIZE, prepare_image
+
+
+class PreprocessPoolFull(Exception):
+    """Raised when the preprocessing queue is saturated."""
+
+
+def _prepare_shared(name, size, max_size):
+    """Worker entry point: prepare an upload that lives in shared memory."""
+    # Spawned workers share the parent's resource tracker, so attaching here
+    # doesn't hand ownership of the block to this process
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return prepare_image(bytes(shm.buf[:size]), max_size)
+    finally:
+        shm.close()
+
+
+class PreprocessPool:
+    """
+    Runs CPU-bound upload preprocessing in worker processes.
+
+    Upload bytes are handed to workers through multiprocessing.shared_memory
+    rather than pickled over the pool's pipe. At most max_pending uploads
+    may be queued or running; beyond that submit() raises PreprocessPoolFull
+    so the caller can shed load with a 503 instead of queueing unboundedly.
+    """
+
+    def __init__(self, max_workers=2, max_pending=8, max_size=MAX_IMAGE_SIZE):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.max_size = max_size
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the pool from the Flask app configuration, or None if disabled."""
+        workers = config.get('PREPROCESS_WORKERS', 0)
+        if workers <= 0:
+            return None
+        return cls(
+            max_workers=workers,
+            max_pending=config.get('PREPROCESS_MAX_PENDING', workers * 4),
+        )
+
+    def _get_executor(self):
+        # Started on first use so app start-up doesn't spawn processes
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                    )
+                    atexit.register(self.shutdown)
+        return self._executor
+
+    def submit(self, data):
+        """Queue an upload for preparation and return a Future of its PreparedImage."""
+        if not self._slots.acquire(blocking=False):
+            raise PreprocessPoolFull("Image preprocessing queue is full")
+
+        try:
+            shm = shared_memory.SharedMemory(create=True, size=max(1, len(data)))
+            shm.buf[:len(data)] = data
+        except Exception:
+            self._slots.release()
+            raise
+
+        # Resolve the caller's future only after the slot is free again, so a
+        # thread that submits right after result() never sees a stale slot
+        result = Future()
+
+        def release(future):
+            shm.close()
+            shm.unlink()
+            self._slots.release()
+            try:
+                result.set_result(future.result())
+            except BaseException as e:
+                result.set_exception(e)
+
+        try:
+            future = self._get_executor().submit(
+                _prepare_shared, shm.name, len(data), self.max_size
+            )
+        except Exception:
+            shm.close()
+            shm.unlink()
+            self._slots.release()
+            raise
+        future.add_done_callback(release)
+        return result
+
+    def prepare(self, data):
+        """Prepare one upload in a worker process and wait for the result."""
+        return self.submit(data).result()
+
+    def shutdown(self):
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(cancel_futures=True)
+                self._executor = None
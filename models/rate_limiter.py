@@ -0,0 +1,203 @@
+import copy
+import threading
+import time
+
+
+class AdaptiveRateLimiter:
+    """
+    Process-wide token bucket for Gemini calls that learns the quota.
+
+    Callers reserve a slot before each model call and sleep until it comes
+    up, so bursts queue instead of all hitting the API at once. Every 429
+    halves the rate and pauses the bucket for the server's retry delay;
+    every success creeps the rate back up toward max_rate (AIMD), so the
+    limiter settles just under the real quota. A reservation that would
+    wait longer than max_wait fails immediately with RATE_LIMIT_EXCEEDED.
+    """
+
+    def __init__(self, rate=2.0, burst=5, max_rate=10.0, min_rate=0.05,
+                 max_wait=30.0, increase=0.05):
+        self.rate = rate
+        self.burst = burst
+        self.max_rate = max_rate
+        self.min_rate = min_rate
+        self.max_wait = max_wait
+        self.increase = increase
+        self._tokens = float(burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._lock = threading.Lock()
+
+        # Metrics
+        self.waiting = 0
+        self.max_waiting = 0
+        self.calls = 0
+        self.delayed_calls = 0
+        self.total_wait = 0.0
+        self.rate_limited = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the limiter from the Flask app configuration, or None if disabled."""
+        rate = config.get('GEMINI_RATE_LIMIT', 0)
+        if not rate or rate <= 0:
+            return None
+        return cls(
+            rate=rate,
+            burst=config.get('GEMINI_RATE_BURST', 5),
+            max_rate=max(rate, config.get('GEMINI_RATE_LIMIT_MAX', 10.0)),
+            max_wait=config.get('GEMINI_RATE_MAX_WAIT', 30.0),
+        )
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def reserve(self):
+        """
+        Take the next slot and return how long to wait before using it.
+
+        Raises RATE_LIMIT_EXCEEDED without taking a slot if the wait would
+        exceed max_wait.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            wait = max(0.0, self._blocked_until - now)
+            if self._tokens < 1:
+                wait += (1 - self._tokens) / self.rate
+            if wait > self.max_wait:
+                self.rejected += 1
+                raise Exception(f"RATE_LIMIT_EXCEEDED: retry in {wait:.0f}s")
+            self._tokens -= 1
+            self.calls += 1
+            if wait > 0:
+                self.delayed_calls += 1
+                self.total_wait += wait
+            return wait
+
+    def _enter_queue(self):
+        with self._lock:
+            self.waiting += 1
+            self.max_waiting = max(self.max_waiting, self.waiting)
+
+    def _leave_queue(self):
+        with self._lock:
+            self.waiting -= 1
+
+    def wait(self):
+        """Block the calling thread until its slot comes up."""
+        delay = self.reserve()
+        if delay > 0:
+            self._enter_queue()
+            try:
+                time.sleep(delay)
+            finally:
+                self._leave_queue()
+
+    def on_rate_limited(self, retry_after=None):
+        """Back off after a 429: halve the rate and pause for the retry delay."""
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            self.rate_limited += 1
+            # A burst of 429s from calls already in flight counts as one signal
+            if now >= self._blocked_until:
+                self.rate = max(self.min_rate, self.rate / 2)
+            pause = retry_after if retry_after else 1 / self.rate
+            self._blocked_until = max(self._blocked_until, now + pause)
+            self._tokens = min(self._tokens, 0.0)
+
+    def on_success(self):
+        """Probe back toward max_rate after a successful call."""
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.increase)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'rate': self.rate,
+                'queue_depth': self.waiting,
+                'max_queue_depth': self.max_waiting,
+                'calls': self.calls,
+                'delayed_calls': self.delayed_calls,
+                'total_wait_seconds': self.total_wait,
+                'avg_wait_seconds': self.total_wait / self.delayed_calls if self.delayed_calls else 0.0,
+                'rate_limited': self.rate_limited,
+                'rejected': self.rejected,
+            }
+
+
+class SingleFlight:
+    """
+    Coalesces identical in-flight calls.
+
+    The first caller for a key runs the function; callers that arrive while
+    it is running wait for and share its result (or exception) instead of
+    making their own model call.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self.leaders = 0
+        self.coalesced = 0
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            if call is None:
+                call = self._calls[key] = {'done': threading.Event()}
+                self.leaders += 1
+                leader = True
+            else:
+                self.coalesced += 1
+                leader = False
+
+        if not leader:
+            call['done'].wait()
+            if 'error' in call:
+                raise call['error']
+            return copy.deepcopy(call['result'])
+
+        try:
+            result = fn()
+        except Exception as e:
+            self._settle(key, call, error=e)
+            raise
+        self._settle(key, call, result)
+        return result
+
+    def lead(self, key):
+        """
+        Claim key for work the caller runs itself, such as a streamed
+        analysis that yields as it goes.
+
+        Returns None if a call for key is already in flight (share it with
+        do()); otherwise a finish(result=None, error=None) function that
+        must be called exactly once to release the callers waiting on key.
+        """
+        with self._lock:
+            if key in self._calls:
+                return None
+            call = self._calls[key] = {'done': threading.Event()}
+            self.leaders += 1
+        return lambda result=None, error=None: self._settle(key, call, result, error)
+
+    def _settle(self, key, call, result=None, error=None):
+        if error is not None:
+            call['error'] = error
+        else:
+            call['result'] = result
+        with self._lock:
+            del self._calls[key]
+        call['done'].set()
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': len(self._calls),
+                'leaders': self.leaders,
+                'coalesced': self.coalesced,
+            }
@@ -0,0 +1,310 @@
+import json
+import math
+import re
+
+# Schema of one meal analysis, in the form Gemini's response_schema takes.
+# The same dict is compiled into the validator below, so what the model is
+# told to produce and what the app accepts can't drift apart.
+ANALYSIS_SCHEMA = {
+    'type': 'OBJECT',
+    'properties': {
+        'food_items': {'type': 'ARRAY', 'items': {'type': 'STRING'}},
+        'total_calories': {'type': 'INTEGER', 'minimum': 0},
+        'macros': {
+            'type': 'OBJECT',
+            'description': 'Share of calories from each macronutrient, in percent from 0 to 100',
+            'properties': {
+                'protein': {'type': 'INTEGER', 'minimum': 0, 'maximum': 100},
+                'fat': {'type': 'INTEGER', 'minimum': 0, 'maximum': 100},
+                'carbs': {'type': 'INTEGER', 'minimum': 0, 'maximum': 100},
+            },
+            'required': ['protein', 'fat', 'carbs'],
+        },
+        'health_score': {
+            'type': 'INTEGER',
+            'description': 'How healthy the meal is, from 0 (least) to 10 (most)',
+            'minimum': 0,
+            'maximum': 10,
+        },
+        'burn_off': {
+            'type': 'OBJECT',
+            'description': 'Minutes of each activity needed to burn the meal off',
+            'properties': {
+                'walking': {'type': 'INTEGER', 'minimum': 0},
+                'running': {'type': 'INTEGER', 'minimum': 0},
+                'swimming': {'type': 'INTEGER', 'minimum': 0},
+            },
+            'required': ['walking', 'running', 'swimming'],
+        },
+        'is_diet_compliant': {'type': 'BOOLEAN'},
+        'analysis': {'type': 'STRING'},
+        'suggestion': {'type': 'STRING'},
+        # Optional and unbounded: a confidence given as a percentage shouldn't
+        # fail an otherwise good analysis (see Tier.escalation_reason)
+        'confidence': {
+            'type': 'NUMBER',
+            'description': 'How sure the model is of the foods and portions, 0 to 1',
+        },
+    },
+    'required': [
+        'food_items', 'total_calories', 'macros', 'health_score',
+        'burn_off', 'is_diet_compliant', 'analysis', 'suggestion',
+    ],
+}
+
+ANALYSIS_LIST_SCHEMA = {'type': 'ARRAY', 'items': ANALYSIS_SCHEMA}
+
+# Schema keys the pinned SDK forwards to the Gemini API; it rejects the rest
+# (minimum, maximum, ...), so the descriptions state the ranges and the
+# local validator clamps what falls outside them
+_MODEL_SCHEMA_KEYS = {'type', 'description', 'enum', 'format', 'items', 'properties', 'required'}
+
+
+def model_schema(schema):
+    """The parts of a response schema that can be sent as response_schema."""
+    result = {}
+    for key, value in schema.items():
+        if key not in _MODEL_SCHEMA_KEYS:
+            continue
+        if key == 'items':
+            value = model_schema(value)
+        elif key == 'properties':
+            value = {name: model_schema(field) for name, field in value.items()}
+        result[key] = value
+    return result
+
+
+ANALYSIS_MODEL_SCHEMA = model_schema(ANALYSIS_SCHEMA)
+ANALYSIS_LIST_MODEL_SCHEMA = model_schema(ANALYSIS_LIST_SCHEMA)
+
+_NUMBER = re.compile(r"^\s*[-+]?(?:[0-9]+(?:\.[0-9]*)?|\.[0-9]+)")
+_TRUE = {'true', 'yes', 'y', '1'}
+_FALSE = {'false', 'no', 'n', '0'}
+
+
+class SchemaError(ValueError):
+    """Raised when model output can't be coerced into the response schema."""
+
+
+def _describe(value):
+    text = repr(value)
+    return text if len(text) <= 40 else text[:37] + '...'
+
+
+def _compile_number(schema, path, integer):
+    minimum = schema.get('minimum')
+    maximum = schema.get('maximum')
+    kind = 'integer' if integer else 'number'
+
+    def coerce(value):
+        if isinstance(value, bool):
+            raise SchemaError(f"{path}: expected {kind}, got {_describe(value)}")
+        if isinstance(value, str):
+            # "540", "540 kcal", "35%"
+            match = _NUMBER.match(value)
+            if not match:
+                raise SchemaError(f"{path}: expected {kind}, got {_describe(value)}")
+            value = float(match.group())
+        elif not isinstance(value, (int, float)):
+            raise SchemaError(f"{path}: expected {kind}, got {_describe(value)}")
+        if isinstance(value, float):
+            if not math.isfinite(value):
+                raise SchemaError(f"{path}: expected {kind}, got {_describe(value)}")
+            if integer:
+                value = int(round(value))
+        # The model never sees the bounds, so a value past one is pulled
+        # back to it rather than failing the whole analysis
+        if minimum is not None and value < minimum:
+            value = minimum
+        if maximum is not None and value > maximum:
+            value = maximum
+        return value
+    return coerce
+
+
+def _compile_string(schema, path):
+    def coerce(value):
+        if isinstance(value, str):
+            return value
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return str(value)
+        raise SchemaError(f"{path}: expected string, got {_describe(value)}")
+    return coerce
+
+
+def _compile_boolean(schema, path):
+    def coerce(value):
+        if isinstance(value, bool):
+            return value
+        if isinstance(value, str):
+            text = value.strip().lower()
+            if text in _TRUE:
+                return True
+            if text in _FALSE:
+                return False
+        elif value in (0, 1):
+            return bool(value)
+        raise SchemaError(f"{path}: expected boolean, got {_describe(value)}")
+    return coerce
+
+
+def _compile_array(schema, path):
+    coerce_item = compile_schema(schema['items'], f"{path}[]")
+
+    def coerce(value):
+        # A lone item where a list was expected, e.g. "salad" for food_items
+        if not isinstance(value, list):
+            value = [value]
+        return [coerce_item(item) for item in value]
+    return coerce
+
+
+def _compile_object(schema, path):
+    prefix = f"{path}." if path else ''
+    fields = [
+        (name, compile_schema(field_schema, prefix + name))
+        for name, field_schema in schema['properties'].items()
+    ]
+    required = set(schema.get('required', ()))
+
+    def coerce(value):
+        if not isinstance(value, dict):
+            raise SchemaError(f"{path or 'response'}: expected object, got {_describe(value)}")
+        result = {}
+        for name, coerce_field in fields:
+            if name in value and value[name] is not None:
+                result[name] = coerce_field(value[name])
+            elif name in required:
+                raise SchemaError(f"{prefix}{name}: missing")
+        return result
+    return coerce
+
+
+_COMPILERS = {
+    'INTEGER': lambda schema, path: _compile_number(schema, path, integer=True),
+    'NUMBER': lambda schema, path: _compile_number(schema, path, integer=False),
+    'STRING': _compile_string,
+    'BOOLEAN': _compile_boolean,
+    'ARRAY': _compile_array,
+    'OBJECT': _compile_object,
+}
+
+
+def compile_schema(schema, path=''):
+    """
+    Turn a response schema into a function that validates and coerces a
+    decoded JSON value, raising SchemaError on the first problem.
+
+    The schema is walked once here; validating a response just runs the
+    nested closures, with no per-call schema interpretation. Unknown keys
+    are dropped, numbers, booleans and percentages given as strings are
+    converted to their declared types, and numbers outside a minimum or
+    maximum are clamped to it.
+    """
+    return _COMPILERS[schema['type']](schema, path)
+
+
+def _outermost_value(text):
+    """Cut away code fences or prose around the outermost object or array."""
+    starts = [i for i in (text.find('{'), text.find('[')) if i != -1]
+    if not starts:
+        return text
+    start = min(starts)
+    end = max(text.rfind('}'), text.rfind(']'))
+    if end < start:
+        return text[start:]
+    return text[start:end + 1]
+
+
+def _strip_trailing_commas(text):
+    """Drop commas directly before a closing bracket, leaving strings alone."""
+    out = []
+    in_string = False
+    escaped = False
+    pending_comma = None
+    for char in text:
+        if in_string:
+            out.append(char)
+            if escaped:
+                escaped = False
+            elif char == '\\':
+                escaped = True
+            elif char == '"':
+                in_string = False
+            continue
+        if char in ' \t\r\n':
+            if pending_comma is not None:
+                pending_comma.append(char)
+            else:
+                out.append(char)
+            continue
+        if pending_comma is not None:
+            if char not in '}]':
+                out.extend(pending_comma)
+            pending_comma = None
+        if char == ',':
+            pending_comma = [',']
+            continue
+        if char == '"':
+            in_string = True
+        out.append(char)
+    return ''.join(out)
+
+
+def repair_json(text):
+    """
+    Fix the trivial ways model output breaks JSON: Markdown code fences or
+    prose around the value, and trailing commas before a closing bracket.
+    """
+    return _strip_trailing_commas(_outermost_value(text))
+
+
+_validate_analysis = compile_schema(ANALYSIS_SCHEMA)
+_validate_analysis_list = compile_schema(ANALYSIS_LIST_SCHEMA)
+_field_validators = {
+    name: compile_schema(schema, name)
+    for name, schema in ANALYSIS_SCHEMA['properties'].items()
+}
+
+
+def loads_lenient(text):
+    """
+    json.loads, falling back to repair_json() when the text doesn't parse.
+
+    The cheap repair (trimming fences and prose) is tried before the
+    character scan for trailing commas.
+    """
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    trimmed = _outermost_value(text)
+    try:
+        return json.loads(trimmed)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return json.loads(_strip_trailing_commas(trimmed))
+    except json.JSONDecodeError as e:
+        raise SchemaError(f"response is not valid JSON: {e}") from None
+
+
+def parse_analysis(text):
+    """Parse, repair if needed, and validate one meal analysis."""
+    return _validate_analysis(loads_lenient(text))
+
+
+def parse_analysis_list(text):
+    """Parse, repair if needed, and validate a list of meal analyses."""
+    return _validate_analysis_list(loads_lenient(text))
+
+
+def validate_analysis(data):
+    """Validate and coerce an already decoded analysis."""
+    return _validate_analysis(data)
+
+
+def coerce_field(name, value):
+    """Coerce one streamed top-level field; unknown fields pass through."""
+    validator = _field_validators.get(name)
+    return value if validator is None else validator(value)
@@ -0,0 +1,118 @@
+import re
+import secrets
+import time
+
+from flask.sessions import SecureCookieSession, SessionInterface
+
+from models.cache_backends import MemoryBackend, SQLiteBackend
+
+# token_urlsafe(32) ids; anything else in the cookie is ignored
+_SESSION_ID = re.compile(r"^[A-Za-z0-9_-]{43}$")
+
+
+class ServerSideSession(SecureCookieSession):
+    """A session whose data lives in a backend, keyed by an opaque id."""
+
+    def __init__(self, initial=None, sid=None, saved_at=None):
+        super().__init__(initial)
+        self.new = sid is None
+        self.sid = sid or secrets.token_urlsafe(32)
+        self.saved_at = saved_at
+        self.previous_sid = None
+
+    def regenerate(self):
+        """Move the data to a fresh id, e.g. on login to prevent fixation."""
+        self.previous_sid = self.previous_sid or self.sid
+        self.sid = secrets.token_urlsafe(32)
+        self.new = True
+        self.modified = True
+
+
+class ServerSessionInterface(SessionInterface):
+    """
+    Keeps session data server-side and sends the browser only a random id.
+
+    Flask's default session signs and ships the whole session in the cookie
+    on every request. Here the cookie is a fixed 43-character id that is
+    set once and never needs signing; the data is read from the backend on
+    each request and written back only when it changes (or when half its
+    TTL has passed, so active sessions don't expire).
+    """
+
+    def __init__(self, backend, ttl=7 * 24 * 3600, key_prefix='session:'):
+        self.backend = backend
+        self.ttl = ttl
+        self.key_prefix = key_prefix
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the interface from the Flask app configuration, or None for cookie sessions."""
+        backend_name = config.get('SESSION_BACKEND', 'cookie')
+        ttl = config.get('SESSION_TTL', 7 * 24 * 3600)
+        if backend_name == 'memory':
+            backend = MemoryBackend(max_entries=config.get('SESSION_MAX_ENTRIES', 10000), ttl=ttl)
+        elif backend_name == 'sqlite':
+            backend = SQLiteBackend(
+                config['SESSION_PATH'],
+                max_entries=config.get('SESSION_MAX_ENTRIES', 10000),
+                ttl=ttl,
+            )
+        elif backend_name == 'cookie':
+            return None
+        else:
+            raise ValueError(f"Unknown SESSION_BACKEND '{backend_name}'")
+        return cls(backend, ttl=ttl)
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if sid and _SESSION_ID.match(sid):
+            stored = self.backend.get(self.key_prefix + sid)
+            if stored is not None:
+                data, saved_at = stored
+                return ServerSideSession(data, sid=sid, saved_at=saved_at)
+        return ServerSideSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+        secure = self.get_cookie_secure(app)
+        samesite = self.get_cookie_samesite(app)
+        httponly = self.get_cookie_httponly(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if session.previous_sid:
+            self.backend.delete(self.key_prefix + session.previous_sid)
+
+        # An emptied session is dropped along with its cookie
+        if not session:
+            if session.modified and not session.new:
+                self.backend.delete(self.key_prefix + session.sid)
+                response.delete_cookie(
+                    name, domain=domain, path=path, secure=secure,
+                    samesite=samesite, httponly=httponly,
+                )
+                response.vary.add('Cookie')
+            return
+
+        now = time.time()
+        stale = session.saved_at is None or now - session.saved_at > self.ttl / 2
+        if session.modified or stale:
+            self.backend.set(self.key_prefix + session.sid, (dict(session), now), ttl=self.ttl)
+
+        # The id never changes, so the cookie only goes out when it is new
+        if session.new or (session.permanent and app.config['SESSION_REFRESH_EACH_REQUEST']):
+            response.set_cookie(
+                name, session.sid, expires=self.get_expiration_time(app, session),
+                httponly=httponly, domain=domain, path=path, secure=secure,
+                samesite=samesite,
+            )
+            response.vary.add('Cookie')
+
+
+def regenerate_session(session):
+    """Give a server-side session a fresh id; cookie sessions need nothing."""
+    if isinstance(session, ServerSideSession):
+        session.regenerate()
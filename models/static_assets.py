@@ -0,0 +1,183 @@
+"""
+Content-hashed, precompressed static assets.
+
+build() copies every file under static/ to a build directory as
+<name>.<hash>.<ext>, next to .gz (and, with the brotli package, .br)
+copies, and writes a manifest mapping each original name to its hashed
+one. Because a hashed name always means the same bytes, the app can
+serve them with a one-year immutable Cache-Control: a changed file gets
+a new name, and pages pick it up through asset_url().
+
+Run it at image build time with: python -m models.static_assets
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:  # optional; only gzip copies are built without it
+    brotli = None
+
+MANIFEST_NAME = 'manifest.json'
+
+# Text formats worth compressing; images and fonts already are
+COMPRESSIBLE = {'.css', '.js', '.svg', '.html', '.json', '.txt', '.map'}
+
+# Preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+
+def _write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, 'wb') as f:
+        f.write(data)
+    os.replace(temporary, path)
+
+
+def _compress(data):
+    """Compressed copies of data by encoding, keeping only those that are smaller."""
+    copies = {'gzip': gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        copies['br'] = brotli.compress(data, quality=11)
+    return {encoding: copy for encoding, copy in copies.items() if len(copy) < len(data)}
+
+
+def build(source, target):
+    """Write hashed and precompressed copies of source into target; return the manifest."""
+    manifest = {}
+    for directory, _, names in os.walk(source):
+        for name in sorted(names):
+            path = os.path.join(directory, name)
+            logical = os.path.relpath(path, source).replace(os.sep, '/')
+            with open(path, 'rb') as f:
+                data = f.read()
+            digest = hashlib.sha256(data).hexdigest()[:12]
+            stem, extension = os.path.splitext(logical)
+            hashed = f"{stem}.{digest}{extension}"
+            _write(os.path.join(target, hashed), data)
+            encodings = []
+            if extension in COMPRESSIBLE:
+                for encoding, copy in _compress(data).items():
+                    _write(os.path.join(target, hashed + ENCODINGS[encoding]), copy)
+                    encodings.append(encoding)
+            manifest[logical] = {'path': hashed, 'digest': digest, 'encodings': sorted(encodings)}
+    _write(os.path.join(target, MANIFEST_NAME),
+           json.dumps(manifest, indent=2, sort_keys=True).encode())
+    return manifest
+
+
+def _newest_mtime(source):
+    return max((os.path.getmtime(os.path.join(directory, name))
+                for directory, _, names in os.walk(source) for name in names), default=0)
+
+
+class Asset:
+    """One hashed asset held in memory with its precompressed copies."""
+
+    __slots__ = ('data', 'mimetype', 'digest', 'encoded')
+
+    def __init__(self, data, mimetype, digest, encoded):
+        self.data = data
+        self.mimetype = mimetype
+        self.digest = digest
+        self.encoded = encoded
+
+    def negotiate(self, accept_encodings):
+        """Return (encoding, bytes) for the best encoding the client accepts."""
+        for encoding in ENCODINGS:
+            if encoding in self.encoded and accept_encodings[encoding]:
+                return encoding, self.encoded[encoding]
+        return None, self.data
+
+
+class StaticAssets:
+    """
+    The built assets of one static folder, served from memory.
+
+    The build directory is (re)built at start-up when its manifest is
+    missing or older than a source file, so a plain checkout works
+    without running the build step first.
+    """
+
+    def __init__(self, source, build_path, max_age=31536000):
+        self.source = source
+        self.build_path = build_path
+        self.max_age = max_age
+        self.manifest = {}
+        self._assets = {}
+
+    @classmethod
+    def from_config(cls, app):
+        """Load the app's built assets, or None if hashing is disabled."""
+        config = app.config
+        if config.get('STATIC_ASSETS', 'hashed') != 'hashed' or app.debug:
+            return None
+        assets = cls(
+            app.static_folder,
+            config.get('STATIC_BUILD_PATH') or os.path.join(app.instance_path, 'static_build'),
+            max_age=config.get('STATIC_MAX_AGE', 31536000),
+        )
+        try:
+            assets.load()
+        except OSError as e:
+            # e.g. a read-only build directory; fall back to plain /static
+            app.logger.warning(f"Could not build static assets: {e}")
+            return None
+        return assets
+
+    def load(self):
+        manifest_path = os.path.join(self.build_path, MANIFEST_NAME)
+        try:
+            stale = os.path.getmtime(manifest_path) < _newest_mtime(self.source)
+        except OSError:
+            stale = True
+        if stale:
+            self.manifest = build(self.source, self.build_path)
+        else:
+            with open(manifest_path) as f:
+                self.manifest = json.load(f)
+
+        self._assets = {}
+        for logical, entry in self.manifest.items():
+            path = os.path.join(self.build_path, entry['path'])
+            with open(path, 'rb') as f:
+                data = f.read()
+            encoded = {}
+            for encoding in entry['encodings']:
+                with open(path + ENCODINGS[encoding], 'rb') as f:
+                    encoded[encoding] = f.read()
+            mimetype = mimetypes.guess_type(logical)[0] or 'application/octet-stream'
+            self._assets[entry['path']] = Asset(data, mimetype, entry['digest'], encoded)
+
+    def hashed_path(self, filename):
+        """The hashed name of a static file, or None if it wasn't built."""
+        entry = self.manifest.get(filename)
+        return entry['path'] if entry else None
+
+    def get(self, hashed_path):
+        return self._assets.get(hashed_path)
+
+
+def main():
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parser = argparse.ArgumentParser(description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--source', default=os.path.join(root, 'static'))
+    parser.add_argument('--target', default=os.getenv('STATIC_BUILD_PATH')
+                        or os.path.join(root, 'instance', 'static_build'))
+    args = parser.parse_args()
+
+    manifest = build(args.source, args.target)
+    for logical, entry in sorted(manifest.items()):
+        print(f"{logical} -> {entry['path']} ({', '.join(entry['encodings']) or 'uncompressed'})")
+    if brotli is None:
+        print("brotli is not installed; only gzip copies were built")
+
+
+if __name__ == '__main__':
+    main()
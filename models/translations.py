@@ -12,6 +12,11 @@ class Translations:
             "diet_label": "Dietary Preference",
             "upload_label": "Upload your meal photo",
             "analyze_btn": "Analyze Nutrition",
+            "estimate_label": "Or type what you ate",
+            "estimate_placeholder": "e.g. 2 eggs, toast and jam, coffee",
+            "estimate_btn": "Quick Estimate",
+            "estimate_note": "Estimated from meals analyzed before",
+            "estimate_unmatched": "Not found",
             "analyzing": "🍎 Consulting the AI Nutritionist...",
             "calories": "Total Energy",
             "daily_target": "Daily Target",
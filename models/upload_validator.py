@@ -0,0 +1,165 @@
+import struct
+
+from models.image_processing import MAX_IMAGE_SIZE
+
+PNG_SIGNATURE = b'\x89PNG\r\n\x1a\n'
+JPEG_SIGNATURE = b'\xff\xd8\xff'
+
+# JPEG start-of-frame markers (baseline, progressive, lossless, arithmetic)
+JPEG_SOF_MARKERS = {0xC0, 0xC1, 0xC2, 0xC3, 0xC5, 0xC6, 0xC7,
+                    0xC9, 0xCA, 0xCB, 0xCD, 0xCE, 0xCF}
+
+# Segments without a length field
+JPEG_STANDALONE_MARKERS = {0x01, *range(0xD0, 0xD8)}
+
+# Segments skipped before giving up on finding the frame header
+JPEG_MAX_SEGMENTS = 256
+
+
+class InvalidUpload(Exception):
+    """Raised for an upload that isn't an acceptable image; status is the HTTP status."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+class ImageHeader:
+    """Format and dimensions read from an image file's header."""
+
+    __slots__ = ('format', 'width', 'height')
+
+    def __init__(self, format, width, height):
+        self.format = format
+        self.width = width
+        self.height = height
+
+    @property
+    def pixels(self):
+        return self.width * self.height
+
+    def decoded_pixels(self, max_size=MAX_IMAGE_SIZE):
+        """
+        Pixels process_image() decodes for this image.
+
+        JPEGs decode with DCT scaling (draft) at 1/2, 1/4 or 1/8 size when
+        that still covers max_size; PNGs always decode in full.
+        """
+        if self.format != 'JPEG' or max(self.width, self.height) <= max_size:
+            return self.pixels
+        scale = min(max_size / self.width, max_size / self.height)
+        target_width = max(1, int(self.width * scale))
+        target_height = max(1, int(self.height * scale))
+        reduction = min(self.width // target_width, self.height // target_height)
+        for factor in (8, 4, 2, 1):
+            if reduction >= factor:
+                break
+        return -(-self.width // factor) * -(-self.height // factor)
+
+
+def _read(stream, size):
+    data = stream.read(size)
+    if len(data) != size:
+        raise InvalidUpload("Truncated image")
+    return data
+
+
+def _png_header(stream):
+    # The IHDR chunk must come first: length, type, width, height
+    length, chunk_type, width, height = struct.unpack('>I4sII', _read(stream, 16))
+    if chunk_type != b'IHDR' or length != 13:
+        raise InvalidUpload("Invalid PNG header")
+    return ImageHeader('PNG', width, height)
+
+
+def _jpeg_header(stream):
+    """Walk the JPEG segments, seeking past their payloads, to the frame header."""
+    for _ in range(JPEG_MAX_SEGMENTS):
+        if _read(stream, 1) != b'\xff':
+            raise InvalidUpload("Invalid JPEG header")
+        marker = _read(stream, 1)[0]
+        while marker == 0xFF:  # fill bytes
+            marker = _read(stream, 1)[0]
+        if marker in JPEG_STANDALONE_MARKERS:
+            continue
+        if marker in (0xD9, 0xDA):
+            raise InvalidUpload("JPEG has no frame header")
+        length, = struct.unpack('>H', _read(stream, 2))
+        if length < 2:
+            raise InvalidUpload("Invalid JPEG header")
+        if marker in JPEG_SOF_MARKERS:
+            _, height, width = struct.unpack('>BHH', _read(stream, 5))
+            return ImageHeader('JPEG', width, height)
+        stream.seek(length - 2, 1)
+    raise InvalidUpload("JPEG has no frame header")
+
+
+def read_image_header(stream):
+    """
+    Identify a JPEG or PNG from its magic bytes and read its dimensions.
+
+    Only the header is read (JPEG metadata segments are seeked over), and
+    the stream is rewound afterwards. Raises InvalidUpload otherwise.
+    """
+    try:
+        stream.seek(0)
+        signature = stream.read(8)
+        if signature.startswith(PNG_SIGNATURE):
+            header = _png_header(stream)
+        elif signature.startswith(JPEG_SIGNATURE):
+            stream.seek(2)
+            header = _jpeg_header(stream)
+        else:
+            raise InvalidUpload("Invalid file type")
+    finally:
+        stream.seek(0)
+    if header.width == 0 or header.height == 0:
+        raise InvalidUpload("Invalid image dimensions")
+    return header
+
+
+class UploadValidator:
+    """
+    Rejects uploads that aren't JPEG/PNG images, or that are too big to
+    decode, from their header alone.
+
+    max_pixels caps the dimensions an image declares; max_decoded_pixels
+    caps what decoding it would actually materialize, which is what makes
+    a small, highly compressed PNG with huge dimensions (a decompression
+    bomb) expensive, while a large JPEG is decoded at reduced size.
+    """
+
+    def __init__(self, max_pixels=100_000_000, max_decoded_pixels=16_000_000,
+                 max_size=MAX_IMAGE_SIZE):
+        self.max_pixels = max_pixels
+        self.max_decoded_pixels = max_decoded_pixels
+        self.max_size = max_size
+
+        # Metrics
+        self.accepted = 0
+        self.rejected = 0
+
+    @classmethod
+    def from_config(cls, config):
+        """Build the validator from the Flask app configuration."""
+        return cls(
+            max_pixels=config.get('UPLOAD_MAX_PIXELS', 100_000_000),
+            max_decoded_pixels=config.get('UPLOAD_MAX_DECODED_PIXELS', 16_000_000),
+        )
+
+    def validate(self, stream):
+        """Return the ImageHeader of an acceptable upload, else raise InvalidUpload."""
+        try:
+            header = read_image_header(stream)
+            if (header.pixels > self.max_pixels
+                    or header.decoded_pixels(self.max_size) > self.max_decoded_pixels):
+                raise InvalidUpload("Image dimensions too large", status=413)
+        except InvalidUpload:
+            self.rejected += 1
+            raise
+        self.accepted += 1
+        return header
+
+    def stats(self):
+        return {'accepted': self.accepted, 'rejected': self.rejected}
+
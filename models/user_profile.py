@@ -1,7 +1,43 @@
+import re
+import struct
 from dataclasses import dataclass
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
-@dataclass
+_NUMBER = re.compile(r"-?[0-9]+(?:\.[0-9]+)?")
+
+def parse_number(value, default=0.0) -> float:
+    """Read the first number out of a model value such as "30%" or "540 kcal"."""
+    if isinstance(value, bool):
+        return float(value)
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _NUMBER.search(str(value))
+    return float(match.group()) if match else default
+
+def _plain_number(value: float):
+    """Whole numbers as int, so 35.0 reads back as 35."""
+    return int(value) if value.is_integer() else value
+
+# Ranges of MealRecord's packed integer fields
+_INT32 = (-2 ** 31, 2 ** 31 - 1)
+_INT16 = (-2 ** 15, 2 ** 15 - 1)
+_MAX_ITEMS = _MAX_ITEM_BYTES = 0xFFFF
+
+def _clamped_int(value: float, bounds: Tuple[int, int]) -> int:
+    """value truncated to an int and clamped into bounds; NaN reads as 0."""
+    if value != value:
+        return 0
+    low, high = bounds
+    return int(min(max(value, low), high))
+
+def _truncated_utf8(text: str, max_bytes: int) -> str:
+    """text cut to at most max_bytes of UTF-8, on a character boundary."""
+    encoded = text.encode()
+    if len(encoded) <= max_bytes:
+        return text
+    return encoded[:max_bytes].decode('utf-8', 'ignore')
+
+@dataclass(slots=True)
 class UserProfile:
     gender: str
     age: int
@@ -26,7 +62,7 @@ class UserProfile:
             raise ValueError(f"Goal '{self.goal}' not found in available options")
         return goals.index(self.goal)
 
-@dataclass
+@dataclass(slots=True)
 class NutritionResult:
     food_items: List[str]
     total_calories: int
@@ -49,3 +85,124 @@ class NutritionResult:
             analysis=data.get('analysis', ''),
             suggestion=data.get('suggestion', '')
         )
+
+
+@dataclass(slots=True)
+class MealRecord:
+    """
+    Compact, numeric form of an analysis for keeping history around.
+
+    The macro percentages and burn-off minutes the model returns as strings
+    and dicts are parsed once, in from_dict(), into plain fields; to_dict()
+    rebuilds the model's format. pack() and unpack_from() give a binary
+    encoding (a fixed struct header followed by length-prefixed UTF-8
+    text) that unpack_from() reads straight out of a bytes or memoryview
+    buffer without slicing copies.
+    """
+    food_items: Tuple[str, ...]
+    total_calories: int
+    protein_pct: float
+    fat_pct: float
+    carbs_pct: float
+    health_score: int
+    walking_min: int
+    running_min: int
+    swimming_min: int
+    is_diet_compliant: bool
+    analysis: str
+    suggestion: str
+
+    # calories, protein/fat/carbs %, health score, walking/running/swimming
+    # minutes, compliance, item count, analysis and suggestion byte lengths
+    _HEADER = struct.Struct('<i3dh3i?HII')
+    _ITEM_LENGTH = struct.Struct('<H')
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'MealRecord':
+        """
+        Parse an analysis. Numbers are clamped and food items truncated to
+        what the packed header can hold, so every record packs.
+        """
+        macros = data.get('macros') or {}
+        burn_off = data.get('burn_off') or {}
+        food_items = list(data.get('food_items', []))[:_MAX_ITEMS]
+        return cls(
+            food_items=tuple(_truncated_utf8(str(item), _MAX_ITEM_BYTES) for item in food_items),
+            total_calories=_clamped_int(parse_number(data.get('total_calories', 0)), _INT32),
+            protein_pct=parse_number(macros.get('protein')),
+            fat_pct=parse_number(macros.get('fat')),
+            carbs_pct=parse_number(macros.get('carbs')),
+            health_score=_clamped_int(parse_number(data.get('health_score', 0)), _INT16),
+            walking_min=_clamped_int(parse_number(burn_off.get('walking')), _INT32),
+            running_min=_clamped_int(parse_number(burn_off.get('running')), _INT32),
+            swimming_min=_clamped_int(parse_number(burn_off.get('swimming')), _INT32),
+            is_diet_compliant=bool(data.get('is_diet_compliant', False)),
+            analysis=str(data.get('analysis', '')),
+            suggestion=str(data.get('suggestion', '')),
+        )
+
+    def to_dict(self) -> Dict[str, Any]:
+        """The analysis in the model's JSON format."""
+        return {
+            'food_items': list(self.food_items),
+            'total_calories': self.total_calories,
+            'macros': {
+                'protein': _plain_number(self.protein_pct),
+                'fat': _plain_number(self.fat_pct),
+                'carbs': _plain_number(self.carbs_pct),
+            },
+            'health_score': self.health_score,
+            'burn_off': {
+                'walking': self.walking_min,
+                'running': self.running_min,
+                'swimming': self.swimming_min,
+            },
+            'is_diet_compliant': self.is_diet_compliant,
+            'analysis': self.analysis,
+            'suggestion': self.suggestion,
+        }
+
+    def pack(self) -> bytes:
+        items = [item.encode() for item in self.food_items]
+        analysis = self.analysis.encode()
+        suggestion = self.suggestion.encode()
+        parts = [self._HEADER.pack(
+            self.total_calories, self.protein_pct, self.fat_pct, self.carbs_pct,
+            self.health_score, self.walking_min, self.running_min, self.swimming_min,
+            self.is_diet_compliant, len(items), len(analysis), len(suggestion),
+        )]
+        for item in items:
+            parts.append(self._ITEM_LENGTH.pack(len(item)))
+            parts.append(item)
+        parts.append(analysis)
+        parts.append(suggestion)
+        return b''.join(parts)
+
+    @classmethod
+    def unpack_from(cls, buffer, offset=0) -> Tuple['MealRecord', int]:
+        """Decode the record at offset in buffer; returns (record, end offset)."""
+        view = memoryview(buffer)
+        (calories, protein, fat, carbs, health_score, walking, running, swimming,
+         compliant, item_count, analysis_length, suggestion_length) = cls._HEADER.unpack_from(view, offset)
+        offset += cls._HEADER.size
+
+        items = []
+        for _ in range(item_count):
+            length, = cls._ITEM_LENGTH.unpack_from(view, offset)
+            offset += cls._ITEM_LENGTH.size
+            items.append(str(view[offset:offset + length], 'utf-8'))
+            offset += length
+        analysis = str(view[offset:offset + analysis_length], 'utf-8')
+        offset += analysis_length
+        suggestion = str(view[offset:offset + suggestion_length], 'utf-8')
+        offset += suggestion_length
+
+        record = cls(
+            tuple(items), calories, protein, fat, carbs, health_score,
+            walking, running, swimming, compliant, analysis, suggestion,
+        )
+        return record, offset
+
+    @classmethod
+    def unpack(cls, buffer) -> 'MealRecord':
+        return cls.unpack_from(buffer)[0]
@@ -66,6 +66,15 @@ class HealthCoach {
                 this.analyzeImage();
             });
         }
+
+        // Typed meal estimate (only rendered when the food index is enabled)
+        const estimateForm = document.getElementById('estimate-form');
+        if (estimateForm) {
+            estimateForm.addEventListener('submit', (e) => {
+                e.preventDefault();
+                this.estimateFromText();
+            });
+        }
     }
 
 
@@ -198,6 +207,7 @@ class HealthCoach {
             const formData = new FormData(document.getElementById('profile-form'));
             formData.append('image', this.selectedImage);
             formData.append('language', this.currentLanguage);
+            formData.append('tz_offset', new Date().getTimezoneOffset());
 
             // Debug: Log form data
             console.log('Form data being sent:');
@@ -205,30 +215,20 @@ class HealthCoach {
                 console.log(key, value);
             }
 
-            const response = await fetch('/analyze', {
+            const response = await fetch('/analyze/stream', {
                 method: 'POST',
                 body: formData
             });
 
-            const data = await response.json();
-
-            if (data.success) {
-                this.displayResults(data.result);
-                this.showToast('Analysis completed successfully!', 'success');
-            } else {
-                if (data.error === 'RATE_LIMIT') {
-                    this.showToast(data.message, 'warning');
-                    // Optionally disable button for the wait time
-                    if (data.wait_time) {
-                        setTimeout(() => {
-                            analyzeBtn.disabled = false;
-                        }, data.wait_time * 1000);
-                    }
-                } else {
-                    this.showToast(data.message || 'Analysis failed', 'error');
-                    analyzeBtn.disabled = false;
-                }
+            const contentType = response.headers.get('Content-Type') || '';
+            if (!contentType.includes('application/x-ndjson')) {
+                // Validation errors come back as a single JSON body
+                const data = await response.json();
+                this.handleAnalysisError(data);
+                return;
             }
+
+            await this.readAnalysisStream(response);
         } catch (error) {
             console.error('Analysis error:', error);
             this.showToast('An error occurred during analysis', 'error');
@@ -241,6 +241,185 @@ class HealthCoach {
         }
     }
 
+    async readAnalysisStream(response) {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+
+            let newline;
+            while ((newline = buffer.indexOf('\n')) >= 0) {
+                const line = buffer.slice(0, newline).trim();
+                buffer = buffer.slice(newline + 1);
+                if (line) {
+                    this.handleStreamEvent(JSON.parse(line));
+                }
+            }
+        }
+    }
+
+    handleStreamEvent(data) {
+        switch (data.event) {
+            case 'target': {
+                const targetElement = document.getElementById('daily-target');
+                if (targetElement) {
+                    targetElement.textContent = `${data.daily_target}`;
+                }
+                break;
+            }
+            case 'field':
+                // Reveal the results as soon as the first field is ready
+                this.showLoading(false);
+                this.showResultsSection();
+                this.renderField(data);
+                break;
+            case 'estimate':
+                // Provisional totals from the food index; the model's own
+                // fields replace them as they arrive
+                this.renderEstimate(data);
+                break;
+            case 'done':
+                this.hideEstimateNote();
+                this.displayResults(data.result);
+                this.showToast('Analysis completed successfully!', 'success');
+                break;
+            case 'error':
+                this.handleAnalysisError(data);
+                break;
+        }
+    }
+
+    renderField(data) {
+        const value = data.value;
+        switch (data.field) {
+            case 'food_items':
+                this.renderFoodItems(value);
+                break;
+            case 'total_calories':
+                this.hideEstimateNote();
+                this.renderCalories(value);
+                if (data.meal_impact_pct !== undefined) {
+                    this.updateMealImpact(data);
+                }
+                break;
+            case 'macros':
+                this.updateMacronutrients({ macros: value });
+                break;
+            case 'health_score':
+                this.renderHealthScore(value);
+                break;
+            case 'burn_off':
+                this.updateBurnOffTimes({ burn_off: value });
+                break;
+            case 'is_diet_compliant':
+                this.renderCompliance(value);
+                break;
+            case 'analysis':
+                this.renderAnalysisText(value);
+                break;
+            case 'suggestion':
+                this.renderSuggestionText(value);
+                break;
+        }
+    }
+
+    async estimateFromText() {
+        const input = document.getElementById('estimate-text');
+        const text = input ? input.value.trim() : '';
+        if (!text) {
+            this.showToast('Please type what you ate first', 'warning');
+            return;
+        }
+
+        const estimateBtn = document.getElementById('estimate-btn');
+        if (estimateBtn) {
+            estimateBtn.disabled = true;
+        }
+
+        try {
+            const response = await fetch('/estimate', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ text })
+            });
+            const data = await response.json();
+            if (!response.ok || !data.success) {
+                this.showToast(data.error || 'Estimate failed', 'error');
+                return;
+            }
+            if (!data.items.length) {
+                this.showToast(`${this.translations.estimate_unmatched}: ${data.unmatched.join(', ')}`, 'warning');
+                return;
+            }
+
+            this.renderFoodItems(data.items.map(item => item.item));
+            this.renderEstimate(data);
+        } catch (error) {
+            console.error('Estimate error:', error);
+            this.showToast('An error occurred during the estimate', 'error');
+        } finally {
+            if (estimateBtn) {
+                estimateBtn.disabled = false;
+            }
+        }
+    }
+
+    renderEstimate(data) {
+        this.showLoading(false);
+        this.showResultsSection();
+        this.renderCalories(data.total_calories);
+        this.updateMacronutrients(data);
+        if (data.meal_impact_pct !== undefined) {
+            this.updateMealImpact(data);
+        }
+
+        const note = document.getElementById('estimate-note');
+        if (note) {
+            let message = this.translations.estimate_note;
+            if (data.unmatched && data.unmatched.length) {
+                message += ` · ${this.translations.estimate_unmatched}: ${data.unmatched.join(', ')}`;
+            }
+            note.textContent = message;
+            note.classList.remove('hidden');
+        }
+    }
+
+    hideEstimateNote() {
+        const note = document.getElementById('estimate-note');
+        if (note) {
+            note.classList.add('hidden');
+        }
+    }
+
+    handleAnalysisError(data) {
+        const analyzeBtn = document.getElementById('analyze-btn');
+        if (data.error === 'RATE_LIMIT') {
+            this.showToast(data.message, 'warning');
+            // Optionally disable button for the wait time
+            if (data.wait_time) {
+                setTimeout(() => {
+                    analyzeBtn.disabled = false;
+                }, data.wait_time * 1000);
+            }
+        } else {
+            this.showToast(data.message || data.error || 'Analysis failed', 'error');
+            analyzeBtn.disabled = false;
+        }
+    }
+
+    showResultsSection() {
+        const resultsSection = document.getElementById('results-section');
+        if (resultsSection && resultsSection.classList.contains('hidden')) {
+            resultsSection.classList.remove('hidden');
+            resultsSection.classList.add('fade-in-up');
+            resultsSection.scrollIntoView({ behavior: 'smooth', block: 'start' });
+        }
+    }
+
     displayResults(result) {
         // Show results section
         const resultsSection = document.getElementById('results-section');
@@ -290,33 +469,40 @@ class HealthCoach {
     }
 
     updateMetrics(result) {
-        // Calories
+        this.renderCalories(result.total_calories);
+        this.renderHealthScore(result.health_score);
+        this.renderCompliance(result.is_diet_compliant);
+    }
+
+    renderCalories(totalCalories) {
         const caloriesDisplay = document.getElementById('calories-display');
         if (caloriesDisplay) {
-            caloriesDisplay.textContent = `${result.total_calories} kcal`;
+            caloriesDisplay.textContent = `${totalCalories} kcal`;
         }
+    }
 
-        // Health Score
+    renderHealthScore(healthScore) {
         const healthScoreDisplay = document.getElementById('health-score-display');
         if (healthScoreDisplay) {
-            healthScoreDisplay.textContent = `${result.health_score}/10`;
+            healthScoreDisplay.textContent = `${healthScore}/10`;
             // Update color based on score
             healthScoreDisplay.className = 'text-3xl font-bold ';
-            if (result.health_score >= 8) {
+            if (healthScore >= 8) {
                 healthScoreDisplay.classList.add('health-score-excellent');
-            } else if (result.health_score >= 5) {
+            } else if (healthScore >= 5) {
                 healthScoreDisplay.classList.add('health-score-good');
             } else {
                 healthScoreDisplay.classList.add('health-score-poor');
             }
         }
+    }
 
-        // Diet Compliance
+    renderCompliance(isDietCompliant) {
         const complianceIcon = document.getElementById('compliance-icon');
         const complianceText = document.getElementById('compliance-text');
 
         if (complianceIcon && complianceText) {
-            if (result.is_diet_compliant) {
+            if (isDietCompliant) {
                 complianceIcon.innerHTML = '✅';
                 complianceText.textContent = this.translations.compliant;
                 complianceText.className = 'text-sm font-medium text-green-600';
@@ -333,9 +519,14 @@ class HealthCoach {
         const fatDisplay = document.getElementById('fat-display');
         const carbsDisplay = document.getElementById('carbs-display');
 
-        if (proteinDisplay) proteinDisplay.textContent = result.macros.protein;
-        if (fatDisplay) fatDisplay.textContent = result.macros.fat;
-        if (carbsDisplay) carbsDisplay.textContent = result.macros.carbs;
+        if (proteinDisplay) proteinDisplay.textContent = this.formatPercent(result.macros.protein);
+        if (fatDisplay) fatDisplay.textContent = this.formatPercent(result.macros.fat);
+        if (carbsDisplay) carbsDisplay.textContent = this.formatPercent(result.macros.carbs);
+    }
+
+    formatPercent(value) {
+        // Macros arrive as numbers; older cached results carry "35%" strings
+        return typeof value === 'number' ? `${value}%` : value;
     }
 
     updateBurnOffTimes(result) {
@@ -349,28 +540,35 @@ class HealthCoach {
     }
 
     updateAIFeedback(result) {
-        // Food items
+        this.renderFoodItems(result.food_items);
+        this.renderAnalysisText(result.analysis);
+        this.renderSuggestionText(result.suggestion);
+    }
+
+    renderFoodItems(foodItems) {
         const foodItemsContainer = document.getElementById('food-items');
-        if (foodItemsContainer && result.food_items) {
+        if (foodItemsContainer && foodItems) {
             foodItemsContainer.innerHTML = '';
-            result.food_items.forEach(item => {
+            foodItems.forEach(item => {
                 const tag = document.createElement('span');
                 tag.className = 'food-tag';
                 tag.textContent = item;
                 foodItemsContainer.appendChild(tag);
             });
         }
+    }
 
-        // Analysis text
+    renderAnalysisText(text) {
         const analysisText = document.getElementById('analysis-text');
-        if (analysisText) {
-            analysisText.innerHTML = this.convertMarkdownBold(result.analysis);
+        if (analysisText && text) {
+            analysisText.innerHTML = this.convertMarkdownBold(text);
         }
+    }
 
-        // Suggestion text
+    renderSuggestionText(text) {
         const suggestionText = document.getElementById('suggestion-text');
-        if (suggestionText) {
-            suggestionText.innerHTML = this.convertMarkdownBold(result.suggestion);
+        if (suggestionText && text) {
+            suggestionText.innerHTML = this.convertMarkdownBold(text);
         }
     }
 
@@ -0,0 +1,64 @@
+import io
+import random
+
+import pytest
+from PIL import Image
+
+from benchmarks.fake_gemini import FakeGeminiServer
+
+PROFILE = {
+    'gender': 'Male',
+    'age': '30',
+    'weight': '80',
+    'height': '180',
+    'activity_level': 'Sedentary (Office Job)',
+    'goal': 'Weight Loss',
+    'diet_type': 'Keto',
+}
+
+
+def jpeg(seed=0, size=(64, 48)):
+    """A small JPEG of random noise; each seed gives a different image."""
+    pixels = random.Random(seed).randbytes(size[0] * size[1] * 3)
+    buffer = io.BytesIO()
+    Image.frombytes('RGB', size, pixels).save(buffer, 'JPEG')
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def gemini():
+    server = FakeGeminiServer(latency=0, stream_interval=0, seed=0).start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def app(gemini, tmp_path, monkeypatch):
+    env = {
+        'GEMINI_BASE_URL': gemini.base_url,
+        'GOOGLE_API_KEY': 'test-key',
+        'MEAL_LOG_PATH': str(tmp_path / 'meal_log.sqlite3'),
+        'FOOD_INDEX_PATH': str(tmp_path / 'food_index.bin'),
+        'FOOD_STATS_PATH': str(tmp_path / 'food_stats.sqlite3'),
+        'STATIC_BUILD_PATH': str(tmp_path / 'static_build'),
+        'OAUTH_METADATA_CACHE_PATH': '',
+        'WARM_UP': 'off',
+        'GEMINI_RATE_LIMIT': '0',
+        'TRACE_SAMPLE_RATE': '0',
+        'METRICS_TOKEN': 'test-token',
+    }
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+
+    from app import create_app
+    app = create_app()
+    app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app):
+    """A test client signed in as a guest."""
+    client = app.test_client()
+    client.get('/auth/guest')
+    return client
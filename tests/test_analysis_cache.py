@@ -0,0 +1,65 @@
+from models import cache_backends
+from models.analysis_cache import AnalysisCache
+from models.cache_backends import MemoryBackend, SQLiteBackend
+
+ANALYSIS = {'food_items': ['salad'], 'total_calories': 200}
+
+
+def test_make_key_covers_image_and_prompt_inputs():
+    key = AnalysisCache.make_key(b'image', 'lose', 'vegan')
+    assert key == AnalysisCache.make_key(b'image', 'lose', 'vegan')
+    assert key != AnalysisCache.make_key(b'image', 'gain', 'vegan')
+    assert key != AnalysisCache.make_key(b'other', 'lose', 'vegan')
+
+
+def test_get_returns_copies():
+    cache = AnalysisCache()
+    cache.set('key', ANALYSIS)
+    cache.get('key')['food_items'].append('bread')
+    assert cache.get('key') == ANALYSIS
+
+
+def test_memory_backend_evicts_least_recently_used():
+    backend = MemoryBackend(max_entries=2, ttl=None)
+    backend.set('a', 1)
+    backend.set('b', 2)
+    backend.get('a')
+    backend.set('c', 3)
+    assert backend.get('b') is None
+    assert backend.get('a') == 1
+    assert backend.stats.evictions == 1
+
+
+def test_memory_backend_expires_entries(monkeypatch):
+    now = [100.0]
+    monkeypatch.setattr(cache_backends.time, 'monotonic', lambda: now[0])
+    backend = MemoryBackend(ttl=10)
+    backend.set('a', 1)
+    now[0] += 11
+    assert backend.get('a') is None
+
+
+def test_disk_tier_fills_memory_tier(tmp_path):
+    path = str(tmp_path / 'cache.sqlite3')
+    AnalysisCache(MemoryBackend(), SQLiteBackend(path)).set('key', ANALYSIS)
+
+    cache = AnalysisCache(MemoryBackend(), SQLiteBackend(path))
+    assert cache.get('key') == ANALYSIS
+    assert cache.get('key') == ANALYSIS
+    stats = cache.stats()
+    assert stats['disk']['hits'] == 1
+    assert stats['memory']['hits'] == 1
+
+
+def test_sqlite_backend_trims_to_max_entries(tmp_path):
+    backend = SQLiteBackend(str(tmp_path / 'cache.sqlite3'), max_entries=3)
+    for i in range(5):
+        backend.set(f"key{i}", i)
+    assert len(backend) == 3
+    assert backend.get('key4') == 4
+
+
+def test_from_config_sizes_the_memory_tier():
+    cache = AnalysisCache.from_config({'ANALYSIS_CACHE_MAX_ENTRIES': 3, 'ANALYSIS_CACHE_TTL': 60})
+    assert cache.memory.max_entries == 3
+    assert cache.memory.ttl == 60
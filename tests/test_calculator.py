@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+
+from models.calculator import CalorieCalculator
+
+
+def scalar_targets(*columns):
+    return [CalorieCalculator.calculate_target_calories(*profile) for profile in zip(*columns)]
+
+
+def test_batch_matches_the_scalar_version_exactly():
+    rng = np.random.default_rng(0)
+    n = 50000
+    columns = (
+        rng.integers(0, 2, n), rng.integers(15, 90, n), rng.uniform(40, 150, n),
+        rng.uniform(140, 210, n), rng.integers(0, 4, n), rng.integers(0, 3, n),
+    )
+    batch = CalorieCalculator.calculate_target_calories_batch(*columns)
+    assert batch.dtype == np.int64
+    assert batch.tolist() == scalar_targets(*(c.tolist() for c in columns))
+
+
+def test_batch_matches_the_scalar_version_on_out_of_range_indexes():
+    # Any non-zero gender is female, negative activities count from the
+    # end, and goals other than 0 and 1 (even negative ones) mean gain
+    gender = [0, 1, 2, -1, 7, 0, 1, 0]
+    activity = [0, 3, -1, -4, 2, 1, -2, 0]
+    goal = [0, 1, 2, -1, 5, -7, 2 ** 40, -(2 ** 40)]
+    age, weight, height = [30.5] * 8, [70.25] * 8, [175] * 8
+    batch = CalorieCalculator.calculate_target_calories_batch(gender, age, weight, height, activity, goal)
+    assert batch.tolist() == scalar_targets(gender, age, weight, height, activity, goal)
+
+
+def test_batch_rejects_activities_the_scalar_version_cannot_look_up():
+    with pytest.raises(IndexError):
+        CalorieCalculator.calculate_target_calories_batch([0], [30], [70], [175], [4], [0])
+
+
+def test_batch_broadcasts_scalars():
+    targets = CalorieCalculator.calculate_target_calories_batch(0, 30, [[60, 70], [80, 90]], 175, 1, 0)
+    assert targets.shape == (2, 2)
+    assert targets[1, 0] == CalorieCalculator.calculate_target_calories(0, 30, 80, 175, 1, 0)
+
+
+def test_projection_moves_weight_by_the_goal_balance():
+    weights, targets = CalorieCalculator.project_target_calories(
+        [0, 0, 1], 30, 80, 180, 1, [0, 1, -1], weeks=2,
+    )
+    assert weights.shape == targets.shape == (3, 3)
+    np.testing.assert_allclose(weights[:, 0], [80, 80, 80])
+    np.testing.assert_allclose(weights[1, 1:], [80 - 3500 / 7700, 80 + 2800 / 7700])
+    assert targets[2, 1] == CalorieCalculator.calculate_target_calories(0, 30, weights[2, 1], 180, 1, 1)
@@ -0,0 +1,111 @@
+import pytest
+
+from models.food_index import HEADER, FoodIndex, parse_item, write_index
+
+
+@pytest.mark.parametrize('text, expected', [
+    ('2 Scrambled Eggs (large)', ('scrambled egg', 2.0)),
+    ('half an avocado', ('avocado', 0.5)),
+    ('1/2 cup of rice', ('rice', 0.5)),
+    ('a slice of toast', ('toast', 1.0)),
+    ('Berries', ('berry', 1.0)),
+])
+def test_parse_item(text, expected):
+    assert parse_item(text) == expected
+
+
+ROWS = [
+    ('egg', 78, 6, 5, 0.6, 40),
+    ('toast', 80, 3, 1, 15, 30),
+    ('jam', 50, 0, 0, 13, 10),
+    ('mac and cheese', 400, 15, 18, 45, 12),
+    ('banana', 105, 1.3, 0.4, 27, 25),
+    ('coffee', 2, 0.3, 0, 0, 50),
+    ('eggplant', 35, 1, 0, 8, 60),
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    path = str(tmp_path / 'foods.idx')
+    write_index(path, ROWS)
+    food_index = FoodIndex(path, str(tmp_path / 'foods.sqlite3'), reload_interval=0)
+    yield food_index
+    food_index.close()
+
+
+def test_write_index_keeps_most_seen_of_colliding_names(tmp_path):
+    path = str(tmp_path / 'foods.idx')
+    long_name = 'x' * 60
+    write_index(path, [(long_name + 'a', 1, 0, 0, 0, 3), (long_name + 'b', 2, 0, 0, 0, 9), ('egg', 78, 6, 5, 0.6, 1)])
+    with open(path, 'rb') as f:
+        _, count, _ = HEADER.unpack(f.read(HEADER.size))
+    assert count == 2
+    entry = FoodIndex(path, str(tmp_path / 'foods.sqlite3'), reload_interval=0).lookup('x' * 48)
+    assert (entry.calories, entry.meals) == (2, 9)
+
+
+def test_lookup_exact_fuzzy_and_partial(index):
+    assert index.lookup('egg').match == 'exact'
+    fuzzy = index.lookup('bananna')
+    assert (fuzzy.name, fuzzy.match) == ('banana', 'fuzzy')
+    partial = index.lookup('buttered toast')
+    assert (partial.name, partial.match) == ('toast', 'partial')
+    assert index.lookup('kale') is None
+    assert index.stats()['lookups'] == 4
+    assert index.stats()['hits'] == 3
+
+
+def test_suggest_orders_by_meals_seen(index):
+    assert [entry.name for entry in index.suggest('Eg')] == ['eggplant', 'egg']
+
+
+def test_estimate_totals_matched_items(index):
+    estimate = index.estimate(['2 eggs', 'toast', 'kale'])
+    assert estimate['total_calories'] == 236
+    assert estimate['unmatched'] == ['kale']
+    assert not estimate['complete']
+    assert estimate['macro_grams']['protein'] == 15.0
+    # 15 g of protein is 60 of the 236 kcal
+    assert estimate['macros']['protein'] == 25
+
+
+def test_split_items_only_splits_joined_indexed_foods(index):
+    assert index.split_items('2 eggs, toast and jam') == ['2 eggs', 'toast', 'jam']
+    assert index.split_items('mac and cheese; coffee') == ['mac and cheese', 'coffee']
+    assert index.split_items('toast with unicorn tears') == ['toast with unicorn tears']
+
+
+def test_record_and_rebuild_learn_item_nutrition(tmp_path):
+    food_index = FoodIndex(str(tmp_path / 'foods.idx'), str(tmp_path / 'foods.sqlite3'),
+                           min_meals=2, rebuild_every=100, reload_interval=0)
+    meal = {'food_items': ['porridge'], 'total_calories': 300,
+            'macros': {'protein': 20, 'fat': 30, 'carbs': 50}}
+    food_index.record([meal])
+    food_index.rebuild()
+    assert food_index.lookup('porridge') is None
+
+    food_index.record([dict(meal, total_calories=500)])
+    food_index.rebuild()
+    entry = food_index.lookup('porridge')
+    assert (entry.calories, entry.meals) == (400, 2)
+    food_index.close()
+
+
+def test_record_counts_a_food_once_per_meal(tmp_path):
+    food_index = FoodIndex(str(tmp_path / 'foods.idx'), str(tmp_path / 'foods.sqlite3'),
+                           min_meals=1, rebuild_every=100, reload_interval=0)
+    food_index.record([{'food_items': ['toast', '2 toast'], 'total_calories': 240,
+                        'macros': {'protein': 10, 'fat': 20, 'carbs': 70}}])
+    food_index.rebuild()
+    entry = food_index.lookup('toast')
+    assert (entry.calories, entry.meals) == (80, 1)
+    food_index.close()
+
+
+def test_corrupt_index_raises_value_error(tmp_path):
+    path = tmp_path / 'foods.idx'
+    path.write_bytes(b'garbage')
+    food_index = FoodIndex(str(path), str(tmp_path / 'foods.sqlite3'), reload_interval=0)
+    with pytest.raises(ValueError):
+        food_index.lookup('egg')
@@ -0,0 +1,37 @@
+from models import image_index
+from models.image_index import PerceptualIndex
+
+
+def test_lookup_finds_closest_hash_within_distance():
+    index = PerceptualIndex(max_distance=4)
+    index.add(0b1111, 'lose:vegan', 'first')
+    index.add(0xFF00, 'lose:vegan', 'second')
+    assert index.lookup(0b1111, 'lose:vegan') == ('first', 0)
+    assert index.lookup(0b0111, 'lose:vegan') == ('first', 1)
+    assert index.lookup(0b11 << 40, 'lose:vegan') is None
+    assert index.lookup(0b1111, 'gain:vegan') is None
+
+
+def test_oldest_entries_are_evicted(tmp_path):
+    path = str(tmp_path / 'hashes.sqlite3')
+    index = PerceptualIndex(max_distance=2, path=path, max_entries=2)
+    for i, image_hash in enumerate((0b111, 0b111 << 20, 0b111 << 40)):
+        index.add(image_hash, 'ns', i)
+    assert index.lookup(0b111, 'ns') is None
+    assert index.lookup(0b111 << 40, 'ns') == (2, 0)
+    assert index.stats() == {'entries': 2, 'evicted': 1}
+
+    reloaded = PerceptualIndex(max_distance=2, path=path, max_entries=1)
+    assert len(reloaded) == 1
+    assert reloaded.lookup(0b111 << 40, 'ns') == (2, 0)
+
+
+def test_entries_expire_after_ttl(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(image_index.time, 'time', lambda: now[0])
+    index = PerceptualIndex(max_distance=2, ttl=60)
+    index.add(1, 'ns', 'old')
+    now[0] += 61
+    assert index.lookup(1, 'ns') is None
+    index.add(2 << 20, 'ns', 'new')
+    assert len(index) == 1
@@ -0,0 +1,17 @@
+import hashlib
+
+from models.image_store import ImageStore
+
+
+def test_put_returns_the_content_digest():
+    store = ImageStore()
+    digest = store.put(b'jpeg bytes')
+    assert digest == hashlib.sha256(b'jpeg bytes').hexdigest()
+    assert store.get(digest) == (b'jpeg bytes', 'image/jpeg')
+    assert store.get('0' * 64) is None
+
+
+def test_sqlite_store_survives_reopening(tmp_path):
+    config = {'IMAGE_STORE_PATH': str(tmp_path / 'images.sqlite3')}
+    digest = ImageStore.from_config(config).put(b'png bytes', 'image/png')
+    assert ImageStore.from_config(config).get(digest) == (b'png bytes', 'image/png')
@@ -0,0 +1,76 @@
+import threading
+import time
+
+import pytest
+
+from models.job_queue import CANCELLED, DONE, EXPIRED, FAILED, JobQueue, JobQueueFull
+
+
+@pytest.fixture
+def jobs():
+    queue = JobQueue(workers=1, max_pending=2, retry_base_delay=0.01)
+    yield queue
+    queue.close()
+
+
+def test_job_runs_and_is_owned(jobs):
+    job = jobs.submit(lambda job: {'total_calories': 100}, owner='user')
+    jobs.wait(job, 5)
+    assert (job.status, job.result, job.attempts) == (DONE, {'total_calories': 100}, 1)
+    assert jobs.get(job.id, 'user') is job
+    assert jobs.get(job.id, 'someone else') is None
+    assert jobs.get(job.id, None) is None
+
+
+def test_rate_limited_job_is_retried(jobs):
+    def flaky(job):
+        if job.attempts < 3:
+            raise Exception("RATE_LIMIT_EXCEEDED: quota")
+        return 'ok'
+
+    job = jobs.wait(jobs.submit(flaky, 'user'), 5)
+    assert (job.status, job.result, job.attempts) == (DONE, 'ok', 3)
+    assert jobs.stats()['retried'] == 2
+
+
+def test_other_errors_fail_at_once(jobs):
+    def broken(job):
+        raise Exception("API_ERROR: bad request")
+
+    job = jobs.wait(jobs.submit(broken, 'user'), 5)
+    assert (job.status, job.attempts) == (FAILED, 1)
+    assert str(job.error) == "API_ERROR: bad request"
+
+
+def test_cancel_queued_and_running_jobs(jobs):
+    started, release = threading.Event(), threading.Event()
+
+    def blocking(job):
+        started.set()
+        release.wait(5)
+        return 'discarded'
+
+    running = jobs.submit(blocking, 'user')
+    queued = jobs.submit(lambda job: pytest.fail("cancelled job ran"), 'user')
+    started.wait(5)
+    with pytest.raises(JobQueueFull):
+        jobs.submit(lambda job: None, 'user')
+
+    assert jobs.cancel(queued)
+    assert queued.status == CANCELLED
+    assert jobs.cancel(running)
+    assert running.cancel_requested
+    release.set()
+    jobs.wait(running, 5)
+    assert (running.status, running.result) == (CANCELLED, None)
+    assert not jobs.cancel(running)
+
+
+def test_job_failing_past_its_deadline_expires(jobs):
+    def slow(job):
+        time.sleep(max(0.0, job.deadline - time.monotonic()) + 0.01)
+        raise Exception("DEADLINE_EXCEEDED: the analysis ran out of time")
+
+    job = jobs.wait(jobs.submit(slow, 'user', deadline=0.05), 5)
+    assert job.status == EXPIRED
+    assert jobs.stats()['expired'] == 1
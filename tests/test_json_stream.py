@@ -0,0 +1,38 @@
+import pytest
+
+from models.json_stream import IncrementalJSONObjectParser
+
+TEXT = '```json\n{"food_items": ["egg", "toast"], "total_calories": 350, "is_diet_compliant": true}\n```'
+
+
+def test_fields_arrive_as_they_complete():
+    parser = IncrementalJSONObjectParser()
+    fields = []
+    for char in TEXT:
+        fields.extend(parser.feed(char))
+    assert fields == [
+        ('food_items', ['egg', 'toast']),
+        ('total_calories', 350),
+        ('is_diet_compliant', True),
+    ]
+    assert parser.done
+
+
+def test_trailing_number_is_held_back():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"total_calories": 12') == []
+    assert parser.feed('5') == []
+    assert parser.feed(', "health_score": 8}') == [('total_calories', 125), ('health_score', 8)]
+
+
+def test_strings_split_mid_escape():
+    parser = IncrementalJSONObjectParser()
+    assert parser.feed('{"analysis": "a \\') == []
+    assert parser.feed('"quoted\\" word"}') == [('analysis', 'a "quoted" word')]
+    assert parser.done
+
+
+def test_missing_colon_raises():
+    parser = IncrementalJSONObjectParser()
+    with pytest.raises(ValueError):
+        parser.feed('{"food_items" ["egg"]}')
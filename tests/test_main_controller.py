@@ -0,0 +1,209 @@
+import io
+import json
+
+import pytest
+
+from benchmarks.fake_gemini import SAMPLE_ANALYSIS
+from models.food_index import write_index
+from tests.conftest import PROFILE, jpeg
+
+
+def upload(*images, field='images', **fields):
+    """Form data uploading the given JPEG bytes along with the test profile."""
+    files = [(io.BytesIO(image), f'meal{i}.jpg') for i, image in enumerate(images)]
+    return {**PROFILE, **fields, field: files}
+
+
+def test_analyze_batch_totals_every_image(client, gemini):
+    response = client.post('/analyze_batch', data=upload(jpeg(1), jpeg(2)))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r['filename'] for r in body['results']] == ['meal0.jpg', 'meal1.jpg']
+    assert all(r['success'] for r in body['results'])
+    totals = sum(r['result']['total_calories'] for r in body['results'])
+    assert body['daily_total']['total_calories'] == totals
+    assert body['daily_total']['remaining_calories'] == body['daily_total']['daily_target'] - totals
+
+
+def test_analyze_batch_requires_images(client):
+    response = client.post('/analyze_batch', data=dict(PROFILE))
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'No images uploaded'
+
+
+def test_analyze_batch_limits_image_count(app, client, gemini):
+    images = [jpeg(seed) for seed in range(app.config['BATCH_MAX_IMAGES'] + 1)]
+    response = client.post('/analyze_batch', data=upload(*images))
+    assert response.status_code == 400
+    assert gemini.request_count == 0
+
+
+def test_analyze_batch_rejects_bad_files_before_calling_the_model(client, gemini):
+    data = upload(jpeg(1))
+    data['images'].append((io.BytesIO(b'not an image'), 'notes.txt'))
+    response = client.post('/analyze_batch', data=data)
+    assert response.status_code == 400
+    assert gemini.request_count == 0
+
+
+def test_analyze_batch_reports_failed_images(client, gemini):
+    gemini.error_rate = 1.0
+    response = client.post('/analyze_batch', data=upload(jpeg(1), jpeg(2)))
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [r['error'] for r in body['results']] == ['ANALYSIS_ERROR', 'ANALYSIS_ERROR']
+    assert body['daily_total']['total_calories'] == 0
+
+
+def stream_events(response):
+    return [json.loads(line) for line in response.get_data(as_text=True).splitlines()]
+
+
+def test_analyze_stream_sends_target_fields_then_result(client):
+    response = client.post('/analyze/stream', data=upload(jpeg(1), field='image'))
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    events = stream_events(response)
+    assert events[0]['event'] == 'target'
+    fields = {e['field']: e['value'] for e in events if e['event'] == 'field'}
+    assert fields['food_items'] == SAMPLE_ANALYSIS['food_items']
+    assert events[-1]['event'] == 'done'
+    assert events[-1]['result']['total_calories'] == fields['total_calories']
+    assert events[-1]['result']['daily_target'] == events[0]['daily_target']
+
+
+def test_analyze_stream_logs_the_validated_analysis(client):
+    client.post('/analyze/stream', data=upload(jpeg(1), field='image')).get_data()
+    response = client.get('/meals')
+    meals = response.get_json()['meals']
+    assert len(meals) == 1
+    assert meals[0]['food_items'] == SAMPLE_ANALYSIS['food_items']
+
+
+def test_analyze_stream_reports_model_errors_as_events(client, gemini):
+    gemini.error_rate = 1.0
+    response = client.post('/analyze/stream', data=upload(jpeg(1), field='image'))
+    assert response.status_code == 200
+    assert stream_events(response)[-1]['error'] == 'ANALYSIS_ERROR'
+
+
+def test_analyze_links_the_processed_image(client):
+    response = client.post('/analyze', data=upload(jpeg(1), field='image', image_mode='url'))
+    image_url = response.get_json()['result']['image_url']
+    image = client.get(image_url)
+    assert image.status_code == 200
+    assert image.mimetype == 'image/jpeg'
+    assert 'immutable' in image.headers['Cache-Control']
+    assert client.get(image_url, headers={'If-None-Match': image.headers['ETag']}).status_code == 304
+
+
+def test_analyze_can_leave_the_image_out(client):
+    response = client.post('/analyze', data=upload(jpeg(1), field='image', image_mode='none'))
+    result = response.get_json()['result']
+    assert 'image_url' not in result and 'image_data' not in result
+
+
+def test_unknown_images_are_not_found(client):
+    assert client.get('/images/' + '0' * 64).status_code == 404
+
+
+def test_metrics_require_the_token(client):
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+
+
+def test_metrics_count_requests_by_endpoint(client):
+    client.post('/analyze', data=upload(jpeg(1), field='image'))
+    response = client.get('/metrics', headers={'Authorization': 'Bearer test-token'})
+    assert response.status_code == 200
+    text = response.get_data(as_text=True)
+    assert 'calorie_counter_requests_total{endpoint="main.analyze",status="200"} 1' in text
+    assert 'calorie_counter_stage_seconds_count{stage="model_call"}' in text
+
+
+def test_async_analyze_returns_a_job_to_poll(client):
+    response = client.post('/analyze', data=upload(jpeg(1), field='image', mode='async'))
+    assert response.status_code == 202
+    job = client.get(response.headers['Location'] + '?wait=5').get_json()
+    assert job['status'] == 'done'
+    assert job['result']['food_items'] == SAMPLE_ANALYSIS['food_items']
+
+
+def test_jobs_are_private_to_their_owner(app, client):
+    location = client.post('/analyze', data=upload(jpeg(1), field='image', mode='async')).headers['Location']
+    other = app.test_client()
+    other.get('/auth/guest')
+    assert other.get(location).status_code == 404
+    assert other.delete(location).status_code == 404
+    assert client.get(location).status_code == 200
+
+
+def test_jobs_of_sessions_without_a_user_id_still_have_an_owner(app):
+    def anonymous_client():
+        anonymous = app.test_client()
+        with anonymous.session_transaction() as session:
+            session['user'] = {'name': 'Guest', 'email': ''}
+        return anonymous
+
+    owner, other = anonymous_client(), anonymous_client()
+    location = owner.post('/analyze', data=upload(jpeg(1), field='image', mode='async')).headers['Location']
+    assert other.get(location).status_code == 404
+    assert owner.get(location + '?wait=5').get_json()['status'] == 'done'
+
+
+def test_running_jobs_expire_at_their_deadline(app, client, gemini):
+    gemini.latency = 2.0
+    app.extensions['job_queue'].deadline = 0.3
+    location = client.post('/analyze', data=upload(jpeg(1), field='image', mode='async')).headers['Location']
+    job = client.get(location + '?wait=1.5').get_json()
+    assert (job['status'], job['error']) == ('expired', 'DEADLINE_EXCEEDED')
+
+
+def test_job_queue_is_off_with_several_gunicorn_workers(app, monkeypatch):
+    from app import create_app
+
+    monkeypatch.setenv('GUNICORN_WORKERS', '2')
+    several = create_app()
+    assert several.extensions['job_queue'] is None
+    guest = several.test_client()
+    guest.get('/auth/guest')
+    assert guest.post('/analyze', data=upload(jpeg(1), field='image', mode='async')).status_code == 200
+
+    monkeypatch.setenv('ANALYZE_MODE', 'async')
+    with pytest.raises(ValueError):
+        create_app()
+
+
+def test_pages_link_hashed_assets_served_immutable(app):
+    anonymous = app.test_client()
+    page = anonymous.get('/login')
+    assert page.status_code == 200
+    assert anonymous.get('/login', headers={'If-None-Match': page.headers['ETag']}).status_code == 304
+
+    hashed = app.extensions['static_assets'].manifest
+    path = next(entry['path'] for entry in hashed.values())
+    asset = anonymous.get(f'/assets/{path}')
+    assert asset.status_code == 200
+    assert 'immutable' in asset.headers['Cache-Control']
+    assert anonymous.get(f'/assets/{path}', headers={'If-None-Match': asset.headers['ETag']}).status_code == 304
+
+
+def test_estimate_totals_known_foods(app, client):
+    write_index(app.config['FOOD_INDEX_PATH'], [('egg', 78, 6, 5, 0.6, 40), ('toast', 80, 3, 1, 15, 30)])
+    response = client.post('/estimate', json={'text': '2 eggs and toast'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert [item['food'] for item in body['items']] == ['egg', 'toast']
+    assert body['total_calories'] == 236
+    assert body['complete']
+    assert client.post('/estimate', json={'text': ' '}).status_code == 400
+
+
+def test_estimate_survives_a_corrupt_index(app, client):
+    with open(app.config['FOOD_INDEX_PATH'], 'wb') as f:
+        f.write(b'not a food index')
+    response = client.post('/estimate', json={'text': '2 eggs'})
+    assert response.status_code == 200
+    body = response.get_json()
+    assert (body['items'], body['unmatched'], body['complete']) == ([], ['2 eggs'], False)
+    assert client.get('/foods?prefix=eg').get_json()['foods'] == []
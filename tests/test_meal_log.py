@@ -0,0 +1,102 @@
+import sqlite3
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+
+from models.meal_log import MealLog, week_start
+
+
+def analysis(calories=500, items=('oatmeal',)):
+    return {
+        'food_items': list(items),
+        'total_calories': calories,
+        'macros': {'protein': 20, 'fat': 30, 'carbs': 50},
+        'health_score': 7,
+        'burn_off': {'walking': 100, 'running': 45, 'swimming': 55},
+        'is_diet_compliant': True,
+        'analysis': 'Fine.',
+        'suggestion': 'Add fruit.',
+    }
+
+
+@pytest.fixture
+def meal_log(tmp_path):
+    log = MealLog(str(tmp_path / 'meals.sqlite3'))
+    yield log
+    log.close()
+
+
+EASTERN = timezone(timedelta(hours=-5))
+
+
+def test_log_meals_skips_repeats_within_the_dedupe_window(meal_log):
+    at = datetime(2024, 3, 4, 12, tzinfo=EASTERN)
+    first = meal_log.log_meals('user', [analysis(), analysis(700, ('pizza',))], at)
+    retried = meal_log.log_meals('user', [analysis()], at + timedelta(minutes=1))
+    other_user = meal_log.log_meals('other', [analysis()], at + timedelta(minutes=1))
+    eaten_again = meal_log.log_meals('user', [analysis()], at + timedelta(hours=5))
+
+    assert None not in first
+    assert retried == [None]
+    assert other_user[0] is not None
+    assert eaten_again[0] is not None
+    assert meal_log.daily_totals('user', date(2024, 3, 4), date(2024, 3, 4))[0]['meals'] == 3
+
+
+def test_log_meals_keeps_identical_meals_logged_together(meal_log):
+    at = datetime(2024, 3, 4, 12, tzinfo=EASTERN)
+    assert None not in meal_log.log_meals('user', [analysis(), analysis()], at)
+
+
+def test_dedupe_window_zero_logs_every_analysis(tmp_path):
+    meal_log = MealLog(str(tmp_path / 'meals.sqlite3'), dedupe_window=0)
+    at = datetime(2024, 3, 4, 12, tzinfo=EASTERN)
+    meal_log.log_meal('user', analysis(), at)
+    assert meal_log.log_meal('user', analysis(), at) is not None
+    meal_log.close()
+
+
+def test_opening_an_old_log_drops_the_per_day_unique_index(tmp_path):
+    path = str(tmp_path / 'meals.sqlite3')
+    MealLog(path).close()
+    with sqlite3.connect(path) as conn:
+        conn.execute("CREATE UNIQUE INDEX idx_meals_digest ON meals (user_id, day, digest)")
+    conn.close()
+
+    meal_log = MealLog(path)
+    at = datetime(2024, 3, 4, 12, tzinfo=EASTERN)
+    meal_log.log_meal('user', analysis(), at)
+    assert meal_log.log_meal('user', analysis(), at + timedelta(hours=5)) is not None
+    meal_log.close()
+
+
+def test_day_follows_the_users_timezone_and_logged_at_is_utc(meal_log):
+    # 23:30 in New York is already the next day in UTC
+    at = datetime(2024, 3, 4, 23, 30, tzinfo=EASTERN)
+    meal_log.log_meal('user', analysis(), at)
+
+    meals = meal_log.meals_for_day('user', date(2024, 3, 4))
+    assert len(meals) == 1
+    assert meals[0]['logged_at'] == at.timestamp()
+    assert meals[0]['food_items'] == ['oatmeal']
+    assert meal_log.meals_for_day('user', date(2024, 3, 5)) == []
+
+
+def test_totals_fill_empty_days_and_weeks(meal_log):
+    monday = date(2024, 3, 4)
+    assert week_start(monday + timedelta(days=6)) == monday
+    meal_log.import_meals([
+        ('user', datetime(2024, 3, 4, 8, tzinfo=timezone.utc), analysis(400)),
+        ('user', datetime(2024, 3, 6, 8, tzinfo=timezone.utc), analysis(600)),
+        ('other', datetime(2024, 3, 6, 8, tzinfo=timezone.utc), analysis(900)),
+    ], chunk_size=2)
+
+    days = meal_log.daily_totals('user', monday, monday + timedelta(days=2))
+    assert [day['calories'] for day in days] == [400, 0, 600]
+    # 20% of 400 kcal from protein is 20 g
+    assert days[0]['protein_g'] == 20.0
+
+    weeks = meal_log.weekly_totals('user', monday, monday + timedelta(days=7))
+    assert [(week['week'], week['meals'], week['calories']) for week in weeks] == [
+        ('2024-03-04', 2, 1000), ('2024-03-11', 0, 0),
+    ]
@@ -0,0 +1,61 @@
+import pytest
+
+from models.metrics import Counter, Histogram, Metrics
+
+
+def test_counter_renders_labelled_series():
+    counter = Counter('requests_total', 'Requests.', ['endpoint'])
+    counter.inc(endpoint='analyze')
+    counter.inc(2, endpoint='analyze')
+    counter.inc(endpoint='say "hi"')
+    assert counter.render() == [
+        '# HELP requests_total Requests.',
+        '# TYPE requests_total counter',
+        'requests_total{endpoint="analyze"} 3',
+        'requests_total{endpoint="say \\"hi\\""} 1',
+    ]
+
+
+def test_labels_must_match_the_declared_names():
+    counter = Counter('requests_total', 'Requests.', ['endpoint'])
+    with pytest.raises(ValueError):
+        counter.inc(status=200)
+
+
+def test_histogram_buckets_are_cumulative():
+    histogram = Histogram('seconds', 'Time.', buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        histogram.observe(value)
+    assert histogram.render()[2:] == [
+        'seconds_bucket{le="0.1"} 2',
+        'seconds_bucket{le="1"} 3',
+        'seconds_bucket{le="+Inf"} 4',
+        'seconds_sum 3.65',
+        'seconds_count 4',
+    ]
+
+
+def test_add_stats_flattens_nested_numbers_at_scrape_time():
+    metrics = Metrics()
+    stats = {'size': 1}
+    metrics.add_stats('cache', 'Cache.', lambda: {**stats, 'memory': {'hits': 2}, 'path': 'x'})
+    stats['size'] = 5
+    text = metrics.render()
+    assert 'cache{stat="size"} 5\n' in text
+    assert 'cache{stat="memory_hits"} 2\n' in text
+    assert 'path' not in text
+
+
+def test_stages_are_recorded_on_the_sampled_trace():
+    metrics = Metrics(trace_sample_rate=1.0)
+    trace = metrics.start_trace()
+    metrics.observe_stage('decode', 0.002)
+    metrics.end_trace()
+    metrics.observe_stage('model', 1.0)
+    assert trace.spans == [('decode', 0.002)]
+    assert 'calorie_counter_stage_seconds_count{stage="model"} 1' in metrics.render()
+    assert Metrics(trace_sample_rate=0.0).start_trace() is None
+
+
+def test_from_config_can_disable_metrics():
+    assert Metrics.from_config({'METRICS_ENABLED': False}) is None
@@ -0,0 +1,47 @@
+from types import SimpleNamespace
+
+import pytest
+
+from models.model_tiers import ModelTiers, Tier, parse_tiers
+
+ANALYSIS = {'food_items': ['rice'], 'total_calories': 200,
+            'macros': {'protein': 10, 'fat': 5, 'carbs': 85}}
+
+
+def test_parse_tiers():
+    cheap, full = parse_tiers('512:compact, 1024:full:gemini-pro', min_confidence=0.7)
+    assert (cheap.max_size, cheap.compact, cheap.model) == (512, True, None)
+    assert (full.max_size, full.compact, full.model, full.min_confidence) == (1024, False, 'gemini-pro', 0.7)
+    assert cheap.name == '512px_compact'
+
+
+@pytest.mark.parametrize('spec', ['512', 'big:full', '512:short', '1:full:a:b'])
+def test_parse_tiers_rejects_bad_entries(spec):
+    with pytest.raises(ValueError):
+        parse_tiers(spec)
+
+
+@pytest.mark.parametrize('change, reason', [
+    ({}, None),
+    ({'confidence': 0.9}, None),
+    ({'confidence': 40}, 'low_confidence'),
+    ({'food_items': []}, 'no_food_items'),
+    ({'total_calories': 0}, 'no_calories'),
+    ({'macros': {'protein': 10, 'fat': 5, 'carbs': 50}}, 'macros'),
+])
+def test_escalation_reason(change, reason):
+    assert Tier(min_confidence=0.6).escalation_reason(dict(ANALYSIS, **change)) == reason
+
+
+def test_record_counts_calls_tokens_and_escalations():
+    tiers = ModelTiers(parse_tiers('512:compact,1024:full'))
+    cheap, full = tiers.tiers
+    usage = SimpleNamespace(prompt_token_count=300, candidates_token_count=80)
+    tiers.record(cheap, usage, escalated='low_confidence')
+    tiers.record(full, usage)
+    tiers.record(full, None)
+    stats = tiers.stats()
+    assert stats[cheap.name]['escalated'] == {'low_confidence': 1}
+    assert stats[full.name]['calls'] == 2
+    assert stats[full.name]['kept'] == 2
+    assert stats[full.name]['prompt_tokens'] == 300
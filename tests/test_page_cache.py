@@ -0,0 +1,62 @@
+import gzip
+
+import pytest
+from flask import Flask
+
+from models.page_cache import PageCache
+
+
+@pytest.fixture
+def cache():
+    return PageCache(max_age=60)
+
+
+@pytest.fixture
+def client(cache):
+    app = Flask(__name__)
+    renders = []
+
+    @app.route('/')
+    def page():
+        return cache.respond('page', lambda: renders.append(1) or '<p>hello</p>')
+
+    @app.route('/login')
+    def login():
+        return cache.respond('login', lambda: '<p>login</p>', max_age=0)
+
+    client = app.test_client()
+    client.renders = renders
+    return client
+
+
+def test_page_is_rendered_once(client, cache):
+    assert client.get('/').data == b'<p>hello</p>'
+    assert client.get('/').data == b'<p>hello</p>'
+    assert len(client.renders) == 1
+    assert cache.stats() == {'pages': 1, 'hits': 1, 'renders': 1}
+
+
+def test_gzip_copy_has_its_own_etag(client):
+    plain = client.get('/')
+    zipped = client.get('/', headers={'Accept-Encoding': 'gzip'})
+    assert zipped.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(zipped.data) == plain.data
+    assert zipped.headers['ETag'] != plain.headers['ETag']
+    assert plain.headers['Cache-Control'] == 'public, max-age=60'
+
+
+def test_matching_etag_gets_not_modified(client):
+    etag = client.get('/').headers['ETag']
+    response = client.get('/', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_max_age_zero_makes_clients_revalidate(client):
+    assert client.get('/login').headers['Cache-Control'] == 'no-cache'
+
+
+def test_from_config_is_off_in_debug():
+    assert PageCache.from_config({'PAGE_CACHE': True, 'DEBUG': True}) is None
+    assert PageCache.from_config({'PAGE_CACHE': False}) is None
+    assert PageCache.from_config({'PAGE_CACHE_MAX_AGE': 5}).max_age == 5
@@ -0,0 +1,56 @@
+from concurrent.futures import Future
+
+import pytest
+
+from models.image_processing import prepare_image
+from models.preprocess_pool import PreprocessPool, PreprocessPoolFull
+from tests.conftest import jpeg
+
+
+class StalledExecutor:
+    """Accepts work and leaves it pending until finish()."""
+
+    def __init__(self):
+        self.futures = []
+
+    def submit(self, *args):
+        self.futures.append(Future())
+        return self.futures[-1]
+
+    def finish(self):
+        for future in self.futures:
+            if not future.done():
+                future.set_result(None)
+
+
+def test_from_config_is_disabled_without_workers():
+    assert PreprocessPool.from_config({'PREPROCESS_WORKERS': 0}) is None
+    pool = PreprocessPool.from_config({'PREPROCESS_WORKERS': 2})
+    assert (pool.max_workers, pool.max_pending) == (2, 8)
+
+
+def test_workers_prepare_like_the_request_thread():
+    data = jpeg(1, size=(1600, 1200))
+    pool = PreprocessPool(max_workers=1, max_pending=2, max_size=512)
+    try:
+        prepared = pool.prepare(data)
+    finally:
+        pool.shutdown()
+    expected = prepare_image(data, 512)
+    assert prepared.data == expected.data
+    assert prepared.mime_type == expected.mime_type
+
+
+def test_submit_sheds_load_past_max_pending(monkeypatch):
+    pool = PreprocessPool(max_workers=1, max_pending=1)
+    executor = StalledExecutor()
+    monkeypatch.setattr(pool, '_get_executor', lambda: executor)
+    pending = pool.submit(jpeg(1))
+    with pytest.raises(PreprocessPoolFull):
+        pool.submit(jpeg(2))
+
+    # Finishing the upload frees its slot
+    executor.finish()
+    assert pending.result() is None
+    pool.submit(jpeg(2))
+    executor.finish()
@@ -0,0 +1,94 @@
+import threading
+
+import pytest
+
+from models.rate_limiter import AdaptiveRateLimiter, SingleFlight
+
+
+def test_burst_is_free_then_calls_queue():
+    limiter = AdaptiveRateLimiter(rate=10.0, burst=2)
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == 0
+    assert limiter.reserve() == pytest.approx(0.1, abs=0.02)
+    assert limiter.stats()['delayed_calls'] == 1
+
+
+def test_reserve_rejects_waits_beyond_max_wait():
+    limiter = AdaptiveRateLimiter(rate=1.0, burst=1, max_wait=0.5)
+    limiter.reserve()
+    with pytest.raises(Exception, match='RATE_LIMIT_EXCEEDED'):
+        limiter.reserve()
+    assert limiter.stats()['rejected'] == 1
+
+
+def test_rate_limited_halves_rate_once_per_pause_and_success_recovers():
+    limiter = AdaptiveRateLimiter(rate=4.0, max_rate=5.0, increase=0.5)
+    limiter.on_rate_limited(retry_after=10)
+    limiter.on_rate_limited(retry_after=10)
+    assert limiter.rate == 2.0
+    assert limiter.reserve() >= 9
+    limiter.on_success()
+    assert limiter.rate == 2.5
+
+
+def test_from_config_is_disabled_by_default():
+    assert AdaptiveRateLimiter.from_config({}) is None
+    assert AdaptiveRateLimiter.from_config({'GEMINI_RATE_LIMIT': 2.0}).rate == 2.0
+
+
+def test_single_flight_shares_one_call():
+    flight = SingleFlight()
+    started, release = threading.Event(), threading.Event()
+    calls = []
+
+    def slow():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {'total_calories': 100}
+
+    results = []
+    leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+    leader.start()
+    started.wait(5)
+    follower = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+    follower.start()
+    while flight.stats()['coalesced'] == 0:
+        threading.Event().wait(0.001)
+    release.set()
+    leader.join(5)
+    follower.join(5)
+
+    assert calls == [1]
+    assert results == [{'total_calories': 100}] * 2
+    assert results[0] is not results[1]
+
+
+def test_single_flight_shares_errors():
+    flight = SingleFlight()
+    finish = flight.lead('key')
+    errors = []
+
+    def follow():
+        try:
+            flight.do('key', lambda: pytest.fail("follower ran its own call"))
+        except Exception as e:
+            errors.append(str(e))
+
+    follower = threading.Thread(target=follow)
+    follower.start()
+    while flight.stats()['coalesced'] == 0:
+        threading.Event().wait(0.001)
+    finish(error=Exception("API_ERROR: boom"))
+    follower.join(5)
+    assert errors == ["API_ERROR: boom"]
+
+
+def test_lead_claims_key_until_finished():
+    flight = SingleFlight()
+    finish = flight.lead('key')
+    assert finish is not None
+    assert flight.lead('key') is None
+    finish(result=1)
+    assert flight.stats()['in_flight'] == 0
+    assert flight.do('key', lambda: 2) == 2
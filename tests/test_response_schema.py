@@ -0,0 +1,68 @@
+import json
+
+import pytest
+
+from models.response_schema import (SchemaError, coerce_field, loads_lenient, parse_analysis,
+                                    parse_analysis_list, repair_json, validate_analysis)
+
+ANALYSIS = {
+    'food_items': ['grilled chicken', 'rice'],
+    'total_calories': 540,
+    'macros': {'protein': 35, 'fat': 20, 'carbs': 45},
+    'health_score': 8,
+    'burn_off': {'walking': 110, 'running': 50, 'swimming': 60},
+    'is_diet_compliant': True,
+    'analysis': 'Balanced.',
+    'suggestion': 'Add greens.',
+}
+
+
+def test_repair_strips_fences_prose_and_trailing_commas():
+    text = 'Here you go:\n```json\n{"a": [1, 2,], "b": "x,}",\n}\n```'
+    assert json.loads(repair_json(text)) == {'a': [1, 2], 'b': 'x,}'}
+
+
+def test_loads_lenient_raises_schema_error():
+    assert loads_lenient('{"a": 1,}') == {'a': 1}
+    with pytest.raises(SchemaError):
+        loads_lenient('{"a": ')
+
+
+def test_parse_analysis_coerces_loose_types():
+    loose = dict(ANALYSIS, food_items='salad', total_calories='540 kcal',
+                 macros={'protein': '35%', 'fat': 20.4, 'carbs': 45},
+                 is_diet_compliant='Yes', extra='dropped')
+    result = parse_analysis('```' + json.dumps(loose) + '```')
+    assert result['food_items'] == ['salad']
+    assert result['total_calories'] == 540
+    assert result['macros'] == {'protein': 35, 'fat': 20, 'carbs': 45}
+    assert result['is_diet_compliant'] is True
+    assert 'extra' not in result
+
+
+def test_validate_analysis_clamps_numbers_into_their_ranges():
+    result = validate_analysis(dict(ANALYSIS, total_calories=-5, health_score=75,
+                                    macros={'protein': '140%', 'fat': 20, 'carbs': -3}))
+    assert result['total_calories'] == 0
+    assert result['health_score'] == 10
+    assert result['macros'] == {'protein': 100, 'fat': 20, 'carbs': 0}
+
+
+@pytest.mark.parametrize('change, message', [
+    ({'total_calories': 'lots'}, 'total_calories'),
+    ({'is_diet_compliant': 'maybe'}, 'is_diet_compliant'),
+    ({'macros': {'protein': 35, 'fat': 20}}, 'macros.carbs: missing'),
+])
+def test_validate_analysis_rejects_bad_fields(change, message):
+    with pytest.raises(SchemaError, match=message):
+        validate_analysis(dict(ANALYSIS, **change))
+
+
+def test_parse_analysis_list():
+    assert parse_analysis_list(json.dumps([ANALYSIS, ANALYSIS])) == [ANALYSIS, ANALYSIS]
+
+
+def test_coerce_field():
+    assert coerce_field('total_calories', '300') == 300
+    assert coerce_field('confidence', '85%') == 85.0
+    assert coerce_field('unknown', 'kept') == 'kept'
@@ -0,0 +1,86 @@
+import pytest
+from flask import Flask, session
+
+from models.cache_backends import MemoryBackend
+from models.session_store import ServerSessionInterface, regenerate_session
+
+
+@pytest.fixture
+def backend():
+    return MemoryBackend()
+
+
+@pytest.fixture
+def client(backend):
+    app = Flask(__name__)
+    app.secret_key = 'test'
+    app.session_interface = ServerSessionInterface(backend, ttl=3600)
+
+    @app.route('/set/<value>')
+    def set_value(value):
+        session['value'] = value
+        return ''
+
+    @app.route('/get')
+    def get_value():
+        return session.get('value', '')
+
+    @app.route('/login')
+    def login():
+        regenerate_session(session)
+        session['user'] = 'alice'
+        return ''
+
+    @app.route('/logout')
+    def logout():
+        session.clear()
+        return ''
+
+    return app.test_client()
+
+
+def session_cookie(response):
+    return response.headers.get('Set-Cookie', '')
+
+
+def test_cookie_carries_only_the_session_id(client, backend):
+    response = client.get('/set/secret')
+    assert 'secret' not in session_cookie(response)
+    assert len(backend) == 1
+    assert client.get('/get').get_data(as_text=True) == 'secret'
+    # The id is already set, so nothing goes back out
+    assert 'Set-Cookie' not in client.get('/set/other').headers
+
+
+def test_login_moves_the_data_to_a_new_id(client, backend):
+    client.get('/set/cart')
+    old_sid = client.get_cookie('session').value
+    client.get('/login')
+    new_sid = client.get_cookie('session').value
+
+    assert new_sid != old_sid
+    assert backend.get('session:' + old_sid) is None
+    data, _ = backend.get('session:' + new_sid)
+    assert data == {'value': 'cart', 'user': 'alice'}
+
+
+def test_clearing_the_session_drops_it_and_its_cookie(client, backend):
+    client.get('/set/value')
+    client.get('/logout')
+    assert len(backend) == 0
+    assert client.get_cookie('session') is None
+
+
+def test_unknown_and_malformed_ids_start_a_new_session(client):
+    client.set_cookie('session', 'x' * 43)
+    assert client.get('/get').get_data(as_text=True) == ''
+    client.set_cookie('session', '../../etc/passwd')
+    assert client.get('/get').get_data(as_text=True) == ''
+
+
+def test_from_config_backends():
+    assert ServerSessionInterface.from_config({'SESSION_BACKEND': 'cookie'}) is None
+    interface = ServerSessionInterface.from_config({'SESSION_BACKEND': 'memory', 'SESSION_TTL': 60})
+    assert interface.ttl == 60
+    with pytest.raises(ValueError):
+        ServerSessionInterface.from_config({'SESSION_BACKEND': 'redis'})
@@ -0,0 +1,52 @@
+import gzip
+import os
+
+from werkzeug.datastructures import Accept
+
+from models.static_assets import StaticAssets, build
+
+
+def write(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, 'wb') as f:
+        f.write(data)
+
+
+def test_build_hashes_names_and_compresses_text(tmp_path):
+    css = b'body { color: black; }\n' * 50
+    write(tmp_path / 'static' / 'css' / 'app.css', css)
+    write(tmp_path / 'static' / 'logo.png', b'\x89PNG not compressible')
+
+    manifest = build(str(tmp_path / 'static'), str(tmp_path / 'build'))
+    entry = manifest['css/app.css']
+    assert entry['path'] == f"css/app.{entry['digest']}.css"
+    assert 'gzip' in entry['encodings']
+    with open(tmp_path / 'build' / (entry['path'] + '.gz'), 'rb') as f:
+        assert gzip.decompress(f.read()) == css
+    assert manifest['logo.png']['encodings'] == []
+
+
+def test_assets_rebuild_when_a_source_changes(tmp_path):
+    source = tmp_path / 'static' / 'app.js'
+    write(source, b'let a = 1;')
+    assets = StaticAssets(str(tmp_path / 'static'), str(tmp_path / 'build'))
+    assets.load()
+    first = assets.hashed_path('app.js')
+
+    write(source, b'let a = 2;')
+    os.utime(source, (os.path.getmtime(source) + 10,) * 2)
+    assets.load()
+    second = assets.hashed_path('app.js')
+    assert second != first
+    assert assets.get(second).data == b'let a = 2;'
+    assert assets.get(second).mimetype in ('application/javascript', 'text/javascript')
+    assert assets.hashed_path('missing.js') is None
+
+
+def test_negotiate_prefers_an_accepted_compressed_copy(tmp_path):
+    write(tmp_path / 'static' / 'app.css', b'p { margin: 0; }\n' * 40)
+    assets = StaticAssets(str(tmp_path / 'static'), str(tmp_path / 'build'))
+    assets.load()
+    asset = assets.get(assets.hashed_path('app.css'))
+    assert asset.negotiate(Accept([('gzip', 1)]))[0] == 'gzip'
+    assert asset.negotiate(Accept([])) == (None, asset.data)
@@ -0,0 +1,52 @@
+import io
+import struct
+
+import pytest
+
+from models.upload_validator import InvalidUpload, UploadValidator, read_image_header
+
+
+def png(width, height):
+    return io.BytesIO(b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sII', 13, b'IHDR', width, height) + b'\0' * 9)
+
+
+def jpeg(width, height, app_segments=1):
+    app = b'\xff\xe1' + struct.pack('>H', 18) + b'\0' * 16
+    sof = b'\xff\xc0' + struct.pack('>HBHH', 17, 8, height, width) + b'\0' * 10
+    return io.BytesIO(b'\xff\xd8' + app * app_segments + sof + b'\xff\xd9')
+
+
+def test_reads_dimensions_and_rewinds():
+    stream = jpeg(4000, 3000, app_segments=3)
+    header = read_image_header(stream)
+    assert (header.format, header.width, header.height) == ('JPEG', 4000, 3000)
+    assert stream.tell() == 0
+    header = read_image_header(png(640, 480))
+    assert (header.format, header.pixels) == ('PNG', 640 * 480)
+
+
+def test_jpeg_decodes_at_reduced_size():
+    assert read_image_header(jpeg(4000, 3000)).decoded_pixels(1024) == 2000 * 1500
+    assert read_image_header(png(4000, 3000)).decoded_pixels(1024) == 4000 * 3000
+
+
+@pytest.mark.parametrize('data, message', [
+    (b'GIF89a' + b'\0' * 20, 'Invalid file type'),
+    (b'\x89PNG\r\n\x1a\n\0\0', 'Truncated image'),
+    (b'\xff\xd8\xff\xda\0\x02', 'no frame header'),
+    (b'\x89PNG\r\n\x1a\n' + struct.pack('>I4sII', 13, b'IHDR', 0, 10), 'Invalid image dimensions'),
+])
+def test_rejects_bad_headers(data, message):
+    with pytest.raises(InvalidUpload, match=message) as error:
+        read_image_header(io.BytesIO(data))
+    assert error.value.status == 400
+
+
+def test_validator_rejects_decompression_bombs():
+    validator = UploadValidator(max_pixels=100_000_000, max_decoded_pixels=16_000_000)
+    assert validator.validate(jpeg(6000, 4000)).format == 'JPEG'
+    for stream in (png(6000, 4000), jpeg(20000, 20000)):
+        with pytest.raises(InvalidUpload) as error:
+            validator.validate(stream)
+        assert error.value.status == 413
+    assert validator.stats() == {'accepted': 1, 'rejected': 2}
@@ -0,0 +1,58 @@
+from models.user_profile import MealRecord, parse_number
+
+ANALYSIS = {
+    'food_items': ['grilled chicken', 'crème fraîche'],
+    'total_calories': 540,
+    'macros': {'protein': '35%', 'fat': 20, 'carbs': 45.5},
+    'health_score': 8,
+    'burn_off': {'walking': 110, 'running': '50 min', 'swimming': 60},
+    'is_diet_compliant': True,
+    'analysis': 'A **balanced** plate.',
+    'suggestion': 'Add olive oil.',
+}
+
+
+def test_parse_number_reads_the_first_number():
+    assert parse_number('35%') == 35.0
+    assert parse_number('-2.5 kcal') == -2.5
+    assert parse_number(True) == 1.0
+    assert parse_number('none', default=7.0) == 7.0
+
+
+def test_pack_round_trips_an_analysis():
+    record = MealRecord.from_dict(ANALYSIS)
+    assert MealRecord.unpack(record.pack()) == record
+    assert record.to_dict() == {
+        **ANALYSIS,
+        'macros': {'protein': 35, 'fat': 20, 'carbs': 45.5},
+        'burn_off': {'walking': 110, 'running': 50, 'swimming': 60},
+    }
+
+
+def test_unpack_from_reads_consecutive_records():
+    first = MealRecord.from_dict(ANALYSIS)
+    second = MealRecord.from_dict({**ANALYSIS, 'food_items': [], 'total_calories': 90})
+    buffer = first.pack() + second.pack()
+    record, offset = MealRecord.unpack_from(buffer)
+    assert record == first
+    assert MealRecord.unpack_from(buffer, offset) == (second, len(buffer))
+
+
+def test_out_of_range_values_are_clamped_so_every_record_packs():
+    record = MealRecord.from_dict({
+        'food_items': ['x'] * 70000 + ['é' * 40000],
+        'total_calories': 10 ** 12,
+        'health_score': -10 ** 6,
+        'burn_off': {'walking': float('inf'), 'running': float('nan'), 'swimming': -9e99},
+    })
+    assert record.total_calories == 2 ** 31 - 1
+    assert record.health_score == -2 ** 15
+    assert (record.walking_min, record.running_min, record.swimming_min) == (2 ** 31 - 1, 0, -2 ** 31)
+    assert len(record.food_items) == 0xFFFF
+    assert MealRecord.unpack(record.pack()) == record
+
+
+def test_long_food_items_are_cut_on_a_character_boundary():
+    record = MealRecord.from_dict({'food_items': ['é' * 40000]})
+    assert record.food_items == ('é' * 32767,)
+    assert MealRecord.unpack(record.pack()) == record